@@ -0,0 +1,138 @@
+"""
+Advisory inter-process file locking.
+
+A FileLock is used to serialise access to resources that are shared between
+several ChipTools processes, such as the compilation cache or a simulation
+library. The lock is held on a separate lock file so that the protected
+resource itself can be replaced or deleted while the lock is held. Locks are
+advisory, they only exclude other processes that use a FileLock on the same
+path. A lock file that is no longer needed can be deleted by the process
+holding the lock, processes waiting for it then lock a new file at the same
+path.
+"""
+import logging
+import os
+import sys
+import time
+
+if sys.platform == 'win32':
+    import msvcrt
+else:
+    import fcntl
+
+log = logging.getLogger(__name__)
+
+
+class FileLock:
+    """
+    A FileLock instance provides an exclusive advisory lock on the lock file
+    at the given *path*. The lock can be used as a context manager:
+
+        with FileLock(path):
+            ...
+
+    Acquiring the lock blocks until any other process holding the lock
+    releases it. If *timeout* is not None and the lock cannot be acquired
+    within *timeout* seconds a TimeoutError is raised.
+    """
+
+    # Interval in seconds between attempts to acquire a contended lock
+    poll_interval = 0.05
+
+    def __init__(self, path, timeout=None):
+        self.path = path
+        self.timeout = timeout
+        self.handle = None
+
+    def _try_lock(self):
+        try:
+            if sys.platform == 'win32':
+                msvcrt.locking(self.handle.fileno(), msvcrt.LK_NBLCK, 1)
+            else:
+                fcntl.flock(self.handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return False
+        return True
+
+    def _unlock(self):
+        if sys.platform == 'win32':
+            self.handle.seek(0)
+            msvcrt.locking(self.handle.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            fcntl.flock(self.handle.fileno(), fcntl.LOCK_UN)
+
+    def _is_current(self):
+        # The lock file may have been deleted by the previous holder while
+        # this process was waiting for it.
+        if sys.platform == 'win32':
+            return True
+        try:
+            return os.path.samestat(
+                os.fstat(self.handle.fileno()), os.stat(self.path)
+            )
+        except OSError:
+            return False
+
+    def acquire(self):
+        """
+        Acquire the lock, blocking until it is available.
+        """
+        if self.handle is not None:
+            raise RuntimeError('Lock already held: {0}'.format(self.path))
+        start_time = time.time()
+        waiting = False
+        while True:
+            self.handle = open(self.path, 'a+')
+            while not self._try_lock():
+                if not waiting:
+                    log.info('...waiting for lock: {0}'.format(self.path))
+                    waiting = True
+                if (
+                    self.timeout is not None
+                    and time.time() - start_time > self.timeout
+                ):
+                    self.handle.close()
+                    self.handle = None
+                    raise TimeoutError(
+                        'Could not acquire lock: {0}'.format(self.path)
+                    )
+                time.sleep(self.poll_interval)
+            if self._is_current():
+                return
+            self.release()
+
+    def unlink(self):
+        """
+        Delete the lock file, the lock must be held. The lock remains held
+        until it is released.
+        """
+        if self.handle is None:
+            raise RuntimeError('Lock not held: {0}'.format(self.path))
+        try:
+            os.remove(self.path)
+        except OSError:
+            # Open files cannot be deleted on Windows
+            pass
+
+    def release(self):
+        """
+        Release the lock if it is held.
+        """
+        if self.handle is None:
+            return
+        try:
+            self._unlock()
+        finally:
+            self.handle.close()
+            self.handle = None
+
+    @property
+    def locked(self):
+        return self.handle is not None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
@@ -78,6 +78,9 @@ class ProjectAttributes:
     ATTRIBUTE_SYNTH_PART = 'part'
     ATTRIBUTE_REPORTER = 'reporter'
     ATTRIBUTE_LIBRARY = 'library'
+    # Optional configuration attributes
+    ATTRIBUTE_COMPILE_HIERARCHY = 'compile_hierarchy'
+    ATTRIBUTE_PRUNE_SYNTHESIS = 'prune_synthesis'
 
     # Additional tool arguments can be attached to File objects by supplying
     # attributes using the naming convention:
@@ -114,6 +117,8 @@ class ProjectAttributes:
         ATTRIBUTE_SYNTH_TOOL: lambda x, root: x,
         ATTRIBUTE_SYNTH_PART: lambda x, root: x,
         ATTRIBUTE_LIBRARY: string_tolower,
+        ATTRIBUTE_COMPILE_HIERARCHY: bool_processor,
+        ATTRIBUTE_PRUNE_SYNTHESIS: bool_processor,
     }
 
     # Default fields for different node types
@@ -0,0 +1,333 @@
+"""
+Dependency graph algorithms shared by the compile planner and the design
+hierarchy tools.
+
+A graph is represented by a dictionary mapping each node to the set of nodes
+that it depends on (its children). Nodes that only appear as children are
+treated as nodes without dependencies. Every function in this module visits
+each node and edge a bounded number of times, so queries on graphs holding
+thousands of design files remain linear in the size of the graph.
+"""
+import collections
+import heapq
+
+
+def get_nodes(graph):
+    """
+    Return the list of nodes in the *graph*: the keys of the graph in order,
+    followed by the nodes that only appear as children.
+    >>> get_nodes({'a': ['b', 'c'], 'c': []})
+    ['a', 'c', 'b']
+    """
+    nodes = list(graph)
+    known = set(nodes)
+    for node in list(nodes):
+        for child in graph[node]:
+            if child not in known:
+                known.add(child)
+                nodes.append(child)
+    return nodes
+
+
+def get_parents(graph):
+    """
+    Return the reverse adjacency index of the *graph*: a dictionary mapping
+    every node to the list of nodes that depend on it, in the order of the
+    graph keys.
+    >>> get_parents({'a': {'c'}, 'b': {'c'}, 'c': set()})
+    {'a': [], 'b': [], 'c': ['a', 'b']}
+    """
+    parents = dict((node, []) for node in get_nodes(graph))
+    for node in graph:
+        for child in graph[node]:
+            parents[child].append(node)
+    return parents
+
+
+def topological_sort(graph):
+    """
+    Return the list of nodes in the *graph* sorted so that each node follows
+    the nodes that it depends on, using Kahn's algorithm. A ValueError naming
+    a cycle is raised if the graph contains cycles.
+    >>> graph = {
+    ...    2 : set([11]),
+    ...    9 : set([11, 8]),
+    ...    10 : set([11, 3]),
+    ...    11 : set([5, 7]),
+    ...    8 : set([7, 3]),
+    ...    5 : set(),
+    ...    7 : set(),
+    ...    3 : set()
+    ... }
+    >>> topological_sort(graph)
+    [3, 7, 5, 8, 11, 2, 9, 10]
+    """
+    parents = get_parents(graph)
+    # Number of dependencies of each node that have not been sorted yet
+    pending = dict((node, len(graph.get(node, ()))) for node in parents)
+    # Nodes are taken from the right and queued on the left, which keeps the
+    # order of the sort stable between Python versions.
+    ready = collections.deque(node for node in parents if pending[node] == 0)
+    order = []
+    while len(ready) > 0:
+        node = ready.pop()
+        order.append(node)
+        for parent in parents[node]:
+            pending[parent] -= 1
+            if pending[parent] == 0:
+                ready.appendleft(parent)
+    if len(order) != len(parents):
+        raise_cycle_error(graph)
+    return order
+
+
+def stable_sort(graph, nodes):
+    """
+    Return the list of *nodes* sorted so that each node follows the nodes
+    that it depends on in the *graph*. Nodes that do not depend on each
+    other keep their relative order in *nodes*, and dependencies on nodes
+    that are not in *nodes* are ignored. A ValueError naming a cycle is
+    raised if the graph contains cycles.
+    >>> stable_sort({'a': {'c'}, 'b': set()}, 'abc')
+    ['b', 'c', 'a']
+    """
+    nodes = list(nodes)
+    index = dict((node, idx) for idx, node in enumerate(nodes))
+    # Number of dependencies of each node that have not been sorted yet
+    pending = dict((node, 0) for node in nodes)
+    parents = dict((node, []) for node in nodes)
+    for node in nodes:
+        for child in graph.get(node, ()):
+            if child in index:
+                pending[node] += 1
+                parents[child].append(node)
+    ready = [index[node] for node in nodes if pending[node] == 0]
+    heapq.heapify(ready)
+    order = []
+    while len(ready) > 0:
+        node = nodes[heapq.heappop(ready)]
+        order.append(node)
+        for parent in parents[node]:
+            pending[parent] -= 1
+            if pending[parent] == 0:
+                heapq.heappush(ready, index[parent])
+    if len(order) != len(nodes):
+        raise_cycle_error(
+            dict(
+                (node, [c for c in graph.get(node, ()) if c in index])
+                for node in nodes
+            )
+        )
+    return order
+
+
+def get_levels(graph, order):
+    """
+    Return a dictionary mapping each node in the topologically sorted
+    *order* to its level in the *graph*. Nodes that do not depend on any
+    other node in *order* are at level 0, every other node is one level
+    above the highest level of the nodes that it depends on. Nodes on the
+    same level do not depend on each other.
+    >>> sorted(get_levels({'a': {'c'}, 'b': set()}, 'bca').items())
+    [('a', 1), ('b', 0), ('c', 0)]
+    """
+    levels = {}
+    for node in order:
+        levels[node] = 1 + max(
+            [levels[child] for child in graph.get(node, ()) if child in levels]
+            + [-1]
+        )
+    return levels
+
+
+def get_wavefronts(levels):
+    """
+    Return the nodes of the *levels* dictionary returned by *get_levels*, or
+    a subset of it, grouped into a list of wavefronts in order of level.
+    The nodes in each wavefront only depend on nodes in earlier wavefronts
+    and can be processed in parallel, they keep their order in *levels*.
+    Levels without any nodes are skipped.
+    >>> get_wavefronts({'d': 2, 'a': 1, 'c': 0, 'b': 0})
+    [['c', 'b'], ['a'], ['d']]
+    """
+    wavefronts = {}
+    for node, level in levels.items():
+        wavefronts.setdefault(level, []).append(node)
+    return [wavefronts[level] for level in sorted(wavefronts)]
+
+
+def _traverse(adjacency, roots):
+    reachable = set()
+    pending = list(roots)
+    while len(pending) > 0:
+        node = pending.pop()
+        if node in reachable:
+            continue
+        reachable.add(node)
+        pending.extend(adjacency.get(node, ()))
+    return reachable
+
+
+def get_reachable(graph, roots, cache=None):
+    """
+    Return the set of nodes that the *roots* depend on in the *graph*,
+    directly or indirectly, including the *roots* themselves. If a *cache*
+    dictionary is given the set of nodes reachable from each root is stored
+    in it, and the traversal stops at nodes that were roots of an earlier
+    query, so that queries for several roots sharing a hierarchy only visit
+    the shared nodes once. Only the queried roots are stored, so the cache
+    grows with the number of queries rather than the size of the graph, and
+    it must be discarded when the graph is modified.
+    >>> sorted(get_reachable({'a': {'b'}, 'b': {'c'}, 'd': {'a'}}, ['a']))
+    ['a', 'b', 'c']
+    >>> cache = {}
+    >>> graph = {'a': {'b'}, 'b': {'c'}, 'd': {'a'}}
+    >>> sorted(get_reachable(graph, ['a'], cache))
+    ['a', 'b', 'c']
+    >>> sorted(get_reachable(graph, ['d'], cache))
+    ['a', 'b', 'c', 'd']
+    >>> sorted(cache)
+    ['a', 'd']
+    """
+    if cache is None:
+        return _traverse(graph, roots)
+    reachable = set()
+    for root in roots:
+        if root not in cache:
+            nodes = set()
+            pending = [root]
+            while len(pending) > 0:
+                node = pending.pop()
+                if node in nodes:
+                    continue
+                if node in cache:
+                    nodes.update(cache[node])
+                    continue
+                nodes.add(node)
+                pending.extend(graph.get(node, ()))
+            cache[root] = frozenset(nodes)
+        reachable.update(cache[root])
+    return reachable
+
+
+def get_subgraph(graph, root, cache=None):
+    """
+    Return a new graph holding the *root* node and every node that it
+    depends on in the *graph*, in depth first order unless a *cache*
+    dictionary is given. The cache is used to find the nodes as described
+    by *get_reachable*.
+    >>> get_subgraph({1: [2, 3], 2: [3], 4: [1]}, 1)
+    {1: {2, 3}, 2: {3}, 3: set()}
+    >>> cache = {}
+    >>> sorted(get_subgraph({1: [2, 3], 2: [3], 4: [1]}, 4, cache).items())
+    [(1, {2, 3}), (2, {3}), (3, set()), (4, {1})]
+    >>> sorted(cache[4])
+    [1, 2, 3, 4]
+    """
+    if cache is not None:
+        nodes = get_reachable(graph, [root], cache)
+    else:
+        nodes = {}
+        pending = [root]
+        while len(pending) > 0:
+            node = pending.pop()
+            if node in nodes:
+                continue
+            nodes[node] = None
+            pending.extend(reversed(list(graph.get(node, ()))))
+    return dict((node, set(graph.get(node, ()))) for node in nodes)
+
+
+def get_dependents(graph, nodes, parents=None):
+    """
+    Return the set of nodes in the *graph* that depend on any of the given
+    *nodes*, directly or indirectly, including the *nodes* themselves. The
+    reverse adjacency index returned by *get_parents* can be passed as
+    *parents* to avoid rebuilding it for repeated queries.
+    >>> sorted(get_dependents({'a': {'b'}, 'b': {'c'}, 'd': {'a'}}, ['b']))
+    ['a', 'b', 'd']
+    """
+    if parents is None:
+        parents = get_parents(graph)
+    return _traverse(parents, nodes)
+
+
+def get_components(graph):
+    """
+    Return the list of strongly connected components of the *graph* that
+    contain a cycle, each given as a list of nodes. Tarjan's algorithm is
+    run iteratively so that deep graphs do not exceed the recursion limit.
+    >>> get_components({'a': {'b'}, 'b': {'a'}, 'c': {'c'}, 'd': {'a'}})
+    [['b', 'a'], ['c']]
+    """
+    index = {}
+    lowlink = {}
+    stack = []
+    on_stack = set()
+    components = []
+    for root in get_nodes(graph):
+        if root in index:
+            continue
+        work = [(root, iter(graph.get(root, ())))]
+        index[root] = lowlink[root] = len(index)
+        stack.append(root)
+        on_stack.add(root)
+        while len(work) > 0:
+            node, children = work[-1]
+            for child in children:
+                if child not in index:
+                    index[child] = lowlink[child] = len(index)
+                    stack.append(child)
+                    on_stack.add(child)
+                    work.append((child, iter(graph.get(child, ()))))
+                    break
+                elif child in on_stack:
+                    lowlink[node] = min(lowlink[node], index[child])
+            else:
+                work.pop()
+                if len(work) > 0:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+                if lowlink[node] == index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    if len(component) > 1 or node in graph.get(node, ()):
+                        components.append(component)
+    return components
+
+
+def get_cycle(graph, component):
+    """
+    Return a list of nodes forming a cycle through the strongly connected
+    *component* of the *graph*, the first node is repeated at the end.
+    >>> get_cycle({'a': {'b'}, 'b': {'c'}, 'c': {'a'}}, ['a', 'b', 'c'])
+    ['a', 'b', 'c', 'a']
+    """
+    members = set(component)
+    path = [component[0]]
+    position = {component[0]: 0}
+    while True:
+        node = next(
+            child for child in graph.get(path[-1], ()) if child in members
+        )
+        if node in position:
+            return path[position[node] :] + [node]
+        position[node] = len(path)
+        path.append(node)
+
+
+def raise_cycle_error(graph):
+    """
+    Raise a ValueError naming one of the cycles in the *graph*.
+    """
+    components = get_components(graph)
+    raise ValueError(
+        'Graph contains at least one cycle: {0}'.format(
+            ' -> '.join(str(node) for node in get_cycle(graph, components[0]))
+        )
+    )
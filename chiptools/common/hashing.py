@@ -0,0 +1,127 @@
+"""
+Content hashing helpers used to detect source file modifications.
+
+Files are hashed in bounded-size chunks so that very large generated sources
+do not need to be loaded into memory, and a list of files can be hashed in a
+single batch across a thread pool. The digest algorithm is configurable, the
+xxhash algorithm is only available if the optional *xxhash* package can be
+imported, otherwise blake2b is used instead.
+"""
+import hashlib
+import logging
+import os
+
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import xxhash  # type: ignore
+except ImportError:
+    xxhash = None
+
+log = logging.getLogger(__name__)
+
+# Number of bytes read from a file for each digest update
+CHUNK_SIZE = 1024 * 1024
+
+DEFAULT_ALGORITHM = 'blake2b'
+ALGORITHMS = ['md5', 'sha1', 'blake2b', 'xxhash']
+
+
+def get_algorithm(algorithm=None):
+    """
+    Return the name of the digest algorithm that will be used when the
+    given *algorithm* is requested. Unknown or unavailable algorithms are
+    replaced with the DEFAULT_ALGORITHM.
+    >>> get_algorithm('MD5')
+    'md5'
+    >>> get_algorithm()
+    'blake2b'
+    """
+    if algorithm is None:
+        return DEFAULT_ALGORITHM
+    algorithm = algorithm.lower()
+    if algorithm not in ALGORITHMS:
+        log.warning(
+            'Unknown digest algorithm {0}, using {1} instead.'.format(
+                algorithm, DEFAULT_ALGORITHM
+            )
+        )
+        return DEFAULT_ALGORITHM
+    if algorithm == 'xxhash' and xxhash is None:
+        log.warning(
+            'The xxhash package is not installed, using {0} instead.'.format(
+                DEFAULT_ALGORITHM
+            )
+        )
+        return DEFAULT_ALGORITHM
+    return algorithm
+
+
+def new_hash(algorithm=DEFAULT_ALGORITHM):
+    """
+    Return a new hash object for the given *algorithm* name.
+    """
+    if algorithm == 'xxhash':
+        return xxhash.xxh3_128()
+    return hashlib.new(algorithm)
+
+
+def file_digest(path, algorithm=DEFAULT_ALGORITHM):
+    """
+    Return the hex digest of the contents of the file at *path*. The file is
+    read in chunks of CHUNK_SIZE bytes into a reusable buffer so that memory
+    use is bounded regardless of the file size.
+    """
+    digest = new_hash(algorithm)
+    buffer = bytearray(CHUNK_SIZE)
+    view = memoryview(buffer)
+    with open(path, 'rb', buffering=0) as f:
+        while True:
+            count = f.readinto(buffer)
+            if not count:
+                break
+            digest.update(view[:count])
+    return digest.hexdigest()
+
+
+def file_digests(paths, algorithm=DEFAULT_ALGORITHM, max_workers=None):
+    """
+    Return a dictionary of path / hex digest pairs for each of the given
+    *paths*. The files are hashed concurrently using a pool of up to
+    *max_workers* threads, file reads and digest updates on large buffers
+    release the GIL so this scales with the available I/O bandwidth and
+    cores. Paths that cannot be read are omitted from the result.
+    """
+    paths = list(paths)
+    if max_workers is None:
+        max_workers = min(32, (os.cpu_count() or 1) + 4)
+
+    def _digest(path):
+        try:
+            return path, file_digest(path, algorithm)
+        except OSError as e:
+            log.debug('Could not hash {0}: {1}'.format(path, e))
+            return path, None
+
+    if len(paths) < 2 or max_workers < 2:
+        results = map(_digest, paths)
+    else:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(_digest, paths))
+    return dict(
+        (path, digest) for path, digest in results if digest is not None
+    )
+
+
+def data_digest(data, algorithm=DEFAULT_ALGORITHM):
+    """
+    Return the hex digest of the given *data*, which may be a bytes or str
+    object. Strings are UTF-8 encoded before hashing.
+    >>> data_digest('chiptools', 'md5')
+    'b1831fa34847d5f58f1ea3062dfe20f9'
+    """
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    digest = new_hash(algorithm)
+    digest.update(data)
+    return digest.hexdigest()
@@ -6,12 +6,13 @@ import sys
 import logging
 import threading
 import time
-import copy
 
 if __name__ == '__main__':
     import exceptions  # type: ignore
+    import graph as graphs  # type: ignore
 else:
     from chiptools.common import exceptions
+    from chiptools.common import graph as graphs
 
 log = logging.getLogger(__name__)
 
@@ -51,11 +52,13 @@ def create_parser():
     return parser
 
 
-def subgraph(graph, root):
+def subgraph(graph, root, cache=None):
     """
     Given a graph represented by a dictionary of key (node) and value (set of
     child nodes) and a root node, return a new graph representing the root node
-    and its hierarchy.
+    and its hierarchy. Each node is visited once, and the reachable set of
+    every visited node is stored in the optional *cache* dictionary so that
+    later queries reuse it, see graph.get_subgraph.
     >>> graph = {
     ...    2 : set([11]),
     ...    9 : set([11, 8]),
@@ -69,27 +72,15 @@ def subgraph(graph, root):
     >>> subgraph(graph, 8)
     {8: {3, 7}, 3: {5}, 5: set(), 7: set()}
     """
-
-    def subgraph_recurse(graph, root, top=False, new_graph=None):
-        if top:
-            new_graph = {root: graph[root]}
-        if root not in new_graph:
-            new_graph[root] = set()
-        if root not in graph:
-            return new_graph
-        for child in graph[root]:
-            new_graph[root].add(child)
-            subgraph_recurse(graph, child, new_graph=new_graph)
-        return new_graph
-
-    return subgraph_recurse(graph, root, top=True)
+    return graphs.get_subgraph(graph, root, cache)
 
 
 def topological_sort(graph):
     """
     Perform a topological sort on the graph and return a list of sorted nodes.
     The graph is represented as a dictionary where each key is a node and
-    the value is a list/set of connected child nodes.
+    the value is a list/set of connected child nodes. A ValueError naming a
+    cycle is raised if the graph contains cycles.
     >>> graph = {
     ...    2 : set([11]),
     ...    9 : set([11, 8]),
@@ -103,36 +94,7 @@ def topological_sort(graph):
     >>> topological_sort(graph)
     [3, 7, 5, 8, 11, 2, 9, 10]
     """
-    # Kahn's Algorithm (https://en.wikipedia.org/wiki/Topological_sorting)
-    # L ← Empty list that will contain the sorted elements
-    # S ← Set of all nodes with no incoming edges
-    # while S is non-empty do
-    #     remove a node n from S
-    #     add n to tail of L
-    #     for each node m with an edge e from n to m do
-    #         remove edge e from the graph
-    #         if m has no other incoming edges then
-    #             insert m into S
-    # if graph has edges then
-    #     return error (graph has at least one cycle)
-    # else
-    #     return L (a topologically sorted order)
-    # Construct a local shallow copy as we directly manipulate graph values
-    graph = dict((k, copy.copy(graph[k])) for k in graph.keys())
-    l = []  # noqa
-    # using type set() for S breaks ordering between python versions
-    s = list([node for node in graph if len(graph[node]) == 0])
-    while len(s) > 0:
-        n = s.pop()
-        l.append(n)
-        for m in list(filter(lambda x: n in graph[x], graph.keys())):
-            graph[m].remove(n)
-            if len(graph[m]) == 0:
-                s.insert(0, m)
-    if any(len(graph[n]) > 0 for n in graph.keys()):
-        raise ValueError('Graph contains at least one cycle')
-    else:
-        return l
+    return graphs.topological_sort(graph)
 
 
 def iterate_tests(test_suite_or_case):
@@ -0,0 +1,285 @@
+"""
+Content addressed storage for simulator build products.
+
+Elaborated designs, simulation executables and snapshots are expensive to
+build and only depend on a small set of inputs: the compiled design units,
+the top level and the elaboration options. An ArtifactCache stores each build
+product in a directory named by a digest of those inputs so that it can be
+reused by later simulations and by other processes sharing the simulation
+directory.
+"""
+import logging
+import os
+import shutil
+import tempfile
+import time
+
+from chiptools.common import hashing
+from chiptools.common.filelock import FileLock
+
+log = logging.getLogger(__name__)
+
+
+class ArtifactCache:
+    """
+    An ArtifactCache instance manages the artifact directories stored in the
+    *root* directory. Each artifact is a directory named by its key with the
+    optional *prefix*, next to a marker file that is written once the
+    artifact is complete. Only directories with a marker file are used or
+    evicted, which allows the cache to share a directory with other files
+    and directories, even if their names start with the prefix. Artifacts
+    are built in a temporary directory and renamed into place once complete
+    so that incomplete artifacts are never used.
+
+    When a new artifact is stored, artifacts that have not been used for
+    more than *max_age* seconds are removed, then the least recently used
+    artifacts are removed until at most *max_entries* artifacts using at most
+    *max_size* bytes remain. Limits that are None are not enforced. If
+    *on_remove* is not None it is called with the path of each artifact
+    before it is removed, so that build products held outside the cache
+    directory can be deleted.
+    """
+
+    def __init__(
+        self,
+        root,
+        max_entries=None,
+        max_age=None,
+        max_size=None,
+        prefix='',
+        on_remove=None,
+    ):
+        self.root = root
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.max_size = max_size
+        self.prefix = prefix
+        self.on_remove = on_remove
+
+    @staticmethod
+    def get_key(*parts):
+        """
+        Return the artifact key for the given *parts*, which may be any
+        values with a stable repr.
+
+        >>> ArtifactCache.get_key('lib', 'top') == ArtifactCache.get_key(
+        ...     'lib', 'top'
+        ... )
+        True
+        >>> ArtifactCache.get_key('lib', 'top') == ArtifactCache.get_key(
+        ...     'lib', 'top', ('-gwidth=8',)
+        ... )
+        False
+        """
+        return hashing.data_digest(repr(parts), hashing.DEFAULT_ALGORITHM)
+
+    def get_path(self, key):
+        """
+        Return the path of the directory for the artifact with the given
+        *key*, the directory may not exist.
+        """
+        return os.path.join(self.root, self.prefix + key)
+
+    def get_marker(self, key):
+        """
+        Return the path of the marker file that identifies the directory for
+        the artifact with the given *key* as a complete artifact.
+        """
+        return os.path.join(self.root, self.prefix + key + '.artifact')
+
+    def get_lock(self, key):
+        """
+        Return a FileLock that must be held while building the artifact with
+        the given *key*.
+        """
+        return FileLock(os.path.join(self.root, self.prefix + key + '.lock'))
+
+    def lookup(self, key):
+        """
+        Return the path of the directory for the artifact with the given
+        *key*, or None if the artifact has not been built.
+        """
+        path = self.get_path(key)
+        if not os.path.isdir(path) or not os.path.isfile(
+            self.get_marker(key)
+        ):
+            return None
+        # Record the use of the artifact
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        return path
+
+    def get(self, key, build, in_place=False, validate=None):
+        """
+        Return the path of the directory for the artifact with the given
+        *key*. If the artifact has not been built the *build* function is
+        called with the path of an empty directory to populate, if it raises
+        an exception nothing is stored. Only one process builds a given
+        artifact at a time, other processes wait for it to finish and reuse
+        the result.
+
+        Tools that cannot relocate their output are built *in_place*, the
+        *build* function is called with the final path of the artifact,
+        which does not exist. The artifact is not used until the build
+        returns and its marker file is written.
+
+        Tools that keep their build products outside the artifact directory
+        supply a *validate* function, which is called with the path of a
+        stored artifact and returns False if its build products were
+        deleted. The artifact is then built again.
+        """
+        path = self.lookup(key)
+        if path is not None and (validate is None or validate(path)):
+            log.debug('...reusing cached artifact: ' + path)
+            return path
+        if not os.path.exists(self.root):
+            os.makedirs(self.root, exist_ok=True)
+        with self.get_lock(key):
+            path = self.lookup(key)
+            if path is not None:
+                if validate is None or validate(path):
+                    log.debug('...reusing cached artifact: ' + path)
+                    return path
+                log.info('...rebuilding incomplete artifact: ' + path)
+                os.remove(self.get_marker(key))
+            start_time = time.time()
+            path = self.get_path(key)
+            # Remove the remains of an interrupted build
+            shutil.rmtree(path, ignore_errors=True)
+            if in_place:
+                self._build_in_place(path, build)
+            else:
+                staging = tempfile.mkdtemp(dir=self.root, prefix='.build_')
+                try:
+                    build(staging)
+                    os.replace(staging, path)
+                finally:
+                    if os.path.exists(staging):
+                        shutil.rmtree(staging, ignore_errors=True)
+            with open(self.get_marker(key), 'w'):
+                pass
+            log.debug(
+                '...cached artifact {0} in {1:.2f}s'.format(
+                    path, time.time() - start_time
+                )
+            )
+        self.evict(keep=key)
+        return path
+
+    @staticmethod
+    def _build_in_place(path, build):
+        try:
+            build(path)
+            if not os.path.isdir(path):
+                os.makedirs(path)
+        except BaseException:
+            shutil.rmtree(path, ignore_errors=True)
+            raise
+
+    def get_entries(self):
+        """
+        Return a list of (last_used, key) tuples for the stored artifacts,
+        sorted from the least to the most recently used.
+        """
+        entries = []
+        if not os.path.isdir(self.root):
+            return entries
+        for name in os.listdir(self.root):
+            if (
+                name.startswith('.')
+                or not name.startswith(self.prefix)
+                or not name.endswith('.artifact')
+            ):
+                continue
+            key = name[len(self.prefix) : -len('.artifact')]
+            path = self.get_path(key)
+            if not os.path.isdir(path):
+                continue
+            try:
+                entries.append((os.stat(path).st_mtime, key))
+            except OSError:
+                continue
+        return sorted(entries)
+
+    @staticmethod
+    def get_size(path):
+        """
+        Return the total size in bytes of the files in the directory at
+        *path*.
+        """
+        size = 0
+        for dirpath, dirnames, filenames in os.walk(path):
+            for name in filenames:
+                try:
+                    size += os.lstat(os.path.join(dirpath, name)).st_size
+                except OSError:
+                    continue
+        return size
+
+    def remove(self, key):
+        """
+        Remove the artifact with the given *key* from the cache, along with
+        its lock file. Directories without a marker file are not removed.
+        """
+        with self.get_lock(key) as lock:
+            path = self.get_path(key)
+            marker = self.get_marker(key)
+            if os.path.isfile(marker):
+                if self.on_remove is not None and os.path.isdir(path):
+                    try:
+                        self.on_remove(path)
+                    except Exception as e:
+                        log.warning(
+                            'Could not remove artifact {0}: {1}'.format(
+                                path, e
+                            )
+                        )
+                os.remove(marker)
+                shutil.rmtree(path, ignore_errors=True)
+            lock.unlink()
+
+    def evict(self, keep=None):
+        """
+        Remove the artifacts that exceed the age, count and size limits of
+        the cache, least recently used first. The artifact with the key
+        *keep* is never removed.
+        """
+        limits = (self.max_entries, self.max_age, self.max_size)
+        if all(limit is None for limit in limits):
+            return
+        entries = self.get_entries()
+        evicted = set()
+        if self.max_age is not None:
+            now = time.time()
+            for last_used, key in entries:
+                if now - last_used > self.max_age:
+                    evicted.add(key)
+        if self.max_entries is not None:
+            excess = len(entries) - len(evicted) - self.max_entries
+            for last_used, key in entries:
+                if excess <= 0:
+                    break
+                if key != keep and key not in evicted:
+                    evicted.add(key)
+                    excess -= 1
+        if self.max_size is not None:
+            remaining = [
+                key for last_used, key in entries if key not in evicted
+            ]
+            sizes = dict(
+                (key, ArtifactCache.get_size(self.get_path(key)))
+                for key in remaining
+            )
+            excess = sum(sizes.values()) - self.max_size
+            for key in remaining:
+                if excess <= 0:
+                    break
+                if key != keep:
+                    evicted.add(key)
+                    excess -= sizes[key]
+        evicted.discard(keep)
+        for key in sorted(evicted):
+            log.debug('...evicting cached artifact: ' + key)
+            self.remove(key)
@@ -1,6 +1,5 @@
 from copy import deepcopy
-import pickle
-import hashlib
+import sqlite3
 import os
 import traceback
 import logging
@@ -9,6 +8,8 @@ import time
 
 from typing import Any, Dict
 
+from chiptools.common import hashing
+from chiptools.common.filelock import FileLock
 from chiptools.common import utils
 
 log = logging.getLogger(__name__)
@@ -25,12 +26,52 @@ class FileCache:
     determine if a given File object has been modified since it was last added
     to the cache.
 
-    Internally the cache file is stored as a Pickled dictionary of two items:
+    Internally the cache file is an SQLite database in WAL mode holding the
+    following tables:
 
-      * LIBRARIES : A set of libraries that were added to the cache using
-        *add_library*
-      * FILES : A dictionary of file path / file md5 sum pairs
-        of files added using *add_file*
+      * libraries : The (tool, library) names that were added to the cache
+        using *add_library*
+      * files : The (tool, path, size, mtime_ns, inode, digest, context,
+        key, interface) records of files added using *add_file*
+      * versions : The version strings reported by tool executables, keyed
+        on the executable path and its stat signature
+      * manifests : The (tool, name, root) Merkle roots recorded using
+        *set_manifest* for a library or a whole project, a matching root
+        shows that none of the files it covers have changed
+      * sources : The (path, size, mtime_ns, inode, digest) records of
+        source files hashed by *get_source_digests*, independent of any tool
+      * parses : The (digest, library, version, summary) records holding the
+        design units found by the VHDL parser in a file with the given
+        content digest, see *get_parse_summaries*
+
+    Every call to *add_file*, *remove_file* or *add_library* is committed to
+    the database immediately as a single atomic update, so an interrupted
+    compilation keeps the progress made up to the point of failure. The
+    records for a tool are only read from the database the first time the
+    tool is queried, so the load time does not depend on the number of tools
+    held in the cache.
+
+    Several processes can share one cache file. Updates replace individual
+    records so concurrent writers merge rather than overwrite each other's
+    work, and SQLite serialises the writes. Operations that span several
+    records, such as *initialise_cache*, additionally hold an advisory
+    FileLock on the cache. The *refresh* and *refresh_file* methods discard
+    locally held records so that updates made by other processes are seen.
+
+    Change detection compares the stat signature (size, mtime_ns, inode) of
+    a file with the cached signature first, files with a matching signature
+    are considered unchanged without being opened. The file is only hashed
+    when the signature differs, or when *verify* is set, which forces a full
+    content comparison for every file. Digests are prefixed with the name of
+    the algorithm that produced them so that digests produced by different
+    algorithms never compare equal.
+
+    Files are compiled in a context, which is a digest supplied by the caller
+    over everything other than the file contents that affects the compiled
+    output, such as the compile arguments, the target library and the tool
+    version. A file is changed if either its contents or its context differ
+    from the cached record. The cache key of a file is a digest over both its
+    contents and its context.
     """
 
     cache_file_name = '_compilation.cache'
@@ -40,17 +81,118 @@ class FileCache:
         field_id_libraries: set(),
         field_id_files: {},
     }
+    # Increment the schema version when the table layout changes, older
+    # cache files are then discarded and re-initialised.
+    schema_version = 6
+    schema = (
+        'CREATE TABLE IF NOT EXISTS files ('
+        'tool TEXT NOT NULL, '
+        'path TEXT NOT NULL, '
+        'size INTEGER, '
+        'mtime_ns INTEGER, '
+        'inode INTEGER, '
+        'digest TEXT, '
+        'context TEXT, '
+        'key TEXT, '
+        'interface TEXT, '
+        'PRIMARY KEY (tool, path))',
+        'CREATE TABLE IF NOT EXISTS libraries ('
+        'tool TEXT NOT NULL, '
+        'name TEXT NOT NULL, '
+        'PRIMARY KEY (tool, name))',
+        'CREATE TABLE IF NOT EXISTS versions ('
+        'executable TEXT PRIMARY KEY, '
+        'size INTEGER, '
+        'mtime_ns INTEGER, '
+        'version TEXT)',
+        'CREATE TABLE IF NOT EXISTS manifests ('
+        'tool TEXT NOT NULL, '
+        'name TEXT NOT NULL, '
+        'root TEXT, '
+        'PRIMARY KEY (tool, name))',
+        'CREATE TABLE IF NOT EXISTS sources ('
+        'path TEXT PRIMARY KEY, '
+        'size INTEGER, '
+        'mtime_ns INTEGER, '
+        'inode INTEGER, '
+        'digest TEXT)',
+        'CREATE TABLE IF NOT EXISTS parses ('
+        'digest TEXT NOT NULL, '
+        'library TEXT NOT NULL, '
+        'version INTEGER, '
+        'summary TEXT, '
+        'PRIMARY KEY (digest, library))',
+        'CREATE TABLE IF NOT EXISTS stale ('
+        'tool TEXT NOT NULL, '
+        'path TEXT NOT NULL, '
+        'PRIMARY KEY (tool, path))',
+    )
 
-    def __init__(self, cache_path):
+    def __init__(self, cache_path, verify=False, algorithm=None):
         """
         Create a FileCache instance using the *projectPath* as the basis for
-        the cache file name and root directory.
+        the cache file name and root directory. If *verify* is True the
+        stat signature fast path is disabled and file contents are always
+        hashed when checking for changes. The optional *algorithm* selects
+        the digest algorithm used to hash file contents, see
+        chiptools.common.hashing for the supported names.
         """
         self.cache_path = cache_path + self.cache_file_name
+        self.verify = verify
+        self.algorithm = hashing.get_algorithm(algorithm)
+        self.connection = None
+        # Per-tool cache elements, loaded from the database on first use.
+        self.cache = {}
+        # Digests computed by is_file_changed, keyed on path, so that
+        # add_file does not need to hash the same file a second time.
+        self._pending = {}
+        # Records of the sources table, loaded from the database on first use.
+        self._sources = None
+        self.load_cache()
+
+    def _connect(self):
+        """
+        Open the cache database and create the tables if they do not exist.
+        An exception is raised if the cache file is not a valid database.
+        """
+        # The connection may be used by compilation worker threads, callers
+        # are responsible for serialising access to the FileCache.
+        connection = sqlite3.connect(
+            self.cache_path,
+            timeout=30,
+            isolation_level=None,
+            check_same_thread=False,
+        )
         try:
-            self.load_cache()
-        except IOError:
-            self.initialise_cache()
+            version = connection.execute('PRAGMA user_version').fetchone()[0]
+            if version not in (0, self.schema_version):
+                raise sqlite3.DatabaseError(
+                    'Unsupported cache schema version: {0}'.format(version)
+                )
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            for statement in self.schema:
+                connection.execute(statement)
+            connection.execute(
+                'PRAGMA user_version={0}'.format(self.schema_version)
+            )
+        except Exception:
+            connection.close()
+            raise
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def _remove_files(self):
+        """
+        Remove the cache database and its write-ahead log files.
+        """
+        for suffix in ['', '-wal', '-shm']:
+            if os.path.exists(self.cache_path + suffix):
+                os.remove(self.cache_path + suffix)
 
     def load_cache(self):
         """
@@ -58,15 +200,23 @@ class FileCache:
         file is present a new one will be created.
         """
         start_time = time.time()
+        self._close()
+        self.cache = {}
+        self._pending = {}
+        self._sources = None
         try:
-            # Load the cache file so we know the compilation state of the
+            # Open the cache file so we know the compilation state of the
             # design
-            with open(self.cache_path, 'rb') as pickeFile:
-                self.cache = pickle.load(pickeFile)
+            self.connection = self._connect()
         except Exception:
-            log.warning('The cache file was corrupted, re-initialising...')
+            log.warning(
+                'The cache file was corrupted or created by an '
+                + 'incompatible version, re-initialising...'
+            )
             log.debug(traceback.format_exc())
-            self.initialise_cache()
+            with self.lock():
+                self._remove_files()
+                self.connection = self._connect()
         log.debug(
             'Cache loaded in '
             + utils.time_delta_string(start_time, time.time())
@@ -74,115 +224,622 @@ class FileCache:
 
     def initialise_cache(self):
         """
-        Initialise the FileCache by generating a new cache file and clearing
-        the local cache dictionary.
+        Initialise the FileCache by clearing the cache file and the local
+        cache dictionary.
         """
         log.debug('Clearing cache...')
-        # The cache file doesn't exist, so we will create a new one
         self.cache = {}
-        self.save_cache()
+        self._pending = {}
+        self._sources = None
+        with self.lock():
+            with self.connection:
+                self.connection.execute('BEGIN IMMEDIATE')
+                self.connection.execute('DELETE FROM files')
+                self.connection.execute('DELETE FROM libraries')
+                self.connection.execute('DELETE FROM versions')
+                self.connection.execute('DELETE FROM manifests')
+                self.connection.execute('DELETE FROM sources')
+                self.connection.execute('DELETE FROM parses')
+                self.connection.execute('DELETE FROM stale')
+
+    def lock(self):
+        """
+        Return an advisory FileLock for this cache that can be held to
+        exclude other processes while performing a sequence of dependent
+        cache updates.
+        """
+        return FileLock(self.cache_path + '.lock')
+
+    def refresh(self, tool_name=None):
+        """
+        Discard the locally held records for *tool_name*, or for all tools if
+        *tool_name* is None, so that they are reloaded from the cache file
+        including any updates made by other processes.
+        """
+        if tool_name is None:
+            self.cache = {}
+            self._sources = None
+        else:
+            self.cache.pop(tool_name, None)
+
+    def refresh_file(self, file_object, tool_name):
+        """
+        Reload the record for the given *file_object* and the library names
+        for *tool_name* from the cache file, picking up any update made by
+        another process since the records were loaded.
+        """
+        element = self._get_element(tool_name)
+        if element is None:
+            return
+        row = self.connection.execute(
+            'SELECT size, mtime_ns, inode, digest, context, key, interface '
+            + 'FROM files WHERE tool = ? AND path = ?',
+            (tool_name, file_object.path),
+        ).fetchone()
+        if row is None:
+            element[self.field_id_files].pop(file_object.path, None)
+        else:
+            element[self.field_id_files][file_object.path] = tuple(row)
+        element[self.field_id_libraries].update(
+            r[0]
+            for r in self.connection.execute(
+                'SELECT name FROM libraries WHERE tool = ?', (tool_name,)
+            )
+        )
 
     def save_cache(self):
         """
-        Store the local cache dictionary into the linked cache file so that it
-        can be retrieved later.
+        Ensure that all cache updates have been written to the linked cache
+        file. Updates are committed as they are made so this only needs to
+        flush the write-ahead log.
         """
         log.debug('Saving cache...')
-        with open(self.cache_path, 'wb') as cache_file:
-            pickle.dump(self.cache, cache_file)
+        self.connection.execute('PRAGMA wal_checkpoint(PASSIVE)')
         log.debug('...done')
 
-    def is_file_changed(self, file_object, tool_name):
+    def _get_element(self, tool_name, create=False):
+        """
+        Return the local cache dictionary element for *tool_name*, loading it
+        from the cache file if required. If the tool has no cached records
+        None is returned unless *create* is True, in which case a blank
+        element is returned.
+        """
+        if tool_name not in self.cache:
+            files = {}
+            for row in self.connection.execute(
+                'SELECT path, size, mtime_ns, inode, digest, context, key, '
+                + 'interface FROM files WHERE tool = ?',
+                (tool_name,),
+            ):
+                files[row[0]] = tuple(row[1:])
+            libraries = set(
+                row[0]
+                for row in self.connection.execute(
+                    'SELECT name FROM libraries WHERE tool = ?', (tool_name,)
+                )
+            )
+            if len(files) == 0 and len(libraries) == 0 and not create:
+                return None
+            self.cache[tool_name] = deepcopy(self.blank_cache_element)
+            self.cache[tool_name][self.field_id_files] = files
+            self.cache[tool_name][self.field_id_libraries] = libraries
+        return self.cache[tool_name]
+
+    def _set_file_entry(
+        self, tool_name, path, signature, digest, context, interface=None
+    ):
         """
-        Compare the given md5 with the given file path from the cache, if
-        the match return True or return False if the hashes do not match or
-        the file does not exist.
+        Store the (size, mtime_ns, inode, digest, context, key, interface)
+        entry for *path* in the local cache dictionary and the cache file and
+        return the key.
+        """
+        key = FileCache.get_key(digest, context)
+        entry = signature + (digest, context, key, interface)
+        self._get_element(tool_name, create=True)[self.field_id_files][
+            path
+        ] = entry
+        self.connection.execute(
+            'INSERT OR REPLACE INTO files '
+            + '(tool, path, size, mtime_ns, inode, digest, context, key, '
+            + 'interface) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (tool_name, path) + entry,
+        )
+        return key
+
+    @staticmethod
+    def get_stat_signature(path):
+        """
+        Return a (size, mtime_ns, inode) tuple for the file at *path* that
+        can be used to detect file modifications without reading the file.
+        """
+        st = os.stat(path)
+        return (st.st_size, st.st_mtime_ns, st.st_ino)
+
+    def get_digest(self, path):
+        """
+        Return the digest of the contents of the file at *path*, prefixed
+        with the name of the digest algorithm.
+        """
+        return '{0}:{1}'.format(
+            self.algorithm, hashing.file_digest(path, self.algorithm)
+        )
+
+    @staticmethod
+    def get_key(digest, context):
+        """
+        Return the cache key for a file with the given content *digest*
+        compiled in the given *context*.
+        """
+        return hashing.data_digest(
+            '{0}\n{1}'.format(digest, context), hashing.DEFAULT_ALGORITHM
+        )
+
+    def get_file_key(self, file_object, tool_name):
+        """
+        Return the cache key recorded for *file_object* when it was last
+        added to the cache, or None if it is not in the cache.
+        """
+        element = self._get_element(tool_name)
+        if element is None:
+            return None
+        entry = element[self.field_id_files].get(file_object.path, None)
+        return None if entry is None else entry[5]
+
+    def get_file_context(self, file_object, tool_name):
+        """
+        Return the compile context recorded for *file_object* when it was
+        last added to the cache, or None if it is not in the cache.
+        """
+        element = self._get_element(tool_name)
+        if element is None:
+            return None
+        entry = element[self.field_id_files].get(file_object.path, None)
+        return None if entry is None else entry[4]
+
+    def get_file_interface(self, file_object, tool_name, context=''):
+        """
+        Return the interface digest recorded for *file_object* when it was
+        last added to the cache, or None if it is not in the cache, no
+        interface digest was recorded or it was compiled in a different
+        *context*.
+        """
+        element = self._get_element(tool_name)
+        if element is None:
+            return None
+        entry = element[self.field_id_files].get(file_object.path, None)
+        if entry is None or entry[4] != context:
+            return None
+        return entry[6]
+
+    def get_file_signature(self, file_object, tool_name, context=''):
+        """
+        Return the stat signature recorded for *file_object* when it was last
+        added to the cache, or None if it is not in the cache or it was
+        compiled in a different *context*.
+        """
+        element = self._get_element(tool_name)
+        if element is None:
+            return None
+        entry = element[self.field_id_files].get(file_object.path, None)
+        if entry is None or entry[4] != context:
+            return None
+        return tuple(entry[:3])
+
+    @staticmethod
+    def get_manifest_root(entries):
+        """
+        Return the Merkle root over the given *entries*, an iterable of
+        tuples of strings and integers. The root does not depend on the
+        order of the entries.
+        """
+        return hashing.data_digest(
+            '\n'.join(sorted(repr(tuple(entry)) for entry in entries)),
+            hashing.DEFAULT_ALGORITHM,
+        )
+
+    def get_manifest(self, tool_name, name):
+        """
+        Return the Merkle root recorded for the library or project *name*
+        for *tool_name*, or None if no root is recorded.
+        """
+        row = self.connection.execute(
+            'SELECT root FROM manifests WHERE tool = ? AND name = ?',
+            (tool_name, name),
+        ).fetchone()
+        return None if row is None else row[0]
+
+    def set_manifest(self, tool_name, name, root):
+        """
+        Record the Merkle *root* for the library or project *name* for
+        *tool_name*.
+        """
+        self.connection.execute(
+            'INSERT OR REPLACE INTO manifests (tool, name, root) '
+            + 'VALUES (?, ?, ?)',
+            (tool_name, name, root),
+        )
+
+    def clear_manifests(self, tool_name):
+        """
+        Discard the Merkle roots recorded for *tool_name*.
+        """
+        self.connection.execute(
+            'DELETE FROM manifests WHERE tool = ?', (tool_name,)
+        )
+
+    def mark_file_stale(self, fileObject, tool_name):
+        """
+        Record that the given *fileObject* must be compiled again for
+        *tool_name* because a file that it depends on changed, even though
+        the file itself is unchanged. The record is kept until the file is
+        added to or removed from the cache.
+        """
+        self.clear_manifests(tool_name)
+        self.connection.execute(
+            'INSERT OR IGNORE INTO stale (tool, path) VALUES (?, ?)',
+            (tool_name, fileObject.path),
+        )
+
+    def get_stale_paths(self, tool_name):
+        """
+        Return the set of paths of the files marked by *mark_file_stale* for
+        *tool_name*.
+        """
+        return set(
+            row[0]
+            for row in self.connection.execute(
+                'SELECT path FROM stale WHERE tool = ?', (tool_name,)
+            )
+        )
+
+    def get_source_digests(self, paths):
+        """
+        Return a dictionary mapping each of the given *paths* to a
+        (signature, digest) tuple holding the stat signature and the content
+        digest of the file. Files whose stat signature matches the signature
+        recorded in the cache are not hashed, the others are hashed in a
+        single concurrent batch and recorded. Digests are shared with
+        *precompute_digests* and *is_file_changed*, so that each modified
+        file is hashed once when it is both parsed and compiled. Files that
+        do not exist are not included in the dictionary.
+        """
+        if self._sources is None:
+            self._sources = dict(
+                (row[0], (tuple(row[1:4]), row[4]))
+                for row in self.connection.execute(
+                    'SELECT path, size, mtime_ns, inode, digest FROM sources'
+                )
+            )
+        result = {}
+        signatures = {}
+        for path in paths:
+            try:
+                signature = FileCache.get_stat_signature(path)
+            except OSError:
+                continue
+            entry = self._sources.get(path, None)
+            if entry is not None and entry[0] == signature:
+                result[path] = entry
+            else:
+                signatures[path] = signature
+        if len(signatures) == 0:
+            return result
+        digests = {}
+        for path, signature in signatures.items():
+            pending = self._pending.get(path, None)
+            if pending is not None and pending[0] == signature:
+                digests[path] = pending[1]
+        hashed = hashing.file_digests(
+            [path for path in signatures if path not in digests],
+            self.algorithm,
+        )
+        for path, digest in hashed.items():
+            digest = '{0}:{1}'.format(self.algorithm, digest)
+            self._pending[path] = (signatures[path], digest)
+            digests[path] = digest
+        rows = []
+        for path, digest in digests.items():
+            entry = (signatures[path], digest)
+            self._sources[path] = entry
+            result[path] = entry
+            rows.append((path,) + entry[0] + (entry[1],))
+        with self.connection:
+            self.connection.execute('BEGIN IMMEDIATE')
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO sources '
+                + '(path, size, mtime_ns, inode, digest) '
+                + 'VALUES (?, ?, ?, ?, ?)',
+                rows,
+            )
+        return result
+
+    def get_parse_summaries(self, version):
+        """
+        Return a dictionary mapping (digest, library) tuples to the parse
+        summaries recorded by *set_parse_summaries* with the given parser
+        *version*.
+        """
+        return dict(
+            ((row[0], row[1]), row[2])
+            for row in self.connection.execute(
+                'SELECT digest, library, summary FROM parses '
+                + 'WHERE version = ?',
+                (version,),
+            )
+        )
+
+    def set_parse_summaries(self, summaries, version, paths=None):
+        """
+        Record the (digest, library, summary) tuples in the *summaries* list
+        for the given parser *version*. If the *paths* of the source files
+        in the project are given the records of other source files are
+        removed. Summaries for content digests that no longer match any
+        recorded source file are discarded.
+        """
+        with self.connection:
+            self.connection.execute('BEGIN IMMEDIATE')
+            if paths is not None:
+                paths = set(paths)
+                removed = [
+                    row
+                    for row in self.connection.execute(
+                        'SELECT path FROM sources'
+                    )
+                    if row[0] not in paths
+                ]
+                self.connection.executemany(
+                    'DELETE FROM sources WHERE path = ?', removed
+                )
+                if self._sources is not None:
+                    for row in removed:
+                        self._sources.pop(row[0], None)
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO parses '
+                + '(digest, library, version, summary) VALUES (?, ?, ?, ?)',
+                (
+                    (digest, library, version, summary)
+                    for digest, library, summary in summaries
+                ),
+            )
+            self.connection.execute(
+                'DELETE FROM parses WHERE version != ? OR digest NOT IN '
+                + '(SELECT digest FROM sources)',
+                (version,),
+            )
+
+    def get_tool_version(self, executable, probe):
+        """
+        Return the version string for the tool *executable*. The version is
+        recorded in the cache against the stat signature of the executable,
+        *probe* is only called to obtain the version string from the tool if
+        the executable has been modified or has not been seen before.
+        """
+        try:
+            st = os.stat(executable)
+            signature = (st.st_size, st.st_mtime_ns)
+        except OSError:
+            return probe()
+        row = self.connection.execute(
+            'SELECT size, mtime_ns, version FROM versions '
+            + 'WHERE executable = ?',
+            (executable,),
+        ).fetchone()
+        if row is not None and tuple(row[:2]) == signature:
+            return row[2]
+        version = probe()
+        self.connection.execute(
+            'INSERT OR REPLACE INTO versions '
+            + '(executable, size, mtime_ns, version) VALUES (?, ?, ?, ?)',
+            (executable,) + signature + (version,),
+        )
+        return version
+
+    def precompute_digests(
+        self, file_objects, tool_name, verify=None, contexts=None
+    ):
+        """
+        Hash all of the given *file_objects* that cannot be resolved by the
+        stat signature fast path in a single concurrent batch. The digests
+        are held by this FileCache so that subsequent calls to
+        *is_file_changed* and *add_file* for the same files do not hash them
+        again. The optional *verify* argument overrides the *verify* setting
+        of this FileCache instance. The optional *contexts* dictionary maps
+        file paths to compile contexts, files whose context has changed are
+        hashed as they will need to be added to the cache again. Digests
+        computed or recorded by *get_source_digests* are reused.
+        """
+        contexts = {} if contexts is None else contexts
+        verify = self.verify if verify is None else verify
+        element = self._get_element(tool_name)
+        files = {} if element is None else element[self.field_id_files]
+        signatures = {}
+        for file_object in file_objects:
+            path = file_object.path
+            if path in signatures:
+                continue
+            try:
+                signature = FileCache.get_stat_signature(path)
+            except OSError:
+                continue
+            entry = files.get(path, None)
+            if (
+                not verify
+                and entry is not None
+                and tuple(entry[:3]) == signature
+                and entry[4] == contexts.get(path, '')
+            ):
+                continue
+            pending = self._pending.get(path, None)
+            if pending is not None and pending[0] == signature:
+                continue
+            source = None if self._sources is None else self._sources.get(path)
+            if not verify and source is not None and source[0] == signature:
+                self._pending[path] = source
+                continue
+            signatures[path] = signature
+        if len(signatures) == 0:
+            return
+        start_time = time.time()
+        digests = hashing.file_digests(signatures.keys(), self.algorithm)
+        for path, digest in digests.items():
+            self._pending[path] = (
+                signatures[path],
+                '{0}:{1}'.format(self.algorithm, digest),
+            )
+        log.debug(
+            'Hashed {0} file(s) in '.format(len(digests))
+            + utils.time_delta_string(start_time, time.time())
+        )
+
+    def _get_pending_digest(self, path, signature):
+        """
+        Return the digest computed for *path* by *precompute_digests* or
+        *is_file_changed* if the file is unchanged since it was hashed,
+        otherwise hash the file now.
+        """
+        pending = self._pending.get(path, None)
+        if pending is not None and pending[0] == signature:
+            return pending[1]
+        digest = self.get_digest(path)
+        self._pending[path] = (signature, digest)
+        return digest
+
+    def is_file_changed(
+        self, file_object, tool_name, verify=None, context=''
+    ):
+        """
+        Return True if the given *file_object* has been modified since it was
+        last added to the cache for *tool_name*, or False if it is unchanged
+        or does not exist. A file is also changed if the given compile
+        *context* differs from the context it was last added with.
+
+        Files whose stat signature matches the cached signature are reported
+        as unchanged without being opened. Otherwise the file is hashed and
+        the digest is compared with the cached digest. The optional *verify*
+        argument overrides the *verify* setting of this FileCache instance.
         """
         path = file_object.path
         if not os.path.exists(path):
             log.error('File does not exist: {0}'.format(path))
             return False
+        verify = self.verify if verify is None else verify
 
-        if tool_name in self.cache:
-            cached_md5 = self.cache[tool_name][self.field_id_files].get(
-                path, None
-            )
-            with open(path, 'rb') as f:
-                md5 = hashlib.md5(f.read()).hexdigest()
-            if cached_md5 == md5:
-                # File is not changed
-                return False
-            else:
-                # File was changed
-                return True
+        element = self._get_element(tool_name)
+        if element is None:
+            return True
+        entry = element[self.field_id_files].get(path, None)
+        if entry is None:
             # File is not in cache
             return True
-        else:
+        if entry[4] != context:
+            # The file was compiled in a different context
             return True
+        signature = FileCache.get_stat_signature(path)
+        cached_signature, cached_digest = tuple(entry[:3]), entry[3]
+        if not verify and cached_signature == signature:
+            # File is not changed
+            return False
+        digest = self._get_pending_digest(path, signature)
+        if cached_digest == digest:
+            # The file was touched but its contents are unchanged, refresh
+            # the signature so that the next check can use the fast path.
+            self._set_file_entry(
+                tool_name, path, signature, digest, context, entry[6]
+            )
+            return False
+        # File was changed
+        return True
 
     def library_in_cache(self, libname, tool_name):
         """
         Return True if the given *libname* library name is present in the
         local cache dictionary.
         """
-        if tool_name in self.cache:
-            return libname in self.cache[tool_name][self.field_id_libraries]
+        element = self._get_element(tool_name)
+        if element is not None:
+            return libname in element[self.field_id_libraries]
         return False
 
     def get_libraries(self, tool_name):
         """
         Return the local cache dictionary library name set.
         """
-        if tool_name in self.cache:
-            return self.cache[tool_name].get(self.field_id_libraries, set())
+        element = self._get_element(tool_name)
+        if element is not None:
+            return element.get(self.field_id_libraries, set())
         return set()
 
     def get_tool_names(self):
-        return list(self.cache.keys())
+        return [
+            row[0]
+            for row in self.connection.execute(
+                'SELECT tool FROM files UNION SELECT tool FROM libraries'
+            )
+        ]
 
     def add_library(self, library, tool_name):
         """
         Add the given *library* name to the local cache dictionary library
         name set.
         """
-        if tool_name not in self.cache:
-            self.cache[tool_name] = deepcopy(self.blank_cache_element)
-        self.cache[tool_name][self.field_id_libraries].add(library)
+        self._get_element(tool_name, create=True)[
+            self.field_id_libraries
+        ].add(library)
+        self.connection.execute(
+            'INSERT OR IGNORE INTO libraries (tool, name) VALUES (?, ?)',
+            (tool_name, library),
+        )
         log.debug('Library added to cache: ' + library)
 
-    def add_file(self, fileObject, tool_name):
+    def add_file(self, fileObject, tool_name, context='', interface=None):
         """
-        Add the given *fileObject* to the local cache file/md5 dictionary. The
+        Add the given *fileObject* to the local cache file dictionary. The
         FileObject MD5 and compilation time are updated by this method before
-        it is added to the cache.
+        it is added to the cache along with the file stat signature, the
+        compile *context* and the optional *interface* digest of the design
+        units declared by the file. The file is only hashed if no digest is
+        pending from *precompute_digests* or *is_file_changed* for an
+        unchanged stat signature.
         """
-        if tool_name not in self.cache:
-            self.cache[tool_name] = deepcopy(self.blank_cache_element)
-        with open(fileObject.path, 'rb') as f:
-            md5 = hashlib.md5(f.read()).hexdigest()
+        signature = FileCache.get_stat_signature(fileObject.path)
+        digest = self._get_pending_digest(fileObject.path, signature)
+        self._pending.pop(fileObject.path, None)
         fileObject.compile_time = datetime.datetime.now().strftime(
             '%Y-%m-%d %H:%M:%S'
         )
-        fileObject.md5 = md5
-        self.cache[tool_name][self.field_id_files][
-            fileObject.path
-        ] = fileObject.md5
+        fileObject.md5 = digest
+        key = self._set_file_entry(
+            tool_name, fileObject.path, signature, digest, context, interface
+        )
+        self.connection.execute(
+            'DELETE FROM stale WHERE tool = ? AND path = ?',
+            (tool_name, fileObject.path),
+        )
         log.debug(
             'File added to cache: '
             + os.path.basename(fileObject.path)
-            + ' MD5: '
-            + md5
+            + ' key: '
+            + key
         )
 
     def remove_file(self, fileObject, tool_name):
         """
-        Remove the given *fileObject* from the local cache file/md5 dictionary
+        Remove the given *fileObject* from the local cache file dictionary
         if it is present.
         """
-        if tool_name not in self.cache:
-            self.cache[tool_name] = deepcopy(self.blank_cache_element)
-        if fileObject.path in self.cache[tool_name][self.field_id_files]:
-            del self.cache[tool_name][self.field_id_files][fileObject.path]
+        self._pending.pop(fileObject.path, None)
+        self.clear_manifests(tool_name)
+        self.connection.execute(
+            'DELETE FROM stale WHERE tool = ? AND path = ?',
+            (tool_name, fileObject.path),
+        )
+        files = self._get_element(tool_name, create=True)[self.field_id_files]
+        if fileObject.path in files:
+            del files[fileObject.path]
+            self.connection.execute(
+                'DELETE FROM files WHERE tool = ? AND path = ?',
+                (tool_name, fileObject.path),
+            )
             log.debug(
                 'File removed from cache: ' + os.path.basename(fileObject.path)
             )
@@ -191,5 +848,15 @@ class FileCache:
         """
         Delete the cache file pointed to by this FileCache instance.
         """
-        if os.path.exists(self.cache_path):
-            os.remove(self.cache_path)
+        self._close()
+        self.cache = {}
+        self._pending = {}
+        self._sources = None
+        directory = os.path.dirname(os.path.abspath(self.cache_path))
+        if not os.path.isdir(directory):
+            return
+        # The lock file is only removed while it is held, otherwise another
+        # process holding it would be left with a lock that excludes nobody.
+        with self.lock() as lock:
+            self._remove_files()
+            lock.unlink()
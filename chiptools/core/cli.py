@@ -162,15 +162,63 @@ class CommandLine(cmd.Cmd, object):
 
     @wraps_do_commands
     def do_compile(self, command):
-        if len(command) > 0:
-            self.project.compile(command)
+        """Compile the project using the chosen simulator:
+        compile [tool_name] [--verify] [--dry-run] [--jobs N]
+        Use --verify to hash every source file when checking for changes
+        instead of trusting unchanged file sizes and modification times.
+        Use --dry-run to list the files that would be compiled and the reason
+        they need compiling without invoking the simulator.
+        Use --jobs N to compile up to N independent files concurrently."""
+        command_elems = command.split()
+        verify = '--verify' in command_elems
+        dry_run = '--dry-run' in command_elems
+        jobs = 1
+        if '--jobs' in command_elems:
+            idx = command_elems.index('--jobs')
+            try:
+                jobs = int(command_elems[idx + 1])
+            except (IndexError, ValueError):
+                log.error('--jobs requires a number of jobs')
+                return
+            del command_elems[idx : idx + 2]
+        command_elems = [
+            c for c in command_elems if c not in ('--verify', '--dry-run')
+        ]
+        tool_name = command_elems[0] if len(command_elems) > 0 else None
+        if dry_run:
+            plan = self.project.plan_compile(tool_name, verify=verify)
+            for file_object, reason in plan:
+                print(
+                    '{0:20}{1} ({2})'.format(
+                        reason, file_object.path, file_object.library
+                    )
+                )
+            print(
+                '{0} of {1} file(s) would be compiled'.format(
+                    len(plan), len(self.project.get_files())
+                )
+            )
         else:
-            self.project.compile()
+            self.project.compile(tool_name, verify=verify, jobs=jobs)
 
     @wraps_do_commands
     def do_show_synthesis_fileset(self, command):
-        """Print out the synthesis file set"""
-        items = self.project.get_synthesis_fileset().items()
+        """Print out the synthesis file set, if a top level is given the file
+        set is pruned to its hierarchy when the prune_synthesis option is set.
+        Example: (Cmd) show_synthesis_fileset [my_library.my_entity]"""
+        library, entity = None, None
+        if len(command.strip()) > 0:
+            try:
+                library, entity = command.strip().split('.')
+            except ValueError:
+                log.error('Command "' + command + '" not understood.')
+                log.error(
+                    'Please specify a library and entity.\n'
+                    + 'Example: (Cmd) show_synthesis_fileset '
+                    + 'my_library.my_entity'
+                )
+                return
+        items = self.project.get_synthesis_fileset(library, entity).items()
         if len(items) == 0:
             print('There are no synthesisable files loaded.')
             return
@@ -9,6 +9,7 @@ import unittest
 from chiptools.common import exceptions
 from chiptools.common import utils
 from chiptools.common.filetypes import File
+from chiptools.common.filetypes import FileType
 from chiptools.common.filetypes import Constraints
 from chiptools.common.filetypes import ProjectAttributes
 from chiptools.common.filetypes import UnitTestFile
@@ -64,7 +65,9 @@ class Project:
         )
 
         self.config = {}
-        self.cache = FileCache('.chiptools')
+        self.cache = FileCache(
+            '.chiptools', algorithm=self.options.get_cache_digest()
+        )
         self.root = root
         self.generics = {}
         self.constraints = []
@@ -79,7 +82,7 @@ class Project:
             if os.path.splitext(os.path.basename(file_object.path))[0] == root:
                 root = file_object
                 # Continue with drawing the graph
-                cg = callgraph.CallGraph(self.get_files())
+                cg = callgraph.CallGraph(self.get_files(), cache=self.cache)
                 root = cg.parsed_files[self.get_files().index(root)]
                 graph = callgraph.CallGraph.get_design_hierarchy(
                     callgraph.CallGraph.get_definition_map(cg.parsed_files),
@@ -96,13 +99,14 @@ class Project:
 
                 # Using the list of changed files, obtain a new list of files
                 # that must be recompiled by inspecting the callgraph.
+                hierarchy = utils.subgraph(graph, root)
                 callchain = callgraph.CallGraph.get_callchain(
-                    utils.subgraph(graph, root), changed_files
+                    hierarchy, changed_files
                 )
 
                 # Draw the callgraph
                 callgraph.CallGraph.write_graph_png(
-                    utils.subgraph(graph, root),
+                    hierarchy,
                     show_unresolved=True,
                     highlight_nodes=callchain,
                 )
@@ -115,7 +119,9 @@ class Project:
 
     def set_cache_path(self, cache_path):
         # Update the FileCache to point at the new path
-        self.cache = FileCache(cache_path)
+        self.cache = FileCache(
+            cache_path, algorithm=self.options.get_cache_digest()
+        )
         self.root = os.path.dirname(cache_path)
 
     def add_file(self, path, library='work', **attribs):
@@ -227,6 +233,22 @@ class Project:
         """
         return self.config.get(ProjectAttributes.ATTRIBUTE_SYNTH_TOOL, None)
 
+    def get_compile_hierarchy(self):
+        """
+        Return True if only the files in the hierarchy of the simulated top
+        levels should be compiled before simulating.
+        """
+        name = ProjectAttributes.ATTRIBUTE_COMPILE_HIERARCHY
+        return bool(self.config.get(name, False))
+
+    def get_prune_synthesis(self):
+        """
+        Return True if only the files in the hierarchy of the synthesised top
+        level should be passed to the synthesis tool.
+        """
+        name = ProjectAttributes.ATTRIBUTE_PRUNE_SYNTHESIS
+        return bool(self.config.get(name, False))
+
     def get_synthesis_directory(self):
         """
         Return the path to the synthesis directory where all synthesis outputs
@@ -316,22 +338,87 @@ class Project:
         """
         return self.file_list
 
-    def get_synthesis_fileset(self):
+    def get_synthesis_fileset(self, library=None, entity=None):
         """
         Return a dictionary of {lib : [file_a, file_b]} where *lib* is a string
         indicating the name of the library and *[file_a, file_b]* is a list of
         *File* objects that has been filtered to contain only files that have
-        their *.synthesise* attribute set.
+        their *.synthesise* attribute set. If the *library* and *entity* of
+        the synthesis top level are given and the *prune_synthesis* project
+        configuration item is set, VHDL files outside the hierarchy of the top
+        level are also removed.
         """
         result = {}
         if self.project_data is not None:
-            for libName, library in self.project_data.items():
+            for libName, library_files in self.project_data.items():
                 if libName not in result:
                     result[libName] = []
                 # Only include files that are registered for synthesis
                 result[libName] += list(
-                    filter(lambda x: x.synthesise, library)
+                    filter(lambda x: x.synthesise, library_files)
                 )
+        if library is None or entity is None:
+            return result
+        if not self.get_prune_synthesis():
+            return result
+        return self.prune_fileset(result, library, entity)
+
+    def prune_fileset(self, fileset, library, entity):
+        """
+        Return a copy of the {lib : [file_a, file_b]} *fileset* dictionary
+        without the VHDL files that are not needed to elaborate the *entity*
+        in the given *library*. Files that are not VHDL cannot be parsed and
+        are always kept. The *fileset* is returned unchanged if the hierarchy
+        of the top level cannot be resolved.
+        """
+        files = [f for file_list in fileset.values() for f in file_list]
+        try:
+            parsed_files = callgraph.CallGraph.get_parsed_files(
+                [f for f in files if f.fileType == FileType.VHDL],
+                self.cache,
+            )
+        except (OSError, UnicodeDecodeError) as e:
+            log.warning(
+                'Could not parse the synthesis fileset, '
+                + 'it will not be pruned: {0}'.format(e)
+            )
+            return fileset
+        design_files = callgraph.CallGraph.get_design_files(
+            parsed_files, library, entity, libraries=fileset.keys()
+        )
+        if design_files is None:
+            log.warning(
+                'Could not resolve the hierarchy of {0}.{1}, '.format(
+                    library, entity
+                )
+                + 'the synthesis fileset will not be pruned'
+            )
+            return fileset
+        paths = set(parsed_file.path for parsed_file in design_files)
+        result = {}
+        dropped = []
+        for libName, file_list in fileset.items():
+            result[libName] = []
+            for file_object in file_list:
+                if (
+                    file_object.fileType != FileType.VHDL
+                    or file_object.path in paths
+                ):
+                    result[libName].append(file_object)
+                else:
+                    dropped.append(file_object)
+        for file_object in dropped:
+            log.info(
+                'Excluded from synthesis: {0} ({1})'.format(
+                    file_object.path, file_object.library
+                )
+            )
+        log.info(
+            'Pruned {0} of {1} file(s) outside the hierarchy of '.format(
+                len(dropped), len(files)
+            )
+            + '{0}.{1} from the synthesis fileset'.format(library, entity)
+        )
         return result
 
     def get_available_simulators(self):
@@ -359,6 +446,13 @@ class Project:
         """
         return self.options.get_simulator_library_dependencies(tool_name)
 
+    def get_tool_options(self, tool_name):
+        """
+        Return a dictionary of option_name : value strings read from the
+        [<tool_name> options] section of the .chiptoolsconfig file.
+        """
+        return self.options.get_tool_options(tool_name)
+
     def get_system_config_path(self):
         """
         Return a path string indicating the location of the .chiptoolsconfig
@@ -388,20 +482,39 @@ class Project:
                         )
                     )
 
-    def compile(self, tool_name=None):
+    def compile(self, tool_name=None, verify=False, jobs=1):
         """
         Compile the libraries and files loaded into the *Project*.
         The Simulation tool that is used is determined by the
         *tool_name* input if supplied, otherwise the *Project* configuration
         : 'simulator' tool name will be used instead.
+        If *verify* is True the contents of every file are hashed to detect
+        changes instead of relying on the cached file stat signatures.
+        Up to *jobs* files are compiled concurrently if the simulation tool
+        supports it.
         """
         simulation_tool = self._get_tool(tool_name, tool_type='simulation')
         simulation_tool.compile_project(
             includes=self.options.get_simulator_library_dependencies(
                 simulation_tool.name
-            )
+            ),
+            verify=verify,
+            jobs=jobs,
         )
 
+    def plan_compile(self, tool_name=None, verify=False):
+        """
+        Return the list of (file_object, reason) tuples for the files that
+        *compile* would compile, in the order they would be compiled, without
+        invoking the simulation tool. The reason explains why each file needs
+        to be compiled, see Simulator.plan_compile. The Simulation tool is
+        determined as for *compile*.
+        """
+        simulation_tool = self._get_tool(tool_name, tool_type='simulation')
+        # Pick up any updates made by other processes sharing the cache
+        self.cache.refresh(simulation_tool.name)
+        return simulation_tool.plan_compile(verify=verify)
+
     def _get_tool(self, tool_name=None, tool_type='simulation'):
         tool = self.tool_wrapper.get_tool(
             tool_type=tool_type, tool_name=tool_name
@@ -429,7 +542,10 @@ class Project:
             simulation_tool.name
         )
         # Do a compilation of the design to ensure the libraries are up to date
-        simulation_tool.compile_project(includes=includes)
+        tops = None
+        if self.get_compile_hierarchy():
+            tops = [(library, entity)]
+        simulation_tool.compile_project(includes=includes, tops=tops)
         includes.update(kwargs.get('includes', {}))
         kwargs.update(
             {
@@ -471,12 +587,6 @@ class Project:
         : 'simulator' tool name will be used instead.
         """
         simulation_tool = self._get_tool(tool_name, tool_type='simulation')
-        # First compile the project
-        simulation_tool.compile_project(
-            includes=self.options.get_simulator_library_dependencies(
-                simulation_tool.name
-            )
-        )
 
         suite = unittest.TestSuite()
         tests = []
@@ -500,12 +610,28 @@ class Project:
         elif len(ids) == 0:
             ids = list(range(len(tests)))
 
+        tops = []
         for id in ids:
             if id < len(tests):
                 fileName, test = tests[id]
                 log.info(str(test.id()))
                 suite.addTest(test)
                 log.info('Added ' + str(test) + ' to testsuite')
+                top = (test.library, test.entity)
+                if top not in tops:
+                    tops.append(top)
+
+        # Compile the project, or only the hierarchies of the selected tests
+        if not self.get_compile_hierarchy() or any(
+            library is None or entity is None for library, entity in tops
+        ):
+            tops = None
+        simulation_tool.compile_project(
+            includes=self.options.get_simulator_library_dependencies(
+                simulation_tool.name
+            ),
+            tops=tops,
+        )
 
         log.info('Running testsuite...')
         # TODO: Allow HTML or Console selection
@@ -1,41 +1,196 @@
 import logging
+import os
 import subprocess
+import time
+
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 
 log = logging.getLogger(__name__)
 
 from chiptools.parsers.vhdl import ParsedVhdlFile, Component, Entity
 from chiptools.common import utils
+from chiptools.common.filetypes import File
+from chiptools.common import graph as graphs
+
+
+def _parse_chunk(sources):
+    """Parse the files for the (path, library) tuples in *sources* in a
+    worker process and return the list of their summaries."""
+    return [
+        ParsedVhdlFile(File(library, path=path)).get_summary()
+        for path, library in sources
+    ]
 
 
 class CallGraph:
-    def __init__(self, files, root=None):
-        self.parsed_files = [CallGraph.get_parsed_file(f) for f in files]
+    # Files are only parsed by a pool of processes if the files to parse hold
+    # more than this number of bytes, smaller sets are parsed faster than the
+    # worker processes can be started.
+    parse_pool_threshold = 1024 * 1024
+    # Number of chunks of similar size that the files to parse are split into
+    # for each worker process.
+    parse_chunks_per_worker = 4
+
+    def __init__(self, files, root=None, cache=None):
+        self.parsed_files = CallGraph.get_parsed_files(files, cache)
 
     @staticmethod
     def get_callchain(graph, modified_nodes):
-        """Return a topologically sorted list of the nodes dependent on the
-        given node."""
+        """Return the *modified_nodes* followed by the topologically sorted
+        list of the nodes in the *graph* that depend on them, or None if the
+        graph contains cycles."""
         try:
-            sorted_nodes = utils.topological_sort(graph)
-        except Exception as e:
-            # The graph contains cycles
+            sorted_nodes = graphs.topological_sort(graph)
+        except ValueError as e:
             log.error(e)
             return None
-        callchain = []
-        callchain += modified_nodes
-        for n in sorted_nodes:
-            if n not in graph:
-                # This node has no incoming edges and so has no dependencies
-                continue
-            if any(caller in graph[n] for caller in callchain):
-                if n not in callchain:
-                    callchain.append(n)
-        return callchain
+        dependents = graphs.get_dependents(graph, modified_nodes)
+        modified = set(modified_nodes)
+        return list(modified_nodes) + [
+            n for n in sorted_nodes if n in dependents and n not in modified
+        ]
 
     @staticmethod
     def get_parsed_file(sourcefile):
         return ParsedVhdlFile(sourcefile)
 
+    @staticmethod
+    def get_parsed_files(files, cache=None, max_workers=None):
+        """Return the list of ParsedVhdlFile objects for the given *files*. If
+        a FileCache *cache* is given the design units found in each file are
+        recorded against the content digest of the file, and only files whose
+        contents have not been parsed before in the same library are parsed.
+        The *files* are taken to be every VHDL file in the project, the
+        records of other files are removed from the cache.
+        The files are parsed by *parse_files* using up to *max_workers*
+        processes.
+        """
+        files = list(files)
+        start_time = time.time()
+        sources = {}
+        summaries = {}
+        if cache is not None:
+            sources = cache.get_source_digests(f.path for f in files)
+            summaries = cache.get_parse_summaries(
+                ParsedVhdlFile.summary_version
+            )
+        parsed_files = [None] * len(files)
+        pending = []
+        for idx, file_object in enumerate(files):
+            signature, digest = sources.get(file_object.path, (None, None))
+            key = (digest, file_object.library)
+            if digest is not None and key in summaries:
+                parsed_files[idx] = ParsedVhdlFile(
+                    file_object, summary=summaries[key]
+                )
+            else:
+                pending.append(idx)
+        parsed = []
+        pending_files = [files[idx] for idx in pending]
+        for idx, parsed_file in zip(
+            pending, CallGraph.parse_files(pending_files, max_workers)
+        ):
+            parsed_files[idx] = parsed_file
+            signature, digest = sources.get(parsed_file.path, (None, None))
+            # Only record the summary if the file was not modified while it
+            # was being parsed.
+            if digest is not None and signature == (
+                cache.get_stat_signature(parsed_file.path)
+            ):
+                parsed.append(
+                    (digest, parsed_file.library, parsed_file.get_summary())
+                )
+        if len(parsed) > 0:
+            cache.set_parse_summaries(
+                parsed,
+                ParsedVhdlFile.summary_version,
+                paths=[f.path for f in files],
+            )
+        log.debug(
+            'Parsed {0} of {1} file(s) in {2}'.format(
+                len(pending),
+                len(files),
+                utils.time_delta_string(start_time, time.time()),
+            )
+        )
+        return parsed_files
+
+    @staticmethod
+    def parse_files(files, max_workers=None):
+        """Return the list of ParsedVhdlFile objects for the given *files*.
+        If the files hold more than *parse_pool_threshold* bytes they are
+        split into chunks of similar size and parsed by a pool of up to
+        *max_workers* processes, which defaults to the number of CPUs. The
+        worker processes return the summaries of the files rather than the
+        parsed objects.
+        """
+        files = list(files)
+        if max_workers is None:
+            max_workers = os.cpu_count() or 1
+        sizes = []
+        for file_object in files:
+            try:
+                sizes.append(os.path.getsize(file_object.path))
+            except OSError:
+                sizes.append(0)
+        if (
+            len(files) < 2
+            or max_workers < 2
+            or sum(sizes) < CallGraph.parse_pool_threshold
+        ):
+            return [CallGraph.get_parsed_file(f) for f in files]
+        chunks = CallGraph.get_parse_chunks(
+            sizes, max_workers * CallGraph.parse_chunks_per_worker
+        )
+        try:
+            with ProcessPoolExecutor(
+                max_workers=min(max_workers, len(chunks))
+            ) as executor:
+                results = list(
+                    executor.map(
+                        _parse_chunk,
+                        [
+                            [(files[idx].path, files[idx].library)
+                             for idx in chunk]
+                            for chunk in chunks
+                        ],
+                    )
+                )
+        except (BrokenProcessPool, NotImplementedError) as e:
+            log.debug('Could not parse files in parallel: {0}'.format(e))
+            return [CallGraph.get_parsed_file(f) for f in files]
+        parsed_files = [None] * len(files)
+        for chunk, summaries in zip(chunks, results):
+            for idx, summary in zip(chunk, summaries):
+                parsed_files[idx] = ParsedVhdlFile(files[idx], summary=summary)
+        return parsed_files
+
+    @staticmethod
+    def get_parse_chunks(sizes, count):
+        """Return a list of lists of indices into the list of file *sizes*,
+        splitting the files into about *count* chunks of similar total size.
+        Larger files are placed first so that each chunk holds either one
+        large file or several small ones.
+
+        >>> CallGraph.get_parse_chunks([10, 1, 1, 8, 1, 1], 3)
+        [[0], [3], [1, 2, 4, 5]]
+        """
+        target = sum(sizes) / max(count, 1)
+        chunks = []
+        chunk = []
+        total = 0
+        for idx in sorted(range(len(sizes)), key=lambda idx: -sizes[idx]):
+            chunk.append(idx)
+            total += sizes[idx]
+            if total >= target:
+                chunks.append(chunk)
+                chunk = []
+                total = 0
+        if len(chunk) > 0:
+            chunks.append(chunk)
+        return chunks
+
     @staticmethod
     def get_definition_map(files):
         """Return a dictionary mapping design unit instances to a set of files
@@ -96,6 +251,89 @@ class CallGraph:
                     graph[parent].update(children)
         return graph
 
+    @staticmethod
+    def get_file_graph(parsed_files):
+        """Return the design hierarchy of the *parsed_files* as a dictionary
+        mapping every parsed file to the set of parsed files that it depends
+        on. Unresolved design units are not included.
+        """
+        graph = CallGraph.get_design_hierarchy(
+            CallGraph.get_definition_map(parsed_files),
+            CallGraph.get_reference_map(parsed_files),
+        )
+        file_graph = {}
+        for parsed_file in parsed_files:
+            file_graph[parsed_file] = set(
+                child
+                for child in graph.get(parsed_file, set())
+                if isinstance(child, ParsedVhdlFile)
+            )
+        return file_graph
+
+    @staticmethod
+    def get_design_files(
+        parsed_files, library, entity, libraries=None, cache=None
+    ):
+        """Return the list of *parsed_files* needed to elaborate the *entity*
+        in the given *library*: the files defining the entity and its
+        architectures, the files they depend on, and the files defining the
+        architectures and package bodies of every entity and package declared
+        in those files. Return None if the entity is not defined in any of the
+        *parsed_files*, or if *libraries* is given and the design references
+        an entity or package in one of the *libraries* (or in work) that is
+        not defined in any of the *parsed_files*.
+        The optional *cache* dictionary holds the files reachable from each
+        top level file, keyed on path, and is shared by queries for several
+        top levels of the same *parsed_files*, see graph.get_reachable.
+        """
+        definition_map = CallGraph.get_definition_map(parsed_files)
+        graph = dict(
+            (node.path, set(child.path for child in children))
+            for node, children in CallGraph.get_file_graph(
+                parsed_files
+            ).items()
+        )
+        # Secondary units are not referenced by the files that use their
+        # declarations, so each file is also linked to the files holding the
+        # architectures and package bodies that complete its declarations.
+        for parsed_file in parsed_files:
+            for reference in (
+                parsed_file.architecture_refs + parsed_file.package_body_refs
+            ):
+                for declaring_file in definition_map.get(reference, ()):
+                    if declaring_file is not parsed_file:
+                        graph[declaring_file.path].add(parsed_file.path)
+        top = Entity(entity.lower(), library)
+        roots = [
+            parsed_file.path
+            for parsed_file in parsed_files
+            if parsed_file.library == library
+            and (
+                top in parsed_file.entity_defs
+                or top in parsed_file.architecture_refs
+            )
+        ]
+        if len(roots) == 0:
+            return None
+        paths = graphs.get_reachable(graph, roots, cache)
+        design_files = [f for f in parsed_files if f.path in paths]
+        if libraries is not None:
+            libraries = set(libraries) | set(['work'])
+            for parsed_file in design_files:
+                for reference in parsed_file.references:
+                    if (
+                        not isinstance(reference, Component)
+                        and reference.library in libraries
+                        and reference not in definition_map
+                    ):
+                        log.debug(
+                            'Unresolved reference to {0} in {1}'.format(
+                                reference, parsed_file.path
+                            )
+                        )
+                        return None
+        return design_files
+
     @staticmethod
     def write_graph_png(
         graph,
@@ -48,6 +48,7 @@ class Options:
             ('ghdl simulation libraries', OrderedDict([])),
             ('simulation executables', OrderedDict([])),
             ('synthesis executables', OrderedDict([])),
+            ('compilation cache', OrderedDict([])),
         ]
     )
 
@@ -216,3 +217,28 @@ class Options:
                 'Could not find .chiptoolsconfig section: ' + str(section_name)
             )
         return paths
+
+    def get_tool_options(self, toolname):
+        """
+        Return a dictionary of the settings in the optional
+        [<toolname> options] section, used to enable tool specific features.
+
+        If the configuration file was modified since the last access it will be
+        reloaded and the new entries returned.
+        """
+        self.refresh()
+        section_name = '{0} options'.format(toolname)
+        if not self._options.has_section(section_name):
+            return {}
+        return dict(self._options.items(section_name))
+
+    def get_cache_digest(self):
+        """
+        Return the name of the digest algorithm to use for the compilation
+        cache, or None if the default algorithm should be used.
+
+        If the configuration file was modified since the last access it will be
+        reloaded and the new entries returned.
+        """
+        self.refresh()
+        return self._options.get('compilation cache', 'digest', fallback=None)
@@ -1,36 +1,41 @@
+import json
 import logging
 import re
 import os
 
+from chiptools.common import hashing
+
 log = logging.getLogger(__name__)
 
 
+# Comments and string literals, string literals are matched so that comment
+# delimiters inside them are ignored.
+COMMENT_RE = re.compile(
+    r'''
+    (?P<string>"(?:[^"\n]|"")*")           # String literal
+    |
+    --[^\n]*                               # Line comment
+    |
+    /\*.*?(?:\*/|\Z)                       # VHDL-2008 block comment
+    ''',
+    re.VERBOSE | re.DOTALL,
+)
+
+# Whitespace between the words of a construct, which may include comments.
+WHITESPACE = r'(?:\s|--[^\n]*|/\*.*?\*/)'
+
+
 def remove_comments(data):
     """Return the supplied VHDL file data string, *data*, with all comments
-    removed."""
-    return re.sub(r'--[^\n]*', '', data)
-
+    removed.
 
-class Function:
+    >>> remove_comments('a <= "--"; -- Comment\\nb /* Block */ <= c;')
+    'a <= "--"; \\nb  <= c;'
+    """
+    return COMMENT_RE.sub(lambda match: match.group('string') or '', data)
 
-    REGEX = re.compile(
-        r"""
-        \s*
-        function
-        \s+
-        (?P<ident>\w+)
-        \s*
-        (?:\([^;]*)?
-        \s*
-        return
-        \s*
-        (?:\w+)
-        \s+
-        is
-        """,
-        re.IGNORECASE | re.VERBOSE,
-    )
 
+class Function:
     def __init__(self, name, library='work'):
         self.name = name
         self.library = library
@@ -48,33 +53,10 @@ class Function:
 
     @classmethod
     def get_all_definitions(cls, data, library='work'):
-        definitions = set()
-        for match in cls.REGEX.finditer(data):
-            ident = match.group('ident')
-            definitions.add(cls(name=ident, library=library))
-        return list(definitions)
+        return _scan(data, library).function_defs
 
 
 class Procedure:
-
-    REGEX = re.compile(
-        r"""
-        \s*
-        procedure
-        \s+
-        (?P<id>\w+)
-        \s*
-        (?:\([^;]*)?
-        \s*
-        return
-        \s*
-        (?:\w+)
-        \s+
-        is
-        """,
-        re.IGNORECASE | re.VERBOSE,
-    )
-
     def __init__(self, name, library='work'):
         self.name = name
         self.library = library
@@ -92,40 +74,10 @@ class Procedure:
 
     @classmethod
     def get_all_definitions(cls, data, library='work'):
-        definitions = set()
-        for match in cls.REGEX.finditer(data):
-            ident = match.group('ident')
-            definitions.add(cls(name=ident, library=library))
-        return list(definitions)
+        return _scan(data, library).procedure_defs
 
 
 class Package:
-
-    PACKAGE_START_RE = re.compile(
-        r"""
-        \b                      # Word boundary
-        package                 # 'Package' keyword
-        \s+                     # 1 or more whitespace
-        (?P<ident>\w+)          # Mandatory identifier
-        \s+                     # 1 or more whitespace
-        (?:is)                  # 'is' keyword
-        """,
-        re.IGNORECASE | re.VERBOSE,
-    )
-
-    PACKAGE_USE_CLAUSES = r"""
-        \b                      # Word boundary
-        use                     # use keyword
-        \s*                     # Optional whitepsace
-        %(library)s             # Dynamic library name
-        \.                      # '.' separator
-        (?P<module>\w+)         # Module name
-        \.                      # '.' separator
-        (?P<unit>all|\w+)       # Part name ('all' or custom name)
-        \s*                     # Optional whitespace
-        ;                       # Terminator
-        """
-
     def __init__(self, name, library='work', unit=None):
         self.name = name
         self.library = library
@@ -133,57 +85,64 @@ class Package:
         # package, either 'all' or a named unit.
         self.unit = unit
 
+    def __hash__(self):
+        return hash((self.name, self.library))
+
+    def __repr__(self):
+        return '<Package {0}.{1}>'.format(self.library, self.name)
+
+    def __eq__(self, other):
+        if not isinstance(other, Package):
+            return False
+        return self.name == other.name and self.library == other.library
+
     @classmethod
     def get_all_references(cls, data, libraries):
-        references = set()
-        for library in libraries:
-            includes_re = re.compile(
-                Package.PACKAGE_USE_CLAUSES % dict(library=library),
-                re.IGNORECASE | re.VERBOSE,
-            )
-            for include in includes_re.finditer(data):
-                package = Package(
-                    include.group('module'),
-                    library=library,
-                    unit=include.group('unit'),
-                )
-                references.add(package)
-        return list(references)
+        """
+        Return the packages used by the *data* from any of the given
+        *libraries* that the data declares.
+        """
+        return [
+            package
+            for package in _scan(data).package_refs
+            if package.library in libraries
+        ]
 
     @classmethod
     def get_all_definitions(cls, data, library='work'):
-        definitions = set()
-        for match in Package.PACKAGE_START_RE.finditer(data):
-            ident = match.group('ident')
-            definitions.add(Package(name=ident, library=library))
-        return list(definitions)
+        return _scan(data, library).package_defs
+
+
+class PackageBody:
+    def __init__(self, name, library='work'):
+        self.name = name
+        self.library = library
 
     def __hash__(self):
         return hash((self.name, self.library))
 
     def __repr__(self):
-        return '<Package {0}.{1}>'.format(self.library, self.name)
+        return '<PackageBody {0}.{1}>'.format(self.library, self.name)
 
     def __eq__(self, other):
-        if not isinstance(other, Package):
+        if not isinstance(other, PackageBody):
             return False
         return self.name == other.name and self.library == other.library
 
+    @classmethod
+    def get_all_definitions(cls, data, library='work'):
+        return _scan(data, library).package_body_defs
 
-class Entity:
+    @classmethod
+    def get_all_references(cls, data, library='work'):
+        """
+        A package body depends on the declaration of its package, which must
+        be in the same library.
+        """
+        return _scan(data, library).package_body_refs
 
-    ENTITY_START_RE = re.compile(
-        r"""
-        \b              # Word boundary
-        entity          # 'Entity' keyword
-        \s+             # 1 or more whitespace
-        (?P<ident>\w+)  # Mandatory identifier
-        \s+             # 1 or more whitespace
-        (?:is)          # 'is' keyword
-        """,
-        re.IGNORECASE | re.VERBOSE,
-    )
 
+class Entity:
     def __init__(self, name, library='work'):
         self.name = name
         self.library = library
@@ -201,11 +160,7 @@ class Entity:
 
     @classmethod
     def get_all_definitions(cls, data, library):
-        definitions = set()
-        for match in Entity.ENTITY_START_RE.finditer(data):
-            ident = match.group('ident')
-            definitions.add(Entity(name=ident, library=library))
-        return list(definitions)
+        return _scan(data, library).entity_defs
 
     @classmethod
     def get_all_references(cls, data, libraries):
@@ -213,30 +168,48 @@ class Entity:
         Entity references are made by direct instantiation or by a component
         instantiation via a component definition. Embedded configurations can
         be used to make a component instantiation reference a entity directly.
+        Return the entities instantiated from any of the given *libraries*
+        and the entities implied by component instantiations.
         """
-        # TODO:
-        raise NotImplementedError('Use Component.get_all_references()')
+        return [
+            entity
+            for entity in _scan(data).entity_refs
+            if entity.library is None or entity.library in libraries
+        ]
 
 
-class Configuration:
+class Architecture:
+    def __init__(self, name, entity, library='work'):
+        self.name = name
+        self.entity = entity
+        self.library = library
 
-    CONFIGURATION_RE = re.compile(
-        r"""
-        \b                                  # Word boundary
-        configuration                       # Component keyword
-        \s+                                 # At least one whitespace
-        (?P<ident>\w+)                      # Identifier
-        \s+                                 # At least one whitespace
-        of                                  # 'of' keyword
-        \s+                                 # At least one whitespace
-        (?P<entity>\w+)                     # Identifier
-        \s+                                 # At least one whitespace
-        is                                  # 'is' keyword
-        """,
-        re.IGNORECASE | re.VERBOSE,
-    )
+    def __hash__(self):
+        return hash((self.name, self.entity))
 
-    def __init__(self, name, entity, library='work'):
+    def __repr__(self):
+        return '<Architecture {0}({1})>'.format(self.entity, self.name)
+
+    def __eq__(self, other):
+        if not isinstance(other, Architecture):
+            return False
+        return self.name == other.name and self.entity == other.entity
+
+    @classmethod
+    def get_all_definitions(cls, data, library):
+        return _scan(data, library).architecture_defs
+
+    @classmethod
+    def get_all_references(cls, data, library):
+        """
+        An architecture depends on the declaration of its entity, which must
+        be in the same library.
+        """
+        return _scan(data, library).architecture_refs
+
+
+class Configuration:
+    def __init__(self, name, entity=None, library='work'):
         self.name = name
         self.entity = entity
         self.library = library
@@ -254,50 +227,10 @@ class Configuration:
 
     @classmethod
     def get_all_definitions(cls, data, library):
-        definitions = set()
-        for match in cls.CONFIGURATION_RE.finditer(data):
-            ident = (match.group('ident'),)
-            entity = match.group('entity')
-            definitions.add(
-                Configuration(name=ident, entity=entity, library=library)
-            )
-        return list(definitions)
+        return _scan(data, library).configuration_defs
 
 
 class Component:
-
-    COMPONENT_RE = re.compile(
-        r"""
-        \b                                  # Word boundary
-        component                           # Component keyword
-        \s*                                 # Optional whitepsace
-        (?P<entity>\w+)                     # Identifier
-        \s*                                 # Optional whitespace
-        (is)?                               # Optional 'is' keyword
-        \s*                                 # Optional whitespace
-        """,
-        re.IGNORECASE | re.VERBOSE,
-    )
-
-    # Detect an Entity or Component instantation
-    INSTANCE_RE = re.compile(
-        r"""
-        \b                                  # Word boundary
-        (?P<ident>\w+)                      # Identifier
-        \s*                                 # Optional whitespace
-        :                                   # ':' delimeter
-        \s*                                 # Optional whitespace
-        (?:entity\s*)?                      # Optional entity
-        (?:(?P<library>\w+)(?:\.))?         # Optional library
-        (?P<entity>\w+)                     # Module name
-        \s*                                 # Optional whitespace
-        (?:generic\s+map|port\s+map)        # Generic map or port map
-        [^;]*                               # Everything except a Terminator
-        ;                                   # Terminator
-        """,
-        re.IGNORECASE | re.VERBOSE,
-    )
-
     def __init__(self, entity, instance=None, library=None):
         self.name = instance
         self.entity = entity
@@ -319,41 +252,67 @@ class Component:
 
     @classmethod
     def get_all_definitions(cls, data, library):
-        definitions = set()
-        for match in Component.COMPONENT_RE.finditer(data):
-            ident = match.group('entity')
-            definitions.add(Component(ident, library=library))
-        return list(definitions)
+        return _scan(data, library).component_defs
 
     @classmethod
     def get_all_references(cls, data, binding_indications=None):
-        references = set()
-        for instance in Component.INSTANCE_RE.finditer(data):
-            ident = instance.group('ident')
-            lib = instance.group('library')  # Optional
-            entity = instance.group('entity')
-            # Either a component or entity instantiation
-            if lib is not None:
-                # VHDL 93 style entity instantiation
-                instance = Entity(entity, library=lib)
-            else:
-                instance = Component(entity, instance=ident, library=lib)
-                # Component instantiation
-                # Check the binding indications to see if the instance has
-                # been explictly linked to an entity or configuration:
-                if binding_indications is not None:
-                    if ident in binding_indications:
-                        if entity in binding_indications[ident]:
-                            instance = binding_indications[ident][entity]
-                    elif entity in binding_indications['all']:
-                        instance = binding_indications['all'][entity]
-            # Add the instance reference
-            references.add(instance)
-            # Instantiations referencing a compoent declaration introduce an
-            # implicit reference to an entity of the same name and port mapping
-            if isinstance(instance, Component):
-                references.add(Entity(entity, library=lib))
-        return list(references)
+        """
+        Return the components and entities instantiated by the *data*. The
+        *binding_indications* map an instance label, or 'all', to a
+        dictionary of component names and the Entity or Configuration that
+        instances of the component are bound to, and take precedence over
+        the binding indications in the data.
+        """
+        parsed = _scan(data, indications=binding_indications)
+        return parsed.component_refs + parsed.entity_refs
+
+
+class InterfaceDigest:
+    """
+    Incremental digest over the normalised words of the interface
+    declarations in a file. Words are hashed as they are scanned, the words
+    of a declaration are separated by spaces and the declarations by
+    newlines.
+    >>> digest = InterfaceDigest()
+    >>> digest.open()
+    >>> digest.update(['entity', 'a', 'is'])
+    >>> digest.update(['end', ';'])
+    >>> digest.close()
+    >>> digest.hexdigest() == hashing.data_digest('entity a is end ;')
+    True
+    """
+
+    def __init__(self):
+        self.digest = hashing.new_hash()
+        self.count = 0
+        # Number of words hashed for the open declaration, or None if no
+        # declaration is open
+        self.words = None
+
+    def is_open(self):
+        return self.words is not None
+
+    def open(self):
+        if self.count > 0:
+            self.digest.update(b'\n')
+        self.count += 1
+        self.words = 0
+
+    def close(self):
+        self.words = None
+
+    def update(self, words):
+        """Add the *words* to the open declaration, if any."""
+        if self.words is None or len(words) == 0:
+            return
+        text = ' '.join(words)
+        if self.words > 0:
+            text = ' ' + text
+        self.digest.update(text.encode('utf-8'))
+        self.words += len(words)
+
+    def hexdigest(self):
+        return self.digest.hexdigest()
 
 
 class ParsedVhdlFile:
@@ -361,155 +320,440 @@ class ParsedVhdlFile:
     The ParsedVhdlFile class provides a high level wrapper for a source Vhdl
     file and provides convenient access to the design units referenced and
     declared by a file.
+
+    The file is parsed in a single pass by the UNIT_RE scanner, which matches
+    comments, string literals and the constructs that declare or reference
+    design units in the order that they appear in the file. Text between the
+    matches is only used to compute the interface digest.
     """
 
-    LIBRARY_RE = re.compile(
+    UNIT_RE = re.compile(
         r"""
-        \b                  # Word boundary
-        library             # Library keyword
-        \s*                 # Optional whitespace
-        (?P<library>\w+)    # Library name
-        \s*                 # Optional whitespace
-        ;                   # Terminator
-        """,
-        re.IGNORECASE | re.VERBOSE,
+        (?P<comment>--[^\n]*|/\*.*?(?:\*/|\Z))  # Line or block comment
+        |
+        (?P<string>"(?:[^"\n]|"")*")            # String literal
+        |
+        (?P<character>'[^\n]')                  # Character literal
+        |
+        (?<!\w)(?=\w)                           # Start of a word
+        (?:
+            (?P<library>                        # Library clause
+                library%(ws)s+
+                (?P<library_names>\w+(?:%(ws)s*,%(ws)s*\w+)*)
+                %(ws)s*;
+            )
+            |
+            (?P<use>                            # Use clause
+                use%(ws)s+
+                (?P<use_names>\w+\.\w+\.\w+(?:%(ws)s*,%(ws)s*\w+\.\w+\.\w+)*)
+                %(ws)s*;
+            )
+            |
+            (?P<binding>                        # Binding indication
+                for%(ws)s+
+                (?P<binding_label>\w+)          # Instance label or 'all'
+                %(ws)s*:%(ws)s*
+                (?P<binding_component>\w+)      # Component name
+                %(ws)s+use%(ws)s+
+                (?P<binding_target>entity|configuration)
+                %(ws)s+
+                (?P<binding_library>\w+)\.(?P<binding_unit>\w+)
+            )
+            |
+            (?P<package_body>                   # Package body
+                package%(ws)s+body%(ws)s+
+                (?P<package_body_name>\w+)
+                %(ws)s+is\b
+            )
+            |
+            (?P<package>                        # Package declaration
+                package%(ws)s+
+                (?P<package_name>\w+)
+                %(ws)s+is\b
+                (?P<package_new>%(ws)s+new\b)?  # Package instantiation
+            )
+            |
+            (?P<entity>                         # Entity declaration
+                entity%(ws)s+
+                (?P<entity_name>\w+)
+                %(ws)s+is\b
+            )
+            |
+            (?P<architecture>                   # Architecture body
+                architecture%(ws)s+
+                (?P<architecture_name>\w+)
+                %(ws)s+of%(ws)s+
+                (?P<architecture_entity>\w+)
+                %(ws)s+is\b
+            )
+            |
+            (?P<configuration>                  # Configuration declaration
+                configuration%(ws)s+
+                (?P<configuration_name>\w+)
+                %(ws)s+of%(ws)s+
+                (?P<configuration_entity>\w+)
+                %(ws)s+is\b
+            )
+            |
+            (?P<subprogram>                     # Function or procedure
+                (?P<subprogram_kind>function|procedure)%(ws)s+
+                (?P<subprogram_name>\w+)
+            )
+            |
+            (?P<component>                      # Component declaration
+                component%(ws)s+
+                (?P<component_name>\w+)
+            )
+            |
+            (?P<end>                            # End of a construct
+                end\b
+                (?:%(ws)s+(?P<end_first>\w+))?
+                (?:%(ws)s+(?P<end_second>\w+))?
+                %(ws)s*;
+            )
+            |
+            (?P<instance>                       # Component instantiation
+                (?P<instance_label>\w+)
+                %(ws)s*:%(ws)s*
+                (?:(?P<instance_kind>entity|component|configuration)%(ws)s+)?
+                (?:(?P<instance_library>\w+)\.)?  # Optional library
+                (?P<instance_unit>\w+)          # Module name
+                # Optional architecture name
+                (?:%(ws)s*\(%(ws)s*\w+%(ws)s*\))?
+                %(ws)s*(?:generic|port)%(ws)s+map\b
+            )
+        )
+        """
+        % dict(ws=WHITESPACE),
+        re.IGNORECASE | re.VERBOSE | re.DOTALL,
     )
 
-    # Find any binding indications which indicate which unit to use for a
-    # given instantiation.
-    BINDING_INDICATION_RE = re.compile(
+    # Find the end of a subprogram specification or package instantiation:
+    # the 'is' keyword or ';' terminator outside of any parentheses.
+    SPECIFICATION_END_RE = re.compile(
         r"""
-        \b                                      # Word boundary
-        for                                     # 'for' keyword
-        \s+                                     # At least one whitespace
-        (?P<instance_label>all|\w+)             # Instance label
-        \s*                                     # Optional whitespace
-        :                                       # ':' delimeter
-        \s*                                     # Optional whitespace
-        (?P<component_name>\w+)                 # Component name
-        \s+                                     # At least one whitespace
-        use                                     # 'use' keyword
-        \s+                                     # At least one whitespace
-        # Target spec (configuration or entity)
-        (?P<target_spec>entity|configuration)
-        \s*                                     # Optional whitespace
-        # Either a library.entity(architecture) for 'entity' target spec
-        # or a library.configuration for 'configuration' target spec
-        (
-            (?P<e_library>\w+)\.(?P<entity>\w+)\((?P<architecture>\w+)\) |
-            (?P<c_library>\w+)\.(?P<configuration>\w+)
-        )
+        (?P<skip>--[^\n]*|/\*.*?(?:\*/|\Z)|"(?:[^"\n]|"")*"|'[^\n]')
+        |
+        (?P<open>\()
+        |
+        (?P<close>\))
+        |
+        (?P<end>;|\bis\b)
         """,
-        re.IGNORECASE | re.VERBOSE,
+        re.IGNORECASE | re.VERBOSE | re.DOTALL,
+    )
+
+    # Increment the summary version when the parser changes the design units
+    # or digests it produces, cached summaries are then discarded.
+    summary_version = 3
+
+    # The design unit lists held by a summary, with the type of the units in
+    # each list and the attributes of each unit that are stored, in the order
+    # of the constructor arguments.
+    summary_units = (
+        ('entity_defs', Entity, ('name', 'library')),
+        ('package_defs', Package, ('name', 'library', 'unit')),
+        ('package_body_defs', PackageBody, ('name', 'library')),
+        ('architecture_defs', Architecture, ('name', 'entity', 'library')),
+        ('component_defs', Component, ('entity', 'name', 'library')),
+        ('configuration_defs', Configuration, ('name', 'entity', 'library')),
+        ('function_defs', Function, ('name', 'library')),
+        ('procedure_defs', Procedure, ('name', 'library')),
+        ('entity_refs', Entity, ('name', 'library')),
+        ('package_refs', Package, ('name', 'library', 'unit')),
+        ('package_body_refs', Package, ('name', 'library', 'unit')),
+        ('architecture_refs', Entity, ('name', 'library')),
+        ('component_refs', Component, ('entity', 'name', 'library')),
     )
 
-    def __init__(self, file_object):
+    def __init__(self, file_object, summary=None):
         """
-        Parse the file object and initialise a ParsedVhdlFile instance
+        Parse the file object and initialise a ParsedVhdlFile instance. If a
+        *summary* previously returned by *get_summary* for a file with the
+        same contents and library is given the file is not parsed again.
         """
         self.file_object = file_object
         self.path = self.file_object.path
         self.name = os.path.splitext(os.path.basename(self.path))[0]
         self.library = self.file_object.library
-        self._parse(self.path, self.library)
+        if summary is None:
+            self._parse(self.path, self.library)
+        else:
+            self._load_summary(summary)
 
     def __repr__(self):
         return '<ParsedVhdlFile {0} ({1})>'.format(self.name, self.library)
 
     @classmethod
-    def _get_libraries(cls, data):
-        """Parse the input string as VHDL and return any library
-        declarations and use-clauses"""
-        # Initialise a set containing each unique library declaration found
-        # in the input string.
-        libraries = set(['work'])  # Work library is always included
-        for match in ParsedVhdlFile.LIBRARY_RE.finditer(data):
-            lib = match.group('library')
-            libraries.add(lib)
-        return libraries
-
-    @classmethod
-    def _get_binding_indications(cls, data):
-
-        indications = {'all': {}}
-
-        for match in cls.BINDING_INDICATION_RE.finditer(data):
-            instance_label = match.group('instance_label')
-            component_name = match.group('component_name')
-            target_spec = match.group('target_spec')
-            entity_name = match.group('entity')
-            configuration_name = match.group('configuration')
-
-            if target_spec == 'configuration':
-                library = match.group('c_library')
-                target = Configuration(configuration_name, library=library)
-            elif target_spec == 'entity':
-                library = match.group('e_library')
-                target = Entity(entity_name, library=library)
-            else:
-                log.error(
-                    'Illegal configuration target: {0}'.format(target_spec)
-                )
-                target = None
-
-            # Binding indications instruct the compiler to substitute
-            # items with the given instance_label and entity with the given
-            # target_spec, which can either be a configuration or an entity.
-            # The instance_label can be 'all' or a specific instance label.
-            if instance_label not in indications:
-                indications[instance_label] = {}
-            if component_name not in indications[instance_label]:
-                indications[instance_label][component_name] = target
-
-        return indications
+    def _find_specification_end(cls, data, position):
+        """Return the match of the 'is' keyword or ';' terminator that ends
+        the specification starting at *position* in the *data* string, or
+        None if the specification is not terminated.
+
+        >>> data = 'function f(a : bit; b : bit) return bit is'
+        >>> ParsedVhdlFile._find_specification_end(data, 10).group()
+        'is'
+        """
+        depth = 0
+        for match in cls.SPECIFICATION_END_RE.finditer(data, position):
+            if match.lastgroup == 'open':
+                depth += 1
+            elif match.lastgroup == 'close':
+                depth -= 1
+            elif match.lastgroup == 'end' and depth <= 0:
+                return match
+        return None
+
+    @staticmethod
+    def _get_words(text):
+        """Return the lower case words of the VHDL *text* without comments."""
+        if '--' in text or '/*' in text:
+            text = remove_comments(text)
+        return text.lower().split()
 
     def _parse(self, path, library='work'):
         """
-        Parse the supplied data string and initialise the class.
+        Parse the file at the given *path* and initialise the class.
         """
         with open(path, 'r') as f:
             data = f.read()
-            data = data.lower()  # VHDL is case insensitive
-
-        # Get the file data with comments removed and ensure that it is lower
-        # case.
-        data = remove_comments(data.lower())
+        self._parse_data(data, library)
 
-        # Get the libraries referenced by this file.
-        self.libraries = self._get_libraries(data)
+    def _parse_data(self, data, library='work', indications=None):
+        """
+        Parse the supplied *data* string and initialise the class. The
+        binding *indications* found in the data are added to the given
+        *indications*, if any, see _get_instance_references.
+        """
+        # The interface digest covers the normalised text of the
+        # declarations that other design units depend on: entity, package
+        # and configuration declarations. Only the text of the open
+        # declaration is normalised and hashed.
+        interface = InterfaceDigest()
+        # The keyword and name that may follow the 'end' of the open
+        # interface declaration.
+        interface_ends = []
 
-        # Get any binding indications used in this file.
-        indications = self._get_binding_indications(data)
+        libraries = set(['work'])  # Work library is always included
+        uses = []
+        instances = []
+        # Binding indications instruct the compiler to substitute components
+        # with the given instance label and name with the given target, which
+        # can either be a configuration or an entity. The instance label can
+        # be 'all' or a specific instance label.
+        if indications is None:
+            indications = {}
+        indications = dict(
+            (label, dict(targets)) for label, targets in indications.items()
+        )
+        indications.setdefault('all', {})
+        package_defs = set()
+        package_body_defs = set()
+        architecture_defs = set()
+        configuration_defs = set()
+        component_defs = set()
+        entity_defs = set()
+        function_defs = set()
+        procedure_defs = set()
+
+        position = 0
+        for match in ParsedVhdlFile.UNIT_RE.finditer(data):
+            start = match.start()
+            if start > position and interface.is_open():
+                interface.update(data[position:start].lower().split())
+            position = match.end()
+            kind = match.lastgroup
+            if kind == 'comment':
+                continue
+            if kind == 'string' or kind == 'character':
+                # Literals are case sensitive
+                interface.update([match.group()])
+                continue
+            opened = not interface.is_open()
+            if opened and kind in ('entity', 'package', 'configuration'):
+                interface.open()
+            if interface.is_open():
+                interface.update(ParsedVhdlFile._get_words(match.group()))
+            if kind == 'end':
+                if not interface.is_open():
+                    continue
+                end_words = [
+                    word.lower()
+                    for word in match.group('end_first', 'end_second')
+                    if word is not None
+                ]
+                if end_words in interface_ends:
+                    interface.close()
+            elif kind == 'instance':
+                instances.append(
+                    tuple(
+                        None if value is None else value.lower()
+                        for value in match.group(
+                            'instance_label',
+                            'instance_kind',
+                            'instance_library',
+                            'instance_unit',
+                        )
+                    )
+                )
+            elif kind == 'use':
+                for name in match.group('use_names').split(','):
+                    uses.append(name.strip().lower().split('.'))
+            elif kind == 'library':
+                for name in match.group('library_names').split(','):
+                    libraries.add(name.strip().lower())
+            elif kind == 'subprogram':
+                # Only subprogram bodies and instantiations define a
+                # subprogram, declarations are terminated by ';'
+                end = ParsedVhdlFile._find_specification_end(data, position)
+                if end is not None and end.group().lower() == 'is':
+                    name = match.group('subprogram_name').lower()
+                    if match.group('subprogram_kind').lower() == 'function':
+                        function_defs.add(Function(name, library=library))
+                    else:
+                        procedure_defs.add(Procedure(name, library=library))
+            elif kind == 'component':
+                name = match.group('component_name').lower()
+                component_defs.add(Component(name, library=library))
+            elif kind == 'entity':
+                name = match.group('entity_name').lower()
+                entity_defs.add(Entity(name, library=library))
+                if opened:
+                    interface_ends = [[], ['entity'], [name], ['entity', name]]
+            elif kind == 'architecture':
+                architecture_defs.add(
+                    Architecture(
+                        name=match.group('architecture_name').lower(),
+                        entity=match.group('architecture_entity').lower(),
+                        library=library,
+                    )
+                )
+            elif kind == 'package':
+                name = match.group('package_name').lower()
+                package_defs.add(Package(name, library=library))
+                if match.group('package_new') is not None:
+                    # A package instantiation ends at its terminator, its
+                    # generic map is part of the interface.
+                    if opened:
+                        end = ParsedVhdlFile._find_specification_end(
+                            data, position
+                        )
+                        if end is not None:
+                            interface.update(
+                                ParsedVhdlFile._get_words(
+                                    data[position : end.end()]
+                                )
+                            )
+                        interface.close()
+                elif opened:
+                    interface_ends = [
+                        [],
+                        ['package'],
+                        [name],
+                        ['package', name],
+                    ]
+            elif kind == 'package_body':
+                name = match.group('package_body_name').lower()
+                package_body_defs.add(PackageBody(name, library=library))
+            elif kind == 'configuration':
+                name = match.group('configuration_name').lower()
+                configuration_defs.add(
+                    Configuration(
+                        name,
+                        entity=match.group('configuration_entity').lower(),
+                        library=library,
+                    )
+                )
+                if opened:
+                    interface_ends = [
+                        [],
+                        ['configuration'],
+                        [name],
+                        ['configuration', name],
+                    ]
+            elif kind == 'binding':
+                label, component, target, target_library, unit = (
+                    value.lower()
+                    for value in match.group(
+                        'binding_label',
+                        'binding_component',
+                        'binding_target',
+                        'binding_library',
+                        'binding_unit',
+                    )
+                )
+                if target == 'configuration':
+                    target = Configuration(unit, library=target_library)
+                else:
+                    target = Entity(unit, library=target_library)
+                indications.setdefault(label, {}).setdefault(
+                    component, target
+                )
+        self.interface_digest = interface.hexdigest()
 
-        # Get any package references and declarations
-        self.package_refs = Package.get_all_references(data, self.libraries)
-        self.package_defs = Package.get_all_definitions(data, library)
+        # Get the libraries referenced by this file.
+        self.libraries = libraries
+
+        # Get any package references and declarations, references to the work
+        # library refer to the library that this file is compiled into.
+        package_refs = set()
+        for use_library, name, unit in uses:
+            if use_library not in libraries:
+                continue
+            if use_library == 'work':
+                use_library = library
+            package_refs.add(Package(name, library=use_library, unit=unit))
+        self.package_refs = list(package_refs)
+        self.package_defs = list(package_defs)
+
+        # Package bodies and architectures are tracked separately from the
+        # package and entity declarations that they depend on, design units
+        # only depend on the declarations, which must be in the same library.
+        self.package_body_defs = list(package_body_defs)
+        self.package_body_refs = [
+            Package(body.name, library=library)
+            for body in self.package_body_defs
+        ]
+        self.architecture_defs = list(architecture_defs)
+        self.architecture_refs = list(
+            set(
+                Entity(architecture.entity, library=library)
+                for architecture in self.architecture_defs
+            )
+        )
 
         # Get any embedded configurations
-        self.configuration_defs = Configuration.get_all_definitions(
-            data, library
-        )
+        self.configuration_defs = list(configuration_defs)
 
         # Get any component and entity references and declarations
-        unit_references = Component.get_all_references(data, indications)
+        unit_references = self._get_instance_references(
+            instances, indications
+        )
         self.component_refs = list(
             filter(lambda x: isinstance(x, Component), unit_references)
         )
         self.entity_refs = list(
             filter(lambda x: isinstance(x, Entity), unit_references)
         )
-        self.component_defs = Component.get_all_definitions(data, library)
-        self.entity_defs = Entity.get_all_definitions(data, library)
+        self.component_defs = list(component_defs)
+        self.entity_defs = list(entity_defs)
 
-        # Get any function references and declarations
-        self.function_defs = Function.get_all_definitions(data, library)
+        # Get any function and procedure declarations
+        self.function_defs = list(function_defs)
+        self.procedure_defs = list(procedure_defs)
 
-        # Get any procedure references and declarations
-        self.procedure_defs = Procedure.get_all_definitions(data, library)
+        self._set_units()
 
+    def _set_units(self):
+        """
+        Collect the design unit lists into the definitions and references of
+        this file.
+        """
         self.definitions = []
         self.definitions += self.entity_defs
         self.definitions += self.package_defs
+        self.definitions += self.package_body_defs
+        self.definitions += self.architecture_defs
         self.definitions += self.component_defs
         self.definitions += self.configuration_defs
         self.definitions += self.function_defs
@@ -518,7 +762,88 @@ class ParsedVhdlFile:
         self.references = []
         self.references += self.entity_refs
         self.references += self.package_refs
+        self.references += self.package_body_refs
+        self.references += self.architecture_refs
         self.references += self.component_refs
 
         self.children = []
         self.parents = []
+
+    def get_summary(self):
+        """
+        Return a compact string holding the interface digest, libraries and
+        design units of this file, which can be passed to the constructor to
+        create the ParsedVhdlFile again without parsing the file.
+        """
+        summary = [self.interface_digest, sorted(self.libraries)]
+        for attribute, cls, fields in ParsedVhdlFile.summary_units:
+            summary.append(
+                [
+                    [getattr(unit, field) for field in fields]
+                    for unit in getattr(self, attribute)
+                ]
+            )
+        return json.dumps(summary, separators=(',', ':'))
+
+    def _load_summary(self, summary):
+        """
+        Initialise this instance from a *summary* string returned by
+        *get_summary*.
+        """
+        summary = json.loads(summary)
+        self.interface_digest, libraries = summary[:2]
+        self.libraries = set(libraries)
+        for (attribute, cls, fields), units in zip(
+            ParsedVhdlFile.summary_units, summary[2:]
+        ):
+            if len(units) > 0:
+                units = [cls(*args) for args in units]
+            setattr(self, attribute, units)
+        self._set_units()
+
+    @staticmethod
+    def _get_instance_references(instances, indications):
+        """
+        Return the list of design units referenced by the (label, kind,
+        library, unit) *instances* tuples. Entity references are made by
+        direct instantiation or by a component instantiation via a component
+        declaration, the binding *indications* can be used to make a
+        component instantiation reference an entity or configuration
+        directly.
+        """
+        references = set()
+        for label, kind, library, unit in instances:
+            if kind == 'configuration':
+                instance = Configuration(unit, library=library)
+            elif library is not None:
+                # VHDL 93 style entity instantiation
+                instance = Entity(unit, library=library)
+            else:
+                # Component instantiation
+                instance = Component(unit, instance=label, library=library)
+                # Check the binding indications to see if the instance has
+                # been explictly linked to an entity or configuration:
+                if label in indications:
+                    if unit in indications[label]:
+                        instance = indications[label][unit]
+                elif unit in indications['all']:
+                    instance = indications['all'][unit]
+            # Add the instance reference
+            references.add(instance)
+            # Instantiations referencing a component declaration introduce an
+            # implicit reference to an entity of the same name and port mapping
+            if isinstance(instance, Component):
+                references.add(Entity(unit, library=library))
+        return list(references)
+
+
+def _scan(data, library='work', indications=None):
+    """
+    Return a ParsedVhdlFile holding the design units of the VHDL *data*
+    string compiled into the given *library*.
+    """
+    parsed = ParsedVhdlFile.__new__(ParsedVhdlFile)
+    parsed.file_object = parsed.path = parsed.name = None
+    parsed.library = library
+    parsed._parse_data(data, library, indications)
+    return parsed
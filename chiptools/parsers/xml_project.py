@@ -152,6 +152,15 @@ class XmlProjectParser:
     +----------------------+--------------------------------------------------+
     | part                 | FPGA part to target when performing synthesis.   |
     +----------------------+--------------------------------------------------+
+    | compile_hierarchy    | If true, only compile the files in the hierarchy |
+    |                      | of the simulated top level, the whole project is |
+    |                      | compiled if the hierarchy cannot be resolved.    |
+    +----------------------+--------------------------------------------------+
+    | prune_synthesis      | If true, only pass the files in the hierarchy of |
+    |                      | the synthesised top level to the synthesis tool, |
+    |                      | all files are passed if the hierarchy cannot be  |
+    |                      | resolved.                                        |
+    +----------------------+--------------------------------------------------+
 
     In addition to the above configuration items, the *config* tag also allows
     tool-specific argument passing through the use of config attributes using
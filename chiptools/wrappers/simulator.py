@@ -1,10 +1,24 @@
 import logging
 import os
+import shlex
+import threading
 import time
+import traceback
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
 
 from chiptools.common import exceptions
 from chiptools.common.exceptions import FileNotFoundError
+from chiptools.common import hashing
 from chiptools.common import utils
+from chiptools.common.filelock import FileLock
+from chiptools.common.filetypes import FileType
+from chiptools.common import graph as graphs
+from chiptools.core.artifacts import ArtifactCache
+from chiptools.core.cache import FileCache
+from chiptools.parsers.callgraph import CallGraph
 from chiptools.wrappers.toolchains import ToolchainBase
 
 log = logging.getLogger(__name__)
@@ -18,9 +32,106 @@ class Simulator(ToolchainBase):
     this class.
     """
 
+    # Arguments passed to the first executable to report the tool version
+    version_args = ['-version']
+    # If True, files that depend on a recompiled VHDL file are only
+    # recompiled when the interface of the recompiled file (its entity,
+    # package and configuration declarations) changed. Wrappers for tools
+    # that invalidate every dependent of a recompiled primary unit, such as
+    # GHDL and ModelSim, must set this to False.
+    interface_invalidation = True
+    # If True, files on the same dependency level can be compiled
+    # concurrently when more than one compile job is requested. Files in the
+    # same library are still serialised by the library compile lock.
+    # Wrappers whose compile steps share state between libraries, such as a
+    # single library mapping file, must leave this set to False.
+    parallel_compile = False
+    # The maximum number of files passed to a single call to compile_batch
+    compile_batch_size = 1
+    # If True, the files that precede the failing file in a batch that
+    # failed to compile are kept in their library by the tool. Otherwise they
+    # are compiled again once the failing file has been found.
+    batch_keeps_progress = False
+    # The default number of build products, such as elaborated designs,
+    # kept in the artifact cache
+    artifact_cache_size = 64
+
     def __init__(self, project, executables, user_paths):
         super(Simulator, self).__init__(project, executables, user_paths)
         self.libraries = {}
+        self.version = None
+        # Serialises access to the project cache from compile worker threads
+        self._cache_lock = threading.Lock()
+        # Design files of each simulated top level, and the manifest of the
+        # project files with the files reachable from each top level file,
+        # shared by the top levels, see get_design_files
+        self._design_files = {}
+        self._reachable = (None, {})
+
+    def get_version(self):
+        """
+        Return the version string reported by the simulator. The version is
+        obtained by calling the first simulator executable with the
+        *version_args* arguments, the result is recorded in the project cache
+        so that the tool is only called again if the executable changes. If
+        the version cannot be determined the path to the tool is returned.
+        """
+        if self.version is None and len(self.executables) == 0:
+            self.version = self.path
+        if self.version is None:
+            executable = os.path.join(self.path, self.executables[0])
+
+            def probe():
+                try:
+                    ret, stdout, stderr = Simulator._call(
+                        executable, self.version_args
+                    )
+                    lines = (stdout or '').strip().splitlines()
+                    if len(lines) > 0:
+                        return lines[0].strip()
+                except Exception:
+                    log.debug(
+                        'Could not determine the {0} version'.format(
+                            self.name
+                        )
+                    )
+                return self.path
+
+            self.version = self.project.cache.get_tool_version(
+                executable, probe
+            )
+        return self.version
+
+    def get_compile_arguments(self, file_object):
+        """
+        Return the list of additional compile arguments to pass to the
+        simulator for the given *file_object*. Arguments in the global
+        project config take precedence over the arguments attached to the
+        file.
+        """
+        args = self.project.get_tool_arguments(self.name, 'compile')
+        if len(args) == 0:
+            args = file_object.get_tool_arguments(self.name, 'compile')
+        return shlex.split(['', args][args is not None])
+
+    def get_compile_context(self, file_object):
+        """
+        Return a digest over everything other than the file contents that
+        affects the compiled output of the *file_object*: the effective
+        compile arguments (which select the language standard), the source
+        language, the target library and the simulator version. A change
+        to the context causes the file to be recompiled.
+        """
+        return hashing.data_digest(
+            repr(
+                (
+                    self.get_compile_arguments(file_object),
+                    str(file_object.fileType),
+                    file_object.library,
+                    self.get_version(),
+                )
+            )
+        )
 
     def compile(self, file_object):
         """
@@ -28,6 +139,72 @@ class Simulator(ToolchainBase):
         """
         raise NotImplementedError
 
+    def compile_batch(self, library, file_objects, cwd=None):
+        """
+        Compile the supplied list of *file_objects* into the given *library*
+        in the order they are given. Wrappers that can pass several files to
+        a single compiler invocation override this method and set
+        *compile_batch_size* to the maximum number of files to pass at once,
+        by default each file is compiled individually.
+        """
+        for file_object in file_objects:
+            # Map the library to work so files can be added
+            self.set_working_library(library, cwd=cwd)
+            self.compile(file_object, cwd=cwd)
+
+    def get_failed_index(self, file_objects, error):
+        """
+        Return the index of the file in the *file_objects* batch that caused
+        the batch to fail with the given *error*, or None if it cannot be
+        determined. The failing file is the first file whose path appears in
+        the tool output held by the error, earlier files that are named in
+        warnings only cause the batch to be split sooner.
+        """
+        message = str(error)
+        for idx, file_object in enumerate(file_objects):
+            if file_object.path in message:
+                return idx
+        return None
+
+    def get_argument_groups(self, file_objects):
+        """
+        Split the list of *file_objects* into a list of consecutive
+        (fileType, arguments, file_objects) groups of files that have the
+        same file type and compile arguments and so can be passed to a single
+        compiler invocation.
+        """
+        groups = []
+        for file_object in file_objects:
+            args = self.get_compile_arguments(file_object)
+            if (
+                len(groups) > 0
+                and groups[-1][0] == file_object.fileType
+                and groups[-1][1] == args
+            ):
+                groups[-1][2].append(file_object)
+            else:
+                groups.append((file_object.fileType, args, [file_object]))
+        return groups
+
+    def use_compile_session(self):
+        """
+        Return True if the whole compile plan should be passed to
+        *compile_session* instead of compiling it in batches. Wrappers that
+        support compiling many files in a single tool session override this
+        method to enable the mode, by default it is disabled.
+        """
+        return False
+
+    def compile_session(self, libraries, file_objects, cwd=None):
+        """
+        Create the new *libraries* and compile the supplied list of
+        *file_objects* into their libraries, in the order they are given,
+        using a single invocation of the tool. Compilation stops at the first
+        file that fails. Return the list of file objects that compiled
+        successfully.
+        """
+        raise NotImplementedError
+
     def simulate(self, library, entity, **kwargs):
         """
         Invoke the simulator and target the given *entity* in the given
@@ -46,6 +223,185 @@ class Simulator(ToolchainBase):
         """
         raise NotImplementedError
 
+    def get_design_files(self, library, entity):
+        """
+        Return the list of project file objects needed to elaborate the
+        *entity* in the given *library*. Files that are not VHDL cannot be
+        parsed and are always included. Return None if the entity cannot be
+        found or the design references units in the project libraries that
+        are not defined by any project file. The hierarchies below the files
+        visited for one top level are not traversed again for the other top
+        levels while the project files are unchanged.
+        """
+        files = self.project.get_files()
+        # The design files only change if a project file changes
+        try:
+            manifest = FileCache.get_manifest_root(
+                (f.path, f.library)
+                + tuple(FileCache.get_stat_signature(f.path))
+                for f in files
+            )
+            memo_key = (library, entity.lower(), manifest)
+        except OSError:
+            manifest = memo_key = None
+        if memo_key in self._design_files:
+            return self._design_files[memo_key]
+        cache = None
+        if manifest is not None:
+            if self._reachable[0] != manifest:
+                self._reachable = (manifest, {})
+            cache = self._reachable[1]
+        try:
+            parsed_files = CallGraph.get_parsed_files(
+                [f for f in files if f.fileType == FileType.VHDL],
+                self.project.cache,
+            )
+        except (OSError, UnicodeDecodeError) as e:
+            log.warning(
+                'Could not parse the project dependencies: {0}'.format(e)
+            )
+            return None
+        design_files = CallGraph.get_design_files(
+            parsed_files,
+            library,
+            entity,
+            libraries=set(f.library for f in files),
+            cache=cache,
+        )
+        if design_files is not None:
+            paths = set(parsed_file.path for parsed_file in design_files)
+            design_files = [
+                file_object
+                for file_object in files
+                if file_object.fileType != FileType.VHDL
+                or file_object.path in paths
+            ]
+        else:
+            log.debug(
+                'Could not resolve the hierarchy of {0}.{1}'.format(
+                    library, entity
+                )
+            )
+        if memo_key is not None:
+            self._design_files[memo_key] = design_files
+        return design_files
+
+    def get_compile_files(self, tops=None):
+        """
+        Return the list of project file objects that must be compiled to
+        simulate the (library, entity) tuples in the *tops* list: the files
+        in the hierarchy of each top level. If *tops* is None, or the
+        hierarchy of any top level cannot be resolved, every project file is
+        returned.
+        """
+        files = self.project.get_files()
+        if tops is None:
+            return files
+        paths = set()
+        for library, entity in tops:
+            design_files = self.get_design_files(library, entity)
+            if design_files is None:
+                log.info(
+                    'Could not resolve the hierarchy of '
+                    + '{0}.{1}, compiling all files'.format(library, entity)
+                )
+                return files
+            paths.update(file_object.path for file_object in design_files)
+        return [f for f in files if f.path in paths]
+
+    def get_design_digest(self, library, entity, options=()):
+        """
+        Return a digest identifying the elaborated design for the *entity* in
+        the given *library*. The digest covers the cache keys of the compiled
+        design files, the simulator version and the list of elaboration
+        *options*, it changes whenever any of the units in the design is
+        recompiled.
+        """
+        cache = self.project.cache
+        entries = [
+            ('top', library, entity.lower()),
+            ('version', self.get_version()),
+            ('options',) + tuple(options),
+        ]
+        files = self.get_design_files(library, entity)
+        if files is None:
+            files = self.project.get_files()
+        for file_object in files:
+            entries.append(
+                (
+                    file_object.path,
+                    file_object.library,
+                    str(cache.get_file_key(file_object, self.name)),
+                )
+            )
+        return FileCache.get_manifest_root(entries)
+
+    def get_boolean_option(self, name, default=False):
+        """
+        Return True if the *name* option in the [<toolname> options] section
+        of the .chiptoolsconfig file is enabled, or *default* if it is not
+        set.
+        """
+        options = self.project.get_tool_options(self.name)
+        if name not in options:
+            return default
+        return options[name].strip().lower() in ('1', 'true', 'yes', 'on')
+
+    def get_artifact_option(self, name, default=None):
+        """
+        Return the numeric value of the *name* option in the
+        [<toolname> options] section of the .chiptoolsconfig file, or
+        *default* if it is not set or invalid.
+        """
+        options = self.project.get_tool_options(self.name)
+        if name not in options:
+            return default
+        try:
+            return float(options[name])
+        except ValueError:
+            log.warning(
+                'Invalid {0} for {1}: {2}'.format(
+                    name, self.name, options[name]
+                )
+            )
+            return default
+
+    def get_artifact_cache(self, root=None, prefix='', on_remove=None):
+        """
+        Return the ArtifactCache used to store the build products of this
+        simulator, such as elaborated designs, in the simulation directory.
+        Wrappers for tools that keep their build products in a fixed location
+        supply the *root* directory of the cache and the *prefix* that
+        identifies the artifacts in it, the optional *on_remove* function
+        deletes build products held outside the cache when an artifact is
+        evicted.
+        The limits of the cache are set by options in the [<toolname>
+        options] section of the .chiptoolsconfig file: artifact_cache_size
+        is the number of artifacts to keep (*artifact_cache_size* by
+        default), artifact_cache_days is the number of days an unused
+        artifact is kept and artifact_cache_mb is the total size in
+        megabytes of the artifacts to keep.
+        """
+        if root is None:
+            root = os.path.join(
+                self.project.get_simulation_directory(),
+                '.chiptools_artifacts',
+                self.name,
+            )
+        max_entries = self.get_artifact_option(
+            'artifact_cache_size', self.artifact_cache_size
+        )
+        max_age = self.get_artifact_option('artifact_cache_days')
+        max_size = self.get_artifact_option('artifact_cache_mb')
+        return ArtifactCache(
+            root,
+            max_entries=None if max_entries is None else int(max_entries),
+            max_age=None if max_age is None else max_age * 24 * 3600,
+            max_size=None if max_size is None else int(max_size * 2**20),
+            prefix=prefix,
+            on_remove=on_remove,
+        )
+
     def set_working_library(self, library, cwd=None):
         """
         Set the current working library where source files are to be compiled
@@ -68,7 +424,532 @@ class Simulator(ToolchainBase):
         lib_path = os.path.join(workdir, libname)
         return os.path.isdir(lib_path)
 
-    def compile_project(self, includes={}):
+    def get_compile_lock(self, libname, workdir):
+        """
+        Return a FileLock that must be held while compiling files into the
+        given *libname* library in the *workdir* simulation directory. This
+        prevents several processes sharing a simulation directory from
+        compiling into the same library at the same time. Wrappers that keep
+        state shared by all libraries in the simulation directory should
+        return a single lock for all libraries.
+        """
+        return FileLock(
+            os.path.join(workdir, '.chiptools_{0}.lock'.format(libname))
+        )
+
+    def is_up_to_date(self, file_object, workdir, created_libraries, verify):
+        """
+        Return True if the *file_object* and its compile context are
+        unchanged since it was last compiled and its library exists and was
+        not created by the current compilation (listed in
+        *created_libraries*).
+        """
+        libname = file_object.library
+        return (
+            not self.project.cache.is_file_changed(
+                file_object,
+                self.name,
+                verify=verify,
+                context=self.get_compile_context(file_object),
+            )
+            and self.library_exists(libname, workdir)
+            and libname not in created_libraries
+        )
+
+    def get_dependency_order(
+        self,
+        files,
+        contexts,
+        reasons,
+        interfaces=None,
+        levels=None,
+        modified=None,
+    ):
+        """
+        Parse the VHDL *files* to find the dependencies between them and
+        return the list of indices into *files* sorted so that each file
+        follows the files it depends on. The *reasons* dictionary maps the
+        indices of the files that must be compiled to the reason they must be
+        compiled, files that depend on these files are added to it unless
+        the interface digest of the files they depend on is unchanged.
+        The interface digest of each parsed file is stored in the optional
+        *interfaces* dictionary and the dependency level of each file is
+        stored in the optional *levels* dictionary, both keyed on path. The
+        files whose dependents must be compiled are appended to the optional
+        *modified* list. Files that are not VHDL are not parsed, each of them
+        depends on the previous file that is not VHDL so their relative order
+        is preserved. If the dependencies cannot be determined the project
+        file order is returned, and *reasons*, *levels* and *modified* are
+        not modified.
+        """
+        interfaces = {} if interfaces is None else interfaces
+        levels = {} if levels is None else levels
+        modified = [] if modified is None else modified
+        indices = [
+            idx
+            for idx, file_object in enumerate(files)
+            if file_object.fileType == FileType.VHDL
+        ]
+        try:
+            parsed_files = CallGraph.get_parsed_files(
+                [files[idx] for idx in indices], self.project.cache
+            )
+        except (OSError, UnicodeDecodeError) as e:
+            log.warning(
+                'Could not parse the project dependencies, only modified '
+                + 'files will be compiled: {0}'.format(e)
+            )
+            return list(range(len(files)))
+        index = dict(zip(parsed_files, indices))
+        for node in parsed_files:
+            interfaces[node.path] = node.interface_digest
+        file_graph = CallGraph.get_file_graph(parsed_files)
+        graph = dict(
+            (index[node], set(index[child] for child in children))
+            for node, children in file_graph.items()
+        )
+        others = [idx for idx in range(len(files)) if idx not in graph]
+        for previous, idx in zip(others, others[1:]):
+            graph[idx] = set([previous])
+        try:
+            order = graphs.stable_sort(graph, range(len(files)))
+        except ValueError:
+            cycle = graphs.get_cycle(graph, graphs.get_components(graph)[0])
+            log.warning(
+                'Could not determine the compilation order, only modified '
+                + 'files will be compiled: cyclic dependency '
+                + ' -> '.join(files[idx].path for idx in cycle)
+            )
+            return list(range(len(files)))
+        for idx, level in graphs.get_levels(graph, order).items():
+            levels[files[idx].path] = level
+        # Files that changed without changing their interface do not affect
+        # the files that depend on them.
+        nodes = []
+        for node in parsed_files:
+            idx = index[node]
+            if idx not in reasons:
+                continue
+            if (
+                self.interface_invalidation
+                and reasons[idx] == 'content changed'
+                and node.interface_digest
+                == self.project.cache.get_file_interface(
+                    files[idx], self.name, context=contexts[idx]
+                )
+            ):
+                log.debug(
+                    'Interface unchanged, dependents of {0} '.format(
+                        node.path
+                    )
+                    + 'will not be recompiled'
+                )
+                continue
+            nodes.append(node)
+            modified.append(files[idx])
+        callchain = CallGraph.get_callchain(file_graph, nodes)
+        for node in callchain:
+            reasons.setdefault(index[node], 'dependency changed')
+        return order
+
+    def mark_dependents_stale(self, files, modified):
+        """
+        Mark the project files that are not in the *files* list and depend on
+        the *modified* files as stale in the cache, so that they are compiled
+        by the next compilation that includes them. This is used when the
+        compilation is limited to the hierarchy of some top levels, which
+        would otherwise leave the rest of the project compiled against the
+        old design units. If the dependencies cannot be determined every
+        project file that is not in *files* is marked.
+        """
+        if len(modified) == 0:
+            return
+        cache = self.project.cache
+        project_files = self.project.get_files()
+        paths = set(file_object.path for file_object in files)
+        outside = [f for f in project_files if f.path not in paths]
+        try:
+            parsed_files = CallGraph.get_parsed_files(
+                [f for f in project_files if f.fileType == FileType.VHDL],
+                cache,
+            )
+        except (OSError, UnicodeDecodeError) as e:
+            log.warning(
+                'Could not parse the project dependencies, every file '
+                + 'outside the hierarchy will be compiled next time: '
+                + '{0}'.format(e)
+            )
+            dependents = set(file_object.path for file_object in outside)
+        else:
+            graph = dict(
+                (node.path, set(child.path for child in children))
+                for node, children in CallGraph.get_file_graph(
+                    parsed_files
+                ).items()
+            )
+            dependents = graphs.get_dependents(
+                graph, [file_object.path for file_object in modified]
+            )
+        for file_object in outside:
+            if file_object.path in dependents:
+                log.debug(
+                    'Marking {0} for compilation'.format(file_object.path)
+                )
+                cache.mark_file_stale(file_object, self.name)
+
+    def get_manifest_roots(self, files, contexts, signatures):
+        """
+        Return a dictionary mapping the name of each library to the Merkle
+        root over the paths, stat *signatures* and compile *contexts* of the
+        *files* in the library. The root over all of the library roots is
+        stored under the empty name. Libraries holding a file that has no
+        signature in the *signatures* dictionary are omitted, along with the
+        root for the whole project.
+        """
+        cache = self.project.cache
+        entries = {}
+        for file_object, context in zip(files, contexts):
+            libname = file_object.library
+            signature = signatures.get(file_object.path, None)
+            if signature is None:
+                entries[libname] = None
+            elif entries.setdefault(libname, []) is not None:
+                entries[libname].append(
+                    (file_object.path,) + tuple(signature) + (context,)
+                )
+        roots = dict(
+            (libname, cache.get_manifest_root(library_entries))
+            for libname, library_entries in entries.items()
+            if library_entries is not None
+        )
+        if len(roots) == len(entries):
+            roots[''] = cache.get_manifest_root(roots.items())
+        return roots
+
+    def get_current_roots(self, files, contexts):
+        """
+        Return the Merkle roots for the current state of the *files*
+        compiled in the given *contexts*, see *get_manifest_roots*.
+        """
+        signatures = {}
+        for file_object in files:
+            try:
+                signatures[file_object.path] = FileCache.get_stat_signature(
+                    file_object.path
+                )
+            except OSError:
+                continue
+        return self.get_manifest_roots(files, contexts, signatures)
+
+    def is_manifest_current(self, name, roots, workdir, scope=''):
+        """
+        Return True if the Merkle root for the library *name*, or for the
+        whole project if *name* is empty, in the *roots* dictionary matches
+        the root recorded in the cache and the libraries it covers exist.
+        Roots computed over a subset of the project files are recorded
+        separately for each *scope*.
+        """
+        root = roots.get(name, None)
+        if root is None or root != self.project.cache.get_manifest(
+            self.name, scope + name
+        ):
+            return False
+        libraries = [name] if name != '' else [n for n in roots if n != '']
+        return all(self.library_exists(n, workdir) for n in libraries)
+
+    def save_manifests(self, files, contexts, scope=''):
+        """
+        Record the Merkle roots over the cache records of the *files* so
+        that a later compilation can find unchanged libraries without
+        checking each file. The roots are recorded for the given *scope*, see
+        *is_manifest_current*.
+        """
+        cache = self.project.cache
+        signatures = {}
+        for file_object, context in zip(files, contexts):
+            signature = cache.get_file_signature(
+                file_object, self.name, context=context
+            )
+            if signature is not None:
+                signatures[file_object.path] = signature
+        roots = self.get_manifest_roots(files, contexts, signatures)
+        for name, root in roots.items():
+            cache.set_manifest(self.name, scope + name, root)
+
+    def plan_compile(
+        self,
+        verify=False,
+        interfaces=None,
+        levels=None,
+        files=None,
+        scope='',
+        modified=None,
+    ):
+        """
+        Return a list of (file_object, reason) tuples for the project files
+        that must be compiled, in the order that they must be compiled,
+        without invoking the simulator. The reason is one of:
+
+          * 'new file' : The file has not been compiled before
+          * 'content changed' : The file was modified since it was compiled
+          * 'args changed' : The compile context of the file changed, for
+            example the compile arguments or the simulator version
+          * 'dependency changed' : The interface of a file that the file
+            depends on changed, or the file was marked stale by an earlier
+            compilation limited to a hierarchy that did not include it
+          * 'library missing' : The library of the file must be created
+
+        If *verify* is True the contents of every file are hashed to detect
+        changes. The interface digests of the parsed VHDL files are stored in
+        the optional *interfaces* dictionary and the dependency levels of the
+        files are stored in the optional *levels* dictionary, both keyed on
+        path. Files on the same level do not depend on each other. The files
+        whose dependents must be compiled are appended to the optional
+        *modified* list.
+        The optional *files* list selects a subset of the project files to
+        plan, the manifests of the subset are recorded for the given *scope*.
+        """
+        cache = self.project.cache
+        cwd = self.project.get_simulation_directory()
+        if files is None:
+            files = self.project.get_files()
+        for file_object in files:
+            if not os.path.isfile(file_object.path):
+                raise FileNotFoundError(
+                    'File could not be found: '
+                    + '{0}, operation aborted.'.format(file_object.path)
+                )
+        contexts = [self.get_compile_context(f) for f in files]
+        # Files in libraries whose Merkle root is unchanged do not need to be
+        # checked individually.
+        current_libraries = set()
+        if not verify:
+            roots = self.get_current_roots(files, contexts)
+            current_libraries = set(
+                libname
+                for libname in roots
+                if libname != ''
+                and self.is_manifest_current(libname, roots, cwd, scope)
+            )
+        # Hash any files that cannot be checked using their stat signature
+        # in a single batch
+        cache.precompute_digests(
+            [f for f in files if f.library not in current_libraries],
+            self.name,
+            verify=verify,
+            contexts=dict((f.path, c) for f, c in zip(files, contexts)),
+        )
+        # If a library is missing from the cache or the simulation directory
+        # someone must have deleted it since the last run, all files that are
+        # targeted at this library must be recompiled.
+        missing_libraries = set(
+            libname
+            for libname in set(f.library for f in files)
+            if libname not in current_libraries
+            and (
+                not cache.library_in_cache(libname, self.name)
+                or not self.library_exists(libname, cwd)
+            )
+        )
+        reasons = {}
+        for idx, file_object in enumerate(files):
+            if file_object.library in current_libraries:
+                continue
+            elif file_object.library in missing_libraries:
+                reasons[idx] = 'library missing'
+            elif cache.is_file_changed(
+                file_object, self.name, verify=verify, context=contexts[idx]
+            ):
+                context = cache.get_file_context(file_object, self.name)
+                if context is None:
+                    reasons[idx] = 'new file'
+                elif context != contexts[idx]:
+                    reasons[idx] = 'args changed'
+                else:
+                    reasons[idx] = 'content changed'
+        stale = cache.get_stale_paths(self.name)
+        for idx, file_object in enumerate(files):
+            if idx not in reasons and file_object.path in stale:
+                reasons[idx] = 'dependency changed'
+        order = list(range(len(files)))
+        if len(reasons) > 0:
+            order = self.get_dependency_order(
+                files, contexts, reasons, interfaces, levels, modified
+            )
+        return [(files[idx], reasons[idx]) for idx in order if idx in reasons]
+
+    def get_compile_batches(self, entries):
+        """
+        Split the list of (file_object, reason) *entries* into a list of
+        (library, entries) batches of consecutive entries targeted at the
+        same library, each holding at most *compile_batch_size* entries.
+        """
+        batches = []
+        for entry in entries:
+            libname = entry[0].library
+            if (
+                len(batches) > 0
+                and batches[-1][0] == libname
+                and len(batches[-1][1]) < self.compile_batch_size
+            ):
+                batches[-1][1].append(entry)
+            else:
+                batches.append((libname, [entry]))
+        return batches
+
+    def get_outdated_files(self, entries, workdir, created_libraries, verify):
+        """
+        Return the file objects from the (file_object, reason) *entries* that
+        still need compiling. Files are skipped if another process sharing the
+        cache compiled them while this process was waiting for the compile
+        lock, unless the reason for compiling them is a dependency change.
+        """
+        cache = self.project.cache
+        file_objects = []
+        with self._cache_lock:
+            for file_object, reason in entries:
+                cache.refresh_file(file_object, self.name)
+                if (
+                    reason != 'dependency changed'
+                    and self.is_up_to_date(
+                        file_object, workdir, created_libraries, verify
+                    )
+                    and cache.library_in_cache(file_object.library, self.name)
+                ):
+                    log.info('...skipping: ' + file_object.path)
+                else:
+                    file_objects.append(file_object)
+        return file_objects
+
+    def compile_files(
+        self, libname, entries, workdir, created_libraries, verify, record
+    ):
+        """
+        Compile the (file_object, reason) *entries* from a compile plan into
+        the *libname* library in the *workdir* simulation directory while
+        holding the library compile lock. Files are not compiled if another
+        process sharing the cache compiled them while this process was
+        waiting for the lock, unless the reason for compiling them is a
+        dependency change. The remaining files are compiled using a single
+        call to *compile_batch*. If the batch fails, the files that precede
+        the failing file named in the tool output are recorded as compiled,
+        after compiling them again unless *batch_keeps_progress* is set, and
+        the error is raised. If the failing file cannot be found the files
+        are compiled one at a time so that it is identified. The *record*
+        function is called with each file once it has compiled.
+        Return the number of files that were skipped.
+        """
+        with self.get_compile_lock(libname, workdir):
+            file_objects = self.get_outdated_files(
+                entries, workdir, created_libraries, verify
+            )
+            for file_object in file_objects:
+                log.info(
+                    '...compiling {0} ({1}) into library {2}'.format(
+                        os.path.basename(file_object.path),
+                        file_object.fileType,
+                        libname,
+                    )
+                )
+            compiled = []
+            error = None
+            if len(file_objects) > 1:
+                try:
+                    self.compile_batch(libname, file_objects, cwd=workdir)
+                    compiled = file_objects
+                except Exception as e:
+                    log.debug(traceback.format_exc())
+                    failed = self.get_failed_index(file_objects, e)
+                    if failed is None:
+                        log.warning(
+                            '...batch compilation failed, compiling files '
+                            + 'individually'
+                        )
+                    else:
+                        error = e
+                        compiled = file_objects[:failed]
+                        if len(compiled) > 0 and not self.batch_keeps_progress:
+                            self.compile_batch(libname, compiled, cwd=workdir)
+            with self._cache_lock:
+                for file_object in compiled:
+                    record(file_object)
+            if error is not None:
+                raise error
+            if len(compiled) == 0:
+                for file_object in file_objects:
+                    self.compile_batch(libname, [file_object], cwd=workdir)
+                    with self._cache_lock:
+                        record(file_object)
+        return len(entries) - len(file_objects)
+
+    def compile_files_in_session(
+        self, entries, workdir, created_libraries, verify, record
+    ):
+        """
+        Compile the (file_object, reason) *entries* from a compile plan using
+        a single call to *compile_session* while holding the compile lock of
+        every library in the plan. Missing libraries are created by the
+        session. The *record* function is called with each file that
+        compiled, if any file failed an ExecutionError is raised. Return the
+        number of files that were skipped.
+        """
+        cache = self.project.cache
+        locks = OrderedDict()
+        for file_object, reason in entries:
+            lock = self.get_compile_lock(file_object.library, workdir)
+            locks.setdefault(lock.path, lock)
+        with ExitStack() as stack:
+            for path in sorted(locks):
+                stack.enter_context(locks[path])
+            libraries = []
+            for file_object, reason in entries:
+                libname = file_object.library
+                if libname in libraries or libname in created_libraries:
+                    continue
+                if not cache.library_in_cache(
+                    libname, self.name
+                ) or not self.library_exists(libname, workdir):
+                    log.info('...adding library: ' + libname)
+                    libraries.append(libname)
+                    created_libraries.append(libname)
+            file_objects = self.get_outdated_files(
+                entries, workdir, created_libraries, verify
+            )
+            for file_object in file_objects:
+                log.info(
+                    '...compiling {0} ({1}) into library {2}'.format(
+                        os.path.basename(file_object.path),
+                        file_object.fileType,
+                        file_object.library,
+                    )
+                )
+            compiled = self.compile_session(
+                libraries, file_objects, cwd=workdir
+            )
+            with self._cache_lock:
+                for libname in libraries:
+                    cache.add_library(libname.lower(), self.name)
+                for file_object in compiled:
+                    record(file_object)
+            for file_object in file_objects:
+                if file_object not in compiled:
+                    raise exceptions.ExecutionError(
+                        'Failed to compile: ' + file_object.path
+                    )
+        return len(entries) - len(file_objects)
+
+    def compile_project(self, includes={}, verify=False, jobs=1, tops=None):
+        """
+        Compile the files in the project that have been modified since they
+        were last compiled along with the files that depend on them. If
+        *verify* is True the contents of every file are hashed to detect
+        changes rather than trusting the file size and modification time
+        recorded in the cache. If *jobs* is greater than 1 and the simulator
+        supports parallel compilation, files that do not depend on each other
+        are compiled concurrently using up to *jobs* threads. If *tops* is a
+        list of (library, entity) tuples only the files in the hierarchy of
+        those top levels are compiled, see *get_compile_files*.
+        """
         self.libraries.update(includes)
         for libname, path in includes.items():
             self.set_library_path(libname, path)
@@ -77,73 +958,179 @@ class Simulator(ToolchainBase):
         # Compile the project
         try:
             cwd = self.project.get_simulation_directory()
-            # Placeholder arguments
-            force = False
             # Compile each of the sources in the project file
             created_libraries = []
-            skipped = 0
-            count = 0
             start_time = time.time()
-            file_object = None
-            try:
-                for file_object in self.project.get_files():
-                    libname = file_object.library
-                    count += 1
-                    # Check the md5sum of this file and compare it to the
-                    # md5sum cache to see if it has changed since it was
-                    # last compiled
-                    if os.path.isfile(file_object.path):
-                        if not force and not cache.is_file_changed(
-                            file_object, self.name
-                        ):
-                            # The hashes match. If the library already exists
-                            # then dont compile the file.
-                            if self.library_exists(libname, cwd):
-                                if libname not in created_libraries:
-                                    skipped += 1
-                                    log.info(
-                                        '...skipping: ' + file_object.path
-                                    )
-                                    continue
-                        cache.add_file(file_object, self.name)
-                        # Map or create the library, track which libraries
-                        # were already created
-                        if not cache.library_in_cache(
-                            libname, self.name
-                        ) or not self.library_exists(libname, cwd):
-                            # If this library is in the cache file someone must
-                            # have deleted it since the last run, we need to
-                            # recompile all files that are targeted at this
-                            # library.
-                            created_libraries.append(libname)
-                            log.info('...adding library: ' + libname)
-                            self.add_library(libname)
-                            cache.add_library(libname.lower(), self.name)
-                        # Map the library to work so files can be added
-                        self.set_working_library(libname, cwd=cwd)
-                        log.info(
-                            '...compiling {0} ({1}) into library {2}'.format(
-                                os.path.basename(file_object.path),
-                                file_object.fileType,
-                                libname,
-                            )
+            files = self.get_compile_files(tops)
+            count = len(files)
+            scope = ''
+            if count < len(self.project.get_files()):
+                log.info(
+                    '...compiling the {0} file(s) in the hierarchy of '.format(
+                        count
+                    )
+                    + ', '.join('{0}.{1}'.format(*top) for top in tops)
+                )
+                scope = 'hierarchy:{0}:'.format(
+                    ','.join(sorted('{0}.{1}'.format(*top) for top in tops))
+                )
+            # Discard cache records loaded earlier, other processes sharing
+            # the cache file may have updated them since.
+            cache.refresh(self.name)
+            # If the Merkle root over the whole project is unchanged there is
+            # nothing to compile.
+            contexts = [self.get_compile_context(f) for f in files]
+            if not verify and self.is_manifest_current(
+                '', self.get_current_roots(files, contexts), cwd, scope
+            ):
+                log.info(
+                    '...all {0} file(s) are up to date. '.format(count)
+                    + 'Use "clean" to erase the file cache'
+                )
+                return
+            interfaces = {}
+            levels = {}
+            modified = []
+            plan = self.plan_compile(
+                verify=verify,
+                interfaces=interfaces,
+                levels=levels,
+                files=files,
+                scope=scope,
+                modified=modified,
+            )
+            skipped = count - len(plan)
+            cache.clear_manifests(self.name)
+            if scope != '':
+                self.mark_dependents_stale(files, modified)
+            # Create any missing libraries before compiling files into them,
+            # the plan includes every file targeted at a missing library.
+            libraries = []
+            for file_object, reason in plan:
+                if file_object.library not in libraries:
+                    libraries.append(file_object.library)
+            session = self.use_compile_session()
+            if session:
+                # The session creates the libraries it needs
+                libraries = []
+            for libname in libraries:
+                with self.get_compile_lock(libname, cwd):
+                    if not cache.library_in_cache(
+                        libname, self.name
+                    ) or not self.library_exists(libname, cwd):
+                        created_libraries.append(libname)
+                        log.info('...adding library: ' + libname)
+                        self.add_library(libname)
+                        cache.add_library(libname.lower(), self.name)
+            # Group the plan into waves of batches of files that can be
+            # compiled concurrently, each wave depends only on the earlier
+            # waves. Each batch holds files for a single library.
+            if session:
+                # A single batch holding the whole plan
+                jobs = 1
+                waves = [[(None, plan)]]
+            elif (
+                jobs > 1
+                and self.parallel_compile
+                and all(f.path in levels for f, reason in plan)
+            ):
+                entries = dict((entry[0].path, entry) for entry in plan)
+                wavefronts = graphs.get_wavefronts(
+                    dict((path, levels[path]) for path in entries)
+                )
+                waves = [
+                    self.get_compile_batches(
+                        sorted(
+                            [entries[path] for path in wavefront],
+                            key=lambda e: e[0].library,
+                        )
+                    )
+                    for wavefront in wavefronts
+                ]
+            else:
+                jobs = 1
+                waves = [[batch] for batch in self.get_compile_batches(plan)]
+            recorded = set()
+
+            def record(file_object):
+                # Record the file in the cache as soon as it has compiled so
+                # that progress survives a later failure
+                cache.add_file(
+                    file_object,
+                    self.name,
+                    context=self.get_compile_context(file_object),
+                    interface=interfaces.get(file_object.path, None),
+                )
+                recorded.add(file_object.path)
+
+            def attempt(batch):
+                libname, entries = batch
+                try:
+                    if session:
+                        skipped = self.compile_files_in_session(
+                            entries, cwd, created_libraries, verify, record
                         )
-                        # Compile the source
-                        self.compile(file_object, cwd=cwd)
                     else:
-                        raise FileNotFoundError(
-                            'File could not be found: '
-                            + '{0}, operation aborted.'.format(
-                                file_object.path
-                            )
+                        skipped = self.compile_files(
+                            libname,
+                            entries,
+                            cwd,
+                            created_libraries,
+                            verify,
+                            record,
+                        )
+                    return skipped, None
+                except Exception as e:
+                    return 0, e
+
+            executor = None
+            if jobs > 1:
+                executor = ThreadPoolExecutor(max_workers=jobs)
+            try:
+                for wave in waves:
+                    if executor is not None:
+                        results = list(executor.map(attempt, wave))
+                    else:
+                        results = [attempt(batch) for batch in wave]
+                    failures = []
+                    for (libname, entries), (batch_skipped, e) in zip(
+                        wave, results
+                    ):
+                        skipped += batch_skipped
+                        if e is not None:
+                            failures.append((entries, e))
+                    if len(failures) > 0:
+                        # Clear the cache records for the files that failed
+                        # so they will recompile next time
+                        for entries, e in failures:
+                            for file_object, reason in entries:
+                                if file_object.path in recorded:
+                                    continue
+                                log.error(
+                                    '...failed to compile: '
+                                    + file_object.path
+                                )
+                                cache.remove_file(file_object, self.name)
+                        # Files planned for later batches keep their cache
+                        # records, mark them so that files planned because a
+                        # dependency changed are not forgotten.
+                        failed = set(
+                            file_object.path
+                            for entries, e in failures
+                            for file_object, reason in entries
                         )
-            except Exception:
-                # Clear the SHA1 for the file that failed so it will recompile
-                # next time
-                if file_object is not None:
-                    cache.remove_file(file_object, self.name)
-                cache.save_cache()
-                raise
+                        for file_object, reason in plan:
+                            if (
+                                file_object.path not in recorded
+                                and file_object.path not in failed
+                            ):
+                                cache.mark_file_stale(file_object, self.name)
+                        cache.save_cache()
+                        raise failures[0][1]
+            finally:
+                if executor is not None:
+                    executor.shutdown()
+            self.save_manifests(files, contexts, scope)
             if skipped > 0:
                 log.info(
                     '...skipped '
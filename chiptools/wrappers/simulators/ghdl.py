@@ -1,6 +1,6 @@
 import logging
 import os
-import shlex
+import shutil
 import types
 
 from chiptools.wrappers.simulator import Simulator
@@ -14,6 +14,15 @@ class Ghdl(Simulator):
 
     name = 'ghdl'
     executables = ['ghdl']
+    version_args = ['--version']
+    # Each GHDL library has its own library file and analysis takes no
+    # other shared state, so libraries can be compiled concurrently.
+    parallel_compile = True
+    compile_batch_size = 64
+    # Analysing a file replaces every primary unit that it declares, which
+    # obsoletes the units that depend on them even if their interface is
+    # unchanged.
+    interface_invalidation = False
 
     def __init__(self, project, user_paths):
         super(Ghdl, self).__init__(project, self.executables, user_paths)
@@ -29,22 +38,40 @@ class Ghdl(Simulator):
         args=tuple(),
         duration=None,
     ):
-        # Elaborate
-        args = [
+        workdir = self.project.get_simulation_directory()
+        # Elaborate, the elaborated design is cached and reused until a unit
+        # in the design is recompiled. Generics are applied at run time.
+        elaborate = [
             '-e',
             '--work=' + library,
             entity,
         ]
-        Ghdl._call(
-            self.ghdl, args, cwd=self.project.get_simulation_directory()
+
+        def build(path):
+            Ghdl._call(self.ghdl, elaborate, cwd=workdir)
+            # The GCC and LLVM backends write an executable named after the
+            # entity, the mcode backend elaborates in memory when run.
+            for name in Ghdl.get_executable_names(entity):
+                executable = os.path.join(workdir, name)
+                if os.path.isfile(executable):
+                    shutil.move(executable, os.path.join(path, name))
+
+        artifact = self.get_artifact_cache().get(
+            self.get_design_digest(library, entity, elaborate), build
         )
-        # Run command
+        # Run command, the elaborated executable is run directly if there is
+        # one, otherwise ghdl runs the design.
+        executable = self.ghdl
         args = [
             '-r',
             '--work=' + library,
         ]
         # Primary Unit
         args += [entity]
+        for name in Ghdl.get_executable_names(entity):
+            if os.path.isfile(os.path.join(artifact, name)):
+                executable = os.path.join(artifact, name)
+                args = []
         # Map any generics
         for name, binding in generics.items():
             args += ['-g{0}={1}'.format(name, binding)]
@@ -55,19 +82,27 @@ class Ghdl(Simulator):
                 ]
         # Run the simulation
         ret, stdout, stderr = Ghdl._call(
-            self.ghdl,
+            executable,
             args,
-            cwd=self.project.get_simulation_directory(),
+            cwd=workdir,
             quiet=False,
         )
 
         return ret, stdout, stderr
 
+    @staticmethod
+    def get_executable_names(entity):
+        """
+        Return the possible names of the executable written when elaborating
+        the given *entity*.
+
+        >>> Ghdl.get_executable_names('Top')
+        ['top', 'top.exe']
+        """
+        return [entity.lower(), entity.lower() + '.exe']
+
     def compile(self, file_object, cwd=None):
-        args = self.project.get_tool_arguments(self.name, 'compile')
-        if len(args) == 0:
-            args = file_object.get_tool_arguments(self.name, 'compile')
-        args = shlex.split(['', args][args is not None])
+        args = self.get_compile_arguments(file_object)
         args += ['-a', '--work=' + file_object.library, file_object.path]
         if file_object.fileType == FileType.VHDL:
             Ghdl._call(
@@ -79,6 +114,26 @@ class Ghdl(Simulator):
                 + file_object.path
             )
 
+    def compile_batch(self, library, file_objects, cwd=None):
+        """
+        Compile the *file_objects* into the given *library* using a single
+        'ghdl -a' call for each group of consecutive files that share the
+        same compile arguments.
+        """
+        for file_type, args, group in self.get_argument_groups(file_objects):
+            if file_type != FileType.VHDL:
+                for file_object in group:
+                    log.warning(
+                        'Simulator ignoring file with unsupported extension: '
+                        + file_object.path
+                    )
+                continue
+            args = args + ['-a', '--work=' + library]
+            args += [file_object.path for file_object in group]
+            Ghdl._call(
+                self.ghdl, args, cwd=self.project.get_simulation_directory()
+            )
+
     def library_exists(self, libname, workdir):
         """
         Return True if the given libname exists in the workdir.
@@ -1,8 +1,10 @@
 import logging
 import os
-import shlex
+import shutil
+import tempfile
 
 from chiptools.wrappers.simulator import Simulator
+from chiptools.common.filelock import FileLock
 from chiptools.common.filetypes import FileType
 from chiptools.common import utils
 
@@ -14,11 +16,14 @@ class Isim(Simulator):
     name = 'isim'
     executables = ['fuse', 'vlogcomp', 'vhpcomp']
 
-    # Name of the output file generated by fuse
+    # Name of the output file generated by fuse, cached executables add the
+    # leading characters of the design digest to the name
     sim_exe_name = 'fuse_sim'
+    sim_exe_digest_length = 16
     sim_project_name = 'isim_project.prj'
     sim_ini_name = 'xilinxsim.ini'
     sim_tcl_name = 'isim.tcl'
+    sim_wdb_extension = '.wdb'
 
     def __init__(self, project, user_paths):
         super(Isim, self).__init__(project, self.executables, user_paths)
@@ -60,50 +65,132 @@ class Isim(Simulator):
     ):
         cwd = self.project.get_simulation_directory()
         # Execute FUSE on the design files:
-        fuse_args = [
-            library + '.' + entity,
-            '-o',
-            self.sim_exe_name,
-        ]
+        fuse_args = [library + '.' + entity]
         # Set simulator generics
         for name, binding in generics.items():
             fuse_args += ['--generic_top', name + '=' + str(binding)]
-        Isim._call(self.fuse, fuse_args, cwd=cwd, quiet=False)
+        # Simulation executables are cached and named by a digest of the
+        # compiled design and the fuse arguments, fuse only runs when there
+        # is no executable for the design.
+        key = self.get_design_digest(library, entity, fuse_args)
+        sim_exe_name = self.get_sim_exe_name(key)
+
+        def build(path):
+            Isim._call(
+                self.fuse,
+                fuse_args + ['-o', sim_exe_name],
+                cwd=cwd,
+                quiet=False,
+            )
+
+        def on_remove(path):
+            self.remove_sim_exe(self.get_sim_exe_name(os.path.basename(path)))
+
+        def validate(path):
+            # The executable is written to the simulation directory, it is
+            # built again if it was deleted
+            return any(
+                os.path.isfile(os.path.join(cwd, name))
+                for name in [sim_exe_name, sim_exe_name + '.exe']
+            )
+
+        self.get_artifact_cache(on_remove=on_remove).get(
+            key, build, validate=validate
+        )
         # Fuse generates a simulation executable, this can be called now with
         # the specified simulator arguments:
         sim_args = []
         if gui:
             sim_args += ['-gui']
-        # Create a TCL file:
-        with open(os.path.join(cwd, self.sim_tcl_name), 'w') as f:
-            # Set run duration
-            if duration is not None:
-                if duration <= 0:
-                    duration = 'all'
-                else:
-                    duration = utils.seconds_to_timestring(duration)
-                f.write('run {0}\n'.format(duration))
-                f.write('exit\n')
-        sim_args += ['-tclbatch', self.sim_tcl_name]
-        # Run the simulation
-        ret, stdout, stderr = Isim._call(
-            os.path.join(cwd, self.sim_exe_name),
-            sim_args,
-            cwd=self.project.get_simulation_directory(),
-            quiet=False,
+        # Create a TCL file, each simulation uses its own TCL file and
+        # waveform database so that simulations can run concurrently in the
+        # simulation directory. The waveform database replaces the database
+        # of the previous simulation of the design when the run finishes:
+        stem, extension = os.path.splitext(self.sim_tcl_name)
+        fd, sim_tcl_path = tempfile.mkstemp(
+            suffix=extension, prefix=stem + '_', dir=cwd
         )
+        sim_wdb_name = os.path.splitext(os.path.basename(sim_tcl_path))[0]
+        sim_wdb_name += self.sim_wdb_extension
+        try:
+            with os.fdopen(fd, 'w') as f:
+                # Set run duration
+                if duration is not None:
+                    if duration <= 0:
+                        duration = 'all'
+                    else:
+                        duration = utils.seconds_to_timestring(duration)
+                    f.write('run {0}\n'.format(duration))
+                    f.write('exit\n')
+            sim_args += ['-tclbatch', os.path.basename(sim_tcl_path)]
+            sim_args += ['-wdb', sim_wdb_name]
+            # Run the simulation
+            ret, stdout, stderr = Isim._call(
+                os.path.join(cwd, sim_exe_name),
+                sim_args,
+                cwd=self.project.get_simulation_directory(),
+                quiet=False,
+            )
+        finally:
+            os.remove(sim_tcl_path)
+            sim_wdb_path = os.path.join(cwd, sim_wdb_name)
+            if os.path.isfile(sim_wdb_path):
+                design_wdb_path = os.path.join(
+                    cwd, self.get_sim_wdb_name(library, entity)
+                )
+                os.replace(sim_wdb_path, design_wdb_path)
+                log.info('Waveform database: ' + design_wdb_path)
 
         return ret, stdout, stderr
 
+    @classmethod
+    def get_sim_wdb_name(cls, library, entity):
+        """
+        Return the name of the waveform database kept for the last
+        simulation of the *entity* in the given *library*.
+
+        >>> Isim.get_sim_wdb_name('lib', 'top')
+        'isim_lib.top.wdb'
+        """
+        stem = os.path.splitext(cls.sim_tcl_name)[0]
+        return '{0}_{1}.{2}{3}'.format(
+            stem, library, entity, cls.sim_wdb_extension
+        )
+
+    @classmethod
+    def get_sim_exe_name(cls, key):
+        """
+        Return the name of the cached simulation executable for the design
+        with the given digest *key*.
+
+        >>> Isim.get_sim_exe_name('a1b2c3d4e5f6a7b8c9d0')
+        'fuse_sim_a1b2c3d4e5f6a7b8'
+        """
+        return '{0}_{1}'.format(
+            cls.sim_exe_name, key[: cls.sim_exe_digest_length]
+        )
+
+    def remove_sim_exe(self, sim_exe_name):
+        """
+        Remove the simulation executable *sim_exe_name* and the isim folder
+        that fuse created for it from the simulation directory.
+        """
+        cwd = self.project.get_simulation_directory()
+        for name in [sim_exe_name, sim_exe_name + '.exe']:
+            path = os.path.join(cwd, name)
+            if os.path.isfile(path):
+                os.remove(path)
+        shutil.rmtree(
+            os.path.join(cwd, 'isim', sim_exe_name + '.sim'),
+            ignore_errors=True,
+        )
+
     def compile(self, file_object, cwd=None):
         cwd = self.project.get_simulation_directory()
         if file_object.library not in self.libraries:
             self.libraries[file_object.library] = file_object.library
             self.write_includes()
-        args = self.project.get_tool_arguments(self.name, 'compile')
-        if len(args) == 0:
-            args = file_object.get_tool_arguments(self.name, 'compile')
-        args = shlex.split(['', args][args is not None])
+        args = self.get_compile_arguments(file_object)
         args += [
             '-incremental',
             '-work',
@@ -127,6 +214,15 @@ class Isim(Simulator):
             return True
         return False
 
+    def get_compile_lock(self, libname, workdir):
+        """
+        Return a FileLock that must be held while compiling into *libname*.
+        The xilinxsim.ini file shared by all libraries in the simulation
+        directory is rewritten when a library is added, so a single lock is
+        used for every library.
+        """
+        return FileLock(os.path.join(workdir, '.chiptools_isim.lock'))
+
     def set_working_library(self, library, cwd=None):
         pass
 
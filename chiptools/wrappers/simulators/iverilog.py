@@ -14,6 +14,7 @@ class Iverilog(Simulator):
 
     name = 'iverilog'
     executables = ['iverilog', 'vvp']
+    version_args = ['-V']
 
     def __init__(self, project, user_paths):
         super(Iverilog, self).__init__(project, self.executables, user_paths)
@@ -22,14 +23,18 @@ class Iverilog(Simulator):
         self.filetypes = [FileType.Verilog, FileType.SystemVerilog]
         self.files = []
 
-    def compile_project(self, includes={}):
+    def compile_project(self, includes={}, verify=False, jobs=1, tops=None):
         """
         This method stages files for compilation as we cannot perform
         compilation until additional runtime information such as generic
-        assignments and the desired top-level entity are known. Incremental
-        compilation is not supported by Icarus so the cache and library
-        tracking are not used at all.
+        assignments and the desired top-level entity are known. Verilog files
+        are not parsed so every file is staged regardless of *tops*.
+        Incremental compilation is not supported by Icarus so library
+        tracking is not used, the cache only records the file digests that
+        identify the compiled images reused by *simulate*.
         """
+        cache = self.project.cache
+        cache.refresh(self.name)
         self.files = []
         for file_object in self.project.get_files():
             if os.path.isfile(file_object.path):
@@ -46,6 +51,18 @@ class Iverilog(Simulator):
                     'File could not be found: '
                     + '{0}, operation aborted.'.format(file_object.path)
                 )
+        contexts = dict(
+            (file_object.path, self.get_compile_context(file_object))
+            for file_object in self.files
+        )
+        cache.precompute_digests(self.files, self.name, contexts=contexts)
+        for file_object in self.files:
+            context = contexts[file_object.path]
+            if cache.is_file_changed(
+                file_object, self.name, verify=verify, context=context
+            ):
+                cache.add_file(file_object, self.name, context=context)
+        cache.save_cache()
         log.info(
             (
                 'Deferring compilation of {0} file(s) until simulation '
@@ -67,13 +84,8 @@ class Iverilog(Simulator):
         Compile and simulate the design.
         """
         start_time = time.time()
+        workdir = self.project.get_simulation_directory()
         args = []
-        # Specify the output name
-        args += ['-o', 'icarus_sim']
-        # Get the files
-        for file_object in self.files:
-            args.append(file_object.path)
-            # TODO: Add additional custom compile args for each file.
         # Define the top level
         args += ['-s', entity]
         # Define top level parameters
@@ -90,9 +102,23 @@ class Iverilog(Simulator):
         # Add custom library paths (the library name is ignored)
         for k, v in includes.items():
             args += ['-y' + v]
-        # Call the Iverilog compilation stage
-        Iverilog._call(
-            self.iverilog, args, cwd=self.project.get_simulation_directory()
+
+        def build(path):
+            # Specify the output name, then get the files
+            build_args = ['-o', os.path.join(path, 'icarus_sim')]
+            for file_object in self.files:
+                build_args.append(file_object.path)
+                # TODO: Add additional custom compile args for each file.
+            # Call the Iverilog compilation stage
+            Iverilog._call(self.iverilog, build_args + args, cwd=workdir)
+
+        # Compiled images are cached and reused by simulations with the same
+        # files, top level, defines and include paths.
+        image = os.path.join(
+            self.get_artifact_cache().get(
+                self.get_design_digest(library, entity, args), build
+            ),
+            'icarus_sim',
         )
         log.info('...done')
         log.info(
@@ -129,14 +155,14 @@ class Iverilog(Simulator):
         extended = list(filter(lambda x: x in extended_args, args))
         args = flags
         # Target application
-        args += ['icarus_sim']
+        args += [image]
         # Extended Args
         args += extended
         # Run the simulation
         ret, stdout, stderr = Iverilog._call(
             self.vvp,
             args,
-            cwd=self.project.get_simulation_directory(),
+            cwd=workdir,
             quiet=False,
         )
         return ret, stdout, stderr
@@ -1,9 +1,12 @@
 import logging
 import os
+import re
 import shlex
 
 from chiptools.wrappers.simulator import Simulator
+from chiptools.common.filelock import FileLock
 from chiptools.common.filetypes import FileType
+from chiptools.common import exceptions
 from chiptools.common import utils
 
 log = logging.getLogger(__name__)
@@ -21,6 +24,29 @@ class Modelsim(Simulator):
 
     name = 'modelsim'
     executables = ['vcom', 'vlib', 'vlog', 'vmap', 'vsim']
+    compile_batch_size = 64
+    # vcom recompiles every primary unit in a file, units that depend on them
+    # must then be refreshed even if their interface is unchanged (vsim-13).
+    interface_invalidation = False
+    # vcom and vlog write each file to its library as it compiles and exit at
+    # the first file that fails.
+    batch_keeps_progress = True
+    # Name of the do-script generated for single session compilation
+    session_script = 'chiptools_compile.do'
+    # Access visibility arguments passed to vopt for each optimisation
+    # profile, the debug profile is used when the GUI is enabled.
+    vopt_profiles = {
+        'debug': ['+acc'],
+        'regression': ['+acc=none'],
+    }
+    # Optimised designs are named using this prefix followed by the leading
+    # characters of the design digest
+    vopt_prefix = 'chiptools_'
+    vopt_digest_length = 16
+    # Message echoed by the do-script after each file compiles
+    SESSION_MARKER_RE = re.compile(
+        r'^[#\s]*chiptools-compiled\s+(\d+)\s*$', re.MULTILINE
+    )
 
     def __init__(self, project, user_paths):
         super(Modelsim, self).__init__(project, self.executables, user_paths)
@@ -29,6 +55,10 @@ class Modelsim(Simulator):
         self.vlog = os.path.join(self.path, 'vlog')
         self.vlib = os.path.join(self.path, 'vlib')
         self.vsim = os.path.join(self.path, 'vsim')
+        # Not available in every edition, only used if vopt is enabled
+        self.vopt = os.path.join(self.path, 'vopt')
+        self.vdel = os.path.join(self.path, 'vdel')
+        self.vdir = os.path.join(self.path, 'vdir')
 
     def simulate(
         self,
@@ -65,8 +95,22 @@ class Modelsim(Simulator):
         for libname in self.project.get_libraries():
             arguments += ['-L', libname]
         # Map any generics
+        generic_args = []
         for name, binding in generics.items():
-            arguments += ['-G{0}={1}'.format(name, binding)]
+            generic_args += ['-G{0}={1}'.format(name, binding)]
+        target = '{0}.{1}'.format(library, entity)
+        if self.get_boolean_option('vopt'):
+            # Generics are fixed when the design is optimised
+            libraries = list(includes) + list(self.project.get_libraries())
+            target = self.optimise(
+                library,
+                entity,
+                libraries,
+                generic_args,
+                self.get_vopt_profile(gui),
+            )
+        else:
+            arguments += generic_args
         # Enable or disable the GUI
         arguments += [['-c'], ['-i']][gui]
         # Apply any DO commands
@@ -79,7 +123,7 @@ class Modelsim(Simulator):
             arguments += ['-do', '{0}'.format(do)]
         # Finish processing arguments and invoke vsim
         # arguments += ['-L ' + library for library in includes.keys()]
-        arguments += ['{0}.{1}'.format(library, entity)]
+        arguments += [target]
         ret, stdout, stderr = Modelsim._call(
             self.vsim,
             arguments,
@@ -88,17 +132,129 @@ class Modelsim(Simulator):
         )
         return ret, stdout, stderr
 
+    def get_vopt_profile(self, gui=False):
+        """
+        Return the name of the vopt_profiles entry used to optimise designs.
+        The debug profile is used with the GUI, otherwise the profile is set
+        by the vopt_profile option in the [modelsim options] section of the
+        .chiptoolsconfig file and defaults to the regression profile.
+        """
+        if gui:
+            return 'debug'
+        options = self.project.get_tool_options(self.name)
+        profile = options.get('vopt_profile', 'regression')
+        if profile not in self.vopt_profiles:
+            log.warning(
+                'Unknown vopt_profile {0}, using regression'.format(profile)
+            )
+            profile = 'regression'
+        return profile
+
+    def get_vopt_cache(self, remove=True):
+        """
+        Return the ArtifactCache recording the optimised designs. Each
+        artifact holds the library and name of an optimised design, which is
+        deleted from its library when the artifact is evicted unless
+        *remove* is False.
+        """
+        workdir = self.project.get_simulation_directory()
+
+        def on_remove(path):
+            library, name = Modelsim.read_vopt_artifact(path)
+            with self.get_compile_lock(library, workdir):
+                Modelsim._call(self.vdel, ['-lib', library, name], cwd=workdir)
+
+        return self.get_artifact_cache(
+            root=os.path.join(
+                workdir, '.chiptools_artifacts', self.name + '_vopt'
+            ),
+            on_remove=on_remove if remove else None,
+        )
+
+    @staticmethod
+    def read_vopt_artifact(path):
+        """
+        Return the (library, name) of the optimised design recorded in the
+        artifact at *path*.
+        """
+        with open(os.path.join(path, 'design'), 'r') as f:
+            library, name = f.read().split()
+        return library, name
+
+    def optimise(self, library, entity, libraries, generics, profile):
+        """
+        Return the library.name of the optimised design for the *entity* in
+        the given *library* with the *generics* arguments applied, optimised
+        using the vopt_profiles entry named *profile*. The design is only
+        optimised again when it is not in the cache, which is the case when
+        any of the units in the design are recompiled. The *libraries* are
+        searched for design units.
+        """
+        workdir = self.project.get_simulation_directory()
+        vopt_args = ['-work', library]
+        for libname in libraries:
+            vopt_args += ['-L', libname]
+        vopt_args += generics
+        vopt_args += self.vopt_profiles[profile]
+        vopt_args += ['{0}.{1}'.format(library, entity)]
+        digest = self.get_design_digest(library, entity, vopt_args)
+        name = self.vopt_prefix + digest[: self.vopt_digest_length]
+
+        def build(path):
+            log.info('...optimising {0} ({1} profile)'.format(entity, profile))
+            # vopt writes the optimised design into the library
+            with self.get_compile_lock(library, workdir):
+                Modelsim._call(
+                    self.vopt, vopt_args + ['-o', name], cwd=workdir
+                )
+            with open(os.path.join(path, 'design'), 'w') as f:
+                f.write('{0}\n{1}\n'.format(library, name))
+
+        def validate(path):
+            # The design is stored in the library, it is optimised again if
+            # it was deleted
+            return self.design_exists(library, name)
+
+        self.get_vopt_cache().get(digest, build, validate=validate)
+        return '{0}.{1}'.format(library, name)
+
+    def design_exists(self, library, name):
+        """
+        Return True if the design unit *name* is in the given *library* of
+        the simulation directory, according to vdir.
+        """
+        workdir = self.project.get_simulation_directory()
+        if not os.path.isdir(os.path.join(workdir, library)):
+            return False
+        try:
+            ret, stdout, stderr = Modelsim._call(
+                self.vdir, ['-lib', library, name], cwd=workdir
+            )
+        except exceptions.ExecutionError:
+            return False
+        return '** Error' not in (stdout or '') + (stderr or '')
+
+    def forget_vopt_designs(self, library):
+        """
+        Remove the cache records for the optimised designs in the given
+        *library*, which are lost when the library is created again.
+        """
+        cache = self.get_vopt_cache(remove=False)
+        for last_used, key in cache.get_entries():
+            path = cache.get_path(key)
+            try:
+                if Modelsim.read_vopt_artifact(path)[0] == library:
+                    cache.remove(key)
+            except (OSError, ValueError):
+                cache.remove(key)
+
     def compile(self, file_object, cwd=None):
         """
         Compile the supplied *file_object* into the current working library.
         """
         # Before compiling this file, check to see if it has any additional
-        # arguments that need passing to modelsim. First check the global
-        # project config, and then check the local file config.
-        args = self.project.get_tool_arguments(self.name, 'compile')
-        if len(args) == 0:
-            args = file_object.get_tool_arguments(self.name, 'compile')
-        args = shlex.split(['', args][args is not None])
+        # arguments that need passing to modelsim.
+        args = self.get_compile_arguments(file_object)
         args += [file_object.path]
         if file_object.fileType == FileType.VHDL:
             Modelsim._call(
@@ -118,6 +274,128 @@ class Modelsim(Simulator):
                 + file_object.path
             )
 
+    def compile_batch(self, library, file_objects, cwd=None):
+        """
+        Compile the *file_objects* into the given *library* using a single
+        vcom or vlog call for each group of consecutive files that share the
+        same type and compile arguments. The library is selected using the
+        -work argument so the library mapping is not modified.
+        """
+        for file_type, args, group in self.get_argument_groups(file_objects):
+            if file_type == FileType.VHDL:
+                executable = self.vcom
+            elif file_type in (FileType.Verilog, FileType.SystemVerilog):
+                executable = self.vlog
+            else:
+                for file_object in group:
+                    log.warning(
+                        'Simulator ignoring file with unsupported extension: '
+                        + file_object.path
+                    )
+                continue
+            args = args + ['-work', library]
+            args += [file_object.path for file_object in group]
+            Modelsim._call(
+                executable, args, cwd=self.project.get_simulation_directory()
+            )
+
+    def use_compile_session(self):
+        """
+        Return True if the compile_session option is enabled in the
+        [modelsim options] section of the .chiptoolsconfig file.
+        """
+        return self.get_boolean_option('compile_session')
+
+    def get_session_script(self, libraries, file_objects):
+        """
+        Return the text of a do-script that creates and maps the *libraries*
+        and compiles each of the *file_objects* into its library. The script
+        echoes a marker with the index of each file that compiled and quits
+        at the first error.
+        """
+        lines = ['onerror {quit -f -code 1}']
+        for library in libraries:
+            lines.append('vlib {{{0}}}'.format(library))
+            lines.append('vmap {{{0}}} {{{0}}}'.format(library))
+        for index, file_object in enumerate(file_objects):
+            if file_object.fileType == FileType.VHDL:
+                command = 'vcom'
+            elif file_object.fileType in (
+                FileType.Verilog,
+                FileType.SystemVerilog,
+            ):
+                command = 'vlog'
+            else:
+                command = None
+                log.warning(
+                    'Simulator ignoring file with unsupported extension: '
+                    + file_object.path
+                )
+            if command is not None:
+                args = self.get_compile_arguments(file_object)
+                args += ['-work', file_object.library, file_object.path]
+                lines.append(
+                    ' '.join(
+                        [command] + ['{{{0}}}'.format(arg) for arg in args]
+                    )
+                )
+            lines.append('echo chiptools-compiled {0}'.format(index))
+        lines.append('quit -f')
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def parse_session_transcript(transcript):
+        """
+        Return the set of file indices that the session transcript reports
+        as compiled.
+
+        >>> sorted(Modelsim.parse_session_transcript(
+        ...     '# chiptools-compiled 0\\n# ** Error: bad.vhd(1)\\n'
+        ...     '# chiptools-compiled 1\\n'
+        ... ))
+        [0, 1]
+        """
+        return set(
+            int(index)
+            for index in Modelsim.SESSION_MARKER_RE.findall(transcript)
+        )
+
+    def compile_session(self, libraries, file_objects, cwd=None):
+        """
+        Compile the *file_objects* using a generated do-script executed by a
+        single vsim session, avoiding a tool start-up and licence checkout
+        for each vlib, vmap, vcom and vlog call. The files that compiled are
+        identified from the markers in the session transcript.
+        """
+        workdir = self.project.get_simulation_directory()
+        for library in libraries:
+            self.forget_vopt_designs(library)
+        script = os.path.join(workdir, Modelsim.session_script)
+        with open(script, 'w') as f:
+            f.write(self.get_session_script(libraries, file_objects))
+        try:
+            ret, transcript, stderr = Modelsim._call(
+                self.vsim, ['-c', '-do', script], cwd=workdir
+            )
+        except exceptions.ExecutionError as e:
+            transcript = str(e)
+            log.error(transcript)
+        compiled = Modelsim.parse_session_transcript(transcript)
+        return [
+            file_object
+            for index, file_object in enumerate(file_objects)
+            if index in compiled
+        ]
+
+    def get_compile_lock(self, libname, workdir):
+        """
+        Return a FileLock that must be held while compiling into *libname*.
+        ModelSim maps the working library in the modelsim.ini file shared by
+        all libraries in the simulation directory, so a single lock is used
+        for every library.
+        """
+        return FileLock(os.path.join(workdir, '.chiptools_modelsim.lock'))
+
     def set_working_library(self, library, cwd=None):
         Modelsim._call(
             self.vmap,
@@ -141,3 +419,4 @@ class Modelsim(Simulator):
             [library, library],
             cwd=self.project.get_simulation_directory(),
         )
+        self.forget_vopt_designs(library)
@@ -1,9 +1,9 @@
 import logging
 import os
-import shlex
 import sys
 
 from chiptools.wrappers.simulator import Simulator
+from chiptools.common.filelock import FileLock
 from chiptools.common.filetypes import FileType
 from chiptools.common import utils
 
@@ -25,9 +25,17 @@ class Vivado(Simulator):
     xsim_name = 'xsim' + platform_suffix
 
     executables = [xvhdl_name, xvlog_name, xelab_name, xsim_name]
+    version_args = ['--version']
+    compile_batch_size = 64
 
     sim_ini_name = 'xsim.ini'
     sim_tcl_name = 'xsim.tcl'
+    # Cached snapshots in the xsim.dir folder are named using this prefix
+    # followed by the leading characters of the design digest. xsim.dir also
+    # holds the compiled libraries, the artifact cache only uses and evicts
+    # the snapshot directories that have its marker file.
+    snapshot_prefix = 'chiptools_'
+    snapshot_digest_length = 32
 
     def __init__(self, project, user_paths):
         super(Vivado, self).__init__(project, self.executables, user_paths)
@@ -106,8 +114,14 @@ class Vivado(Simulator):
                 )
             # Execute XELAB on the design files:
             xelab_args += ' ' + library + '.' + str(entity)
-            xelab_args += ' ' + '-s' + ' ' + str(entity)
-            Vivado._call_str_args(self.xelab, xelab_args, cwd=cwd, quiet=False)
+
+            def elaborate(snapshot):
+                Vivado._call_str_args(
+                    self.xelab,
+                    xelab_args + ' ' + '-s' + ' ' + snapshot,
+                    cwd=cwd,
+                    quiet=False,
+                )
         else:
             # Normal behavior on other platforms.
             xelab_args = []
@@ -134,8 +148,29 @@ class Vivado(Simulator):
 
             # Execute XELAB on the design files:
             xelab_args += [library + '.' + str(entity)]
-            xelab_args += ['-s', str(entity)]
-            Vivado._call(self.xelab, xelab_args, cwd=cwd, quiet=False)
+
+            def elaborate(snapshot):
+                Vivado._call(
+                    self.xelab,
+                    xelab_args + ['-s', snapshot],
+                    cwd=cwd,
+                    quiet=False,
+                )
+
+        # Snapshots are named by a digest of the compiled design and the
+        # elaboration arguments (generics, libraries and debug level) and
+        # are reused until any of them change.
+        snapshot_cache = self.get_artifact_cache(
+            root=os.path.join(cwd, 'xsim.dir'), prefix=self.snapshot_prefix
+        )
+        digest = self.get_design_digest(library, entity, [xelab_args])
+        snapshot = os.path.basename(
+            snapshot_cache.get(
+                digest[: self.snapshot_digest_length],
+                lambda path: elaborate(os.path.basename(path)),
+                in_place=True,
+            )
+        )
         # Fuse generates a simulation executable, this can be called now with
         # the specified simulator arguments:
         sim_args = []
@@ -166,7 +201,7 @@ class Vivado(Simulator):
                 f.write('exit\n')
         sim_args += ['-tclbatch', self.sim_tcl_name]
         # Path to snapshot to execute
-        sim_args += [entity]
+        sim_args += [snapshot]
         # Run the simulation
         ret, stdout, stderr = Vivado._call(
             self.xsim,
@@ -182,10 +217,7 @@ class Vivado(Simulator):
         if file_object.library not in self.libraries:
             self.libraries[file_object.library] = file_object.library
         self.write_includes()
-        args = self.project.get_tool_arguments(self.name, 'compile')
-        if len(args) == 0:
-            args = file_object.get_tool_arguments(self.name, 'compile')
-        args = shlex.split(['', args][args is not None])
+        args = self.get_compile_arguments(file_object)
         args += ['-work', file_object.library, file_object.path]
         if file_object.fileType == FileType.VHDL:
             Vivado._call(self.xvhdl, args, cwd=cwd)
@@ -199,11 +231,46 @@ class Vivado(Simulator):
                 + file_object.path
             )
 
+    def compile_batch(self, library, file_objects, cwd=None):
+        """
+        Compile the *file_objects* into the given *library* using a single
+        xvhdl or xvlog call for each group of consecutive files that share
+        the same type and compile arguments.
+        """
+        cwd = self.project.get_simulation_directory()
+        if library not in self.libraries:
+            self.libraries[library] = library
+        self.write_includes()
+        for file_type, args, group in self.get_argument_groups(file_objects):
+            if file_type == FileType.VHDL:
+                executable = self.xvhdl
+            elif file_type in (FileType.Verilog, FileType.SystemVerilog):
+                executable = self.xvlog
+            else:
+                for file_object in group:
+                    log.warning(
+                        'Vivado wrapper skipping file with unknown type: '
+                        + file_object.path
+                    )
+                continue
+            args = args + ['-work', library]
+            args += [file_object.path for file_object in group]
+            Vivado._call(executable, args, cwd=cwd)
+
     def library_exists(self, libname, workdir):
         if os.path.exists(os.path.join(workdir, libname)):
             return True
         return False
 
+    def get_compile_lock(self, libname, workdir):
+        """
+        Return a FileLock that must be held while compiling into *libname*.
+        The xsim.ini file shared by all libraries in the simulation directory
+        is rewritten for each compilation, so a single lock is used for every
+        library.
+        """
+        return FileLock(os.path.join(workdir, '.chiptools_vivado.lock'))
+
     def set_working_library(self, library, cwd=None):
         pass
 
@@ -86,7 +86,9 @@ class Ise(synthesiser.Synthesiser):
         self.xflow = os.path.join(self.path, 'xflow')
 
     @synthesiser.throws_synthesis_exception
-    def makeProject(self, projectFilePath, fileFormat='mixed'):
+    def makeProject(
+        self, projectFilePath, fileFormat='mixed', library=None, entity=None
+    ):
         """
         Generate a Xilinx ISE project file listing source files with their
         filetypes and libraries.
@@ -101,11 +103,13 @@ class Ise(synthesiser.Synthesiser):
         library where the HDL is compiled and *source_file* specifies the path
         to the source file.
         This method generates an appropriate file from the project data that
-        has been loaded into the ISE Synthesiser instance.
+        has been loaded into the ISE Synthesiser instance. If the *library*
+        and *entity* of the top level are given the project synthesis fileset
+        may be pruned to the hierarchy of the top level.
         """
         log.info('Creating project file for ISE...')
         projectFileString = ''
-        fileSet = self.project.get_synthesis_fileset()
+        fileSet = self.project.get_synthesis_fileset(library, entity)
         for libName, fileList in fileSet.items():
             for fileObject in fileList:
                 # We could leave it to the synthesis tool to report missing
@@ -208,7 +212,7 @@ class Ise(synthesiser.Synthesiser):
             reportDirectory = os.path.join(synthesisDirectory, 'reports')
             # Add user constraints and other source files
             self.addConstraints(entity, synthesisDirectory)
-            self.makeProject(projectFilePath)
+            self.makeProject(projectFilePath, library=library, entity=entity)
             if self.mode == 'xflow':
                 try:
                     # Run the flow
@@ -79,7 +79,7 @@ class Quartus(synthesiser.Synthesiser):
                 fpga_part = self.project.get_fpga_part()
             self.makeProject(
                 projectFilePath,
-                self.project.get_synthesis_fileset(),
+                self.project.get_synthesis_fileset(library, entity),
                 self.project.get_constraints(),
                 fpga_part,
                 self.project.get_generics(),
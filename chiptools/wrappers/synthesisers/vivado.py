@@ -61,7 +61,7 @@ class Vivado(synthesiser.Synthesiser):
             # Vivado quick reference guide.
             ###################################################################
             # Step 1: Add source files (HDL, UCF, NGC, XCI)
-            self.add_sources()
+            self.add_sources(library, entity)
             self.add_constraints()
             # Step 2: Run synthesis, report utilisation and timing estimates,
             # write checkpoint.
@@ -184,8 +184,8 @@ class Vivado(synthesiser.Synthesiser):
             )
         )
 
-    def add_sources(self):
-        file_set = self.project.get_synthesis_fileset()
+    def add_sources(self, library=None, entity=None):
+        file_set = self.project.get_synthesis_fileset(library, entity)
         for libName, fileList in file_set.items():
             for file_object in fileList:
                 path = file_object.path.replace('\\', '/')
@@ -0,0 +1,138 @@
+"""
+Benchmark the VHDL parser on generated files of N entity, architecture,
+package and package body units (about 1.45 KB per unit).
+
+Run from the repository root:
+
+    python tests/benchmark_parsers.py [--baseline REV] [--repeat R] [N ...]
+
+The best of R runs of ParsedVhdlFile is reported for each N. If a git
+revision is given with --baseline the parser in chiptools/parsers/vhdl.py at
+that revision is timed on the same files, for example the revision before
+the single pass scanner was introduced. That parser grows quadratically
+with the file size, so keep N small when comparing with it. This script is
+not collected by the test runner.
+"""
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import timeit
+import types
+
+testroot = os.path.dirname(__file__) or '.'
+sys.path.insert(0, os.path.abspath(os.path.join(testroot, os.path.pardir)))
+
+from chiptools.common.filetypes import File
+from chiptools.parsers import vhdl
+
+UNIT = '''library ieee;
+use ieee.std_logic_1164.all;
+use ieee.numeric_std.all;
+use work.pkg_{i}.all;
+-- entity commented_{i} is
+entity ent_{i} is
+    generic (WIDTH : natural := 8);
+    port (
+        clk : in std_logic;  -- Clock; rising edge
+        d   : in std_logic_vector(WIDTH - 1 downto 0);
+        q   : out std_logic_vector(WIDTH - 1 downto 0)
+    );
+end entity ent_{i};
+architecture rtl of ent_{i} is
+    component sub_{i} is
+        port (a : in std_logic; b : out std_logic);
+    end component;
+    for all : sub_{i} use entity work.ent_{j}(rtl);
+    signal s : std_logic_vector(WIDTH - 1 downto 0);
+    constant MSG : string := "entity fake is -- not a comment";
+    function f(a : integer; b : integer) return integer is
+    begin
+        return a + b;
+    end function;
+begin
+    u_sub : sub_{i} port map (a => clk, b => open);
+    u_ent : entity work.ent_{j} generic map (WIDTH => WIDTH) port map (
+        clk => clk, d => d, q => s
+    );
+    process (clk)
+    begin
+        if rising_edge(clk) then
+            q <= s;  -- Register the output
+            assert s'length = WIDTH report "Width" severity note;
+        end if;
+    end process;
+end architecture rtl;
+package pkg_{i} is
+    type rec_t is record
+        a : integer;
+    end record;
+    function g(a : integer) return integer;
+end package pkg_{i};
+package body pkg_{i} is
+    function g(a : integer) return integer is
+    begin
+        return a;
+    end function;
+end package body;
+'''
+
+
+def load_baseline(revision):
+    """Return the vhdl parser module at the given git *revision*."""
+    source = subprocess.check_output(
+        ['git', 'show', '{0}:chiptools/parsers/vhdl.py'.format(revision)],
+        cwd=os.path.join(testroot, os.path.pardir),
+    )
+    module = types.ModuleType('vhdl_{0}'.format(revision))
+    exec(compile(source, module.__name__, 'exec'), module.__dict__)
+    return module
+
+
+def time_parser(module, path, repeat):
+    """Return the best time taken to parse the file at *path*."""
+    file_object = File(path=path, library='lib')
+    return min(
+        timeit.repeat(
+            lambda: module.ParsedVhdlFile(file_object), number=1, repeat=repeat
+        )
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('sizes', nargs='*', type=int, default=[100, 200])
+    parser.add_argument('--baseline', help='git revision to compare with')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    modules = [('current', vhdl)]
+    if args.baseline is not None:
+        modules.insert(0, (args.baseline, load_baseline(args.baseline)))
+    root = tempfile.mkdtemp()
+    try:
+        for size in args.sizes:
+            path = os.path.join(root, 'units_{0}.vhd'.format(size))
+            with open(path, 'w') as f:
+                f.write(
+                    ''.join(UNIT.format(i=i, j=i + 1) for i in range(size))
+                )
+            times = [
+                '{0}: {1:.3f}s'.format(
+                    name, time_parser(module, path, args.repeat)
+                )
+                for name, module in modules
+            ]
+            print(
+                'N={0} ({1} KB): {2}'.format(
+                    size, os.path.getsize(path) // 1024, ', '.join(times)
+                )
+            )
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    main()
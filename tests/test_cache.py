@@ -0,0 +1,623 @@
+"""
+The tests in this module check that the FileCache correctly detects file
+modifications. They do not require any vendor tools.
+"""
+
+import unittest
+import os
+import logging
+import sys
+import shutil
+import tempfile
+import hashlib
+import pickle
+import threading
+import time
+
+testroot = os.path.dirname(__file__) or '.'
+sys.path.insert(0, os.path.abspath(os.path.join(testroot, os.path.pardir)))
+
+from chiptools.core.artifacts import ArtifactCache
+from chiptools.core.cache import FileCache
+from chiptools.common import hashing
+from chiptools.common.filelock import FileLock
+from chiptools.common.filetypes import File
+from chiptools.parsers.callgraph import CallGraph
+from chiptools.parsers.vhdl import ParsedVhdlFile
+
+# Blackhole log messages from chiptools
+logging.config.dictConfig({'version': 1})
+
+
+class TestFileCache(unittest.TestCase):
+
+    tool_name = 'dummy'
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.path = os.path.join(self.root, 'file.vhd')
+        self.write('entity file is end entity;\n')
+        self.file_object = File(library='work', path=self.path)
+        self.cache = FileCache(os.path.join(self.root, '.chiptools'))
+        self.addCleanup(self.cache.delete)
+
+    def write(self, data):
+        with open(self.path, 'w') as f:
+            f.write(data)
+
+    def test_new_file_changed(self):
+        self.assertTrue(
+            self.cache.is_file_changed(self.file_object, self.tool_name)
+        )
+
+    def test_unchanged_file(self):
+        self.cache.add_file(self.file_object, self.tool_name)
+        self.assertFalse(
+            self.cache.is_file_changed(self.file_object, self.tool_name)
+        )
+
+    def test_modified_file(self):
+        self.cache.add_file(self.file_object, self.tool_name)
+        self.write('entity other is end entity;\n')
+        self.assertTrue(
+            self.cache.is_file_changed(self.file_object, self.tool_name)
+        )
+
+    def test_context_change(self):
+        """Files compiled in a different context are changed."""
+        self.cache.add_file(self.file_object, self.tool_name, context='a')
+        key = self.cache.get_file_key(self.file_object, self.tool_name)
+        self.assertFalse(
+            self.cache.is_file_changed(
+                self.file_object, self.tool_name, context='a'
+            )
+        )
+        self.assertTrue(
+            self.cache.is_file_changed(
+                self.file_object, self.tool_name, context='b'
+            )
+        )
+        self.cache.add_file(self.file_object, self.tool_name, context='b')
+        self.assertNotEqual(
+            key, self.cache.get_file_key(self.file_object, self.tool_name)
+        )
+
+    def test_tool_version(self):
+        """Tool versions are only probed when the executable changes."""
+        probes = []
+
+        def probe():
+            probes.append(1)
+            return 'version 1'
+
+        for _ in range(2):
+            self.assertEqual(
+                self.cache.get_tool_version(self.path, probe), 'version 1'
+            )
+        self.assertEqual(len(probes), 1)
+
+    def test_stat_fast_path(self):
+        """Files with an unchanged stat signature should not be opened."""
+        self.cache.add_file(self.file_object, self.tool_name)
+        digest = FileCache.get_digest
+        try:
+            FileCache.get_digest = staticmethod(
+                lambda path: self.fail('File was hashed')
+            )
+            self.assertFalse(
+                self.cache.is_file_changed(self.file_object, self.tool_name)
+            )
+        finally:
+            FileCache.get_digest = digest
+
+    def test_touched_file(self):
+        """A touched file with unchanged contents is not changed."""
+        self.cache.add_file(self.file_object, self.tool_name)
+        st = os.stat(self.path)
+        os.utime(self.path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+        self.assertFalse(
+            self.cache.is_file_changed(self.file_object, self.tool_name)
+        )
+
+    def test_verify(self):
+        """Content changes that preserve the stat signature are only found
+        when verification is enabled."""
+        self.cache.add_file(self.file_object, self.tool_name)
+        st = os.stat(self.path)
+        self.write('entity fill is end entity;\n')
+        os.utime(self.path, ns=(st.st_atime_ns, st.st_mtime_ns))
+        self.assertFalse(
+            self.cache.is_file_changed(self.file_object, self.tool_name)
+        )
+        self.assertTrue(
+            self.cache.is_file_changed(
+                self.file_object, self.tool_name, verify=True
+            )
+        )
+
+    def test_precompute_digests(self):
+        """Digests computed in a batch should be reused by is_file_changed
+        and add_file."""
+        self.cache.add_file(self.file_object, self.tool_name)
+        self.write('entity other is end entity;\n')
+        self.cache.precompute_digests([self.file_object], self.tool_name)
+        digest = FileCache.get_digest
+        try:
+            FileCache.get_digest = staticmethod(
+                lambda path: self.fail('File was hashed')
+            )
+            self.assertTrue(
+                self.cache.is_file_changed(self.file_object, self.tool_name)
+            )
+            self.cache.add_file(self.file_object, self.tool_name)
+        finally:
+            FileCache.get_digest = digest
+        self.assertFalse(
+            self.cache.is_file_changed(
+                self.file_object, self.tool_name, verify=True
+            )
+        )
+        # Files are hashed once when they are both parsed and compiled
+        hashed = []
+        file_digests = hashing.file_digests
+
+        def record(paths, algorithm):
+            paths = list(paths)
+            hashed.extend(paths)
+            return file_digests(paths, algorithm)
+
+        try:
+            hashing.file_digests = record
+            FileCache.get_digest = staticmethod(
+                lambda path: self.fail('File was hashed')
+            )
+            for parse_first in [True, False]:
+                self.write('entity other_{0} is end;\n'.format(parse_first))
+                if parse_first:
+                    self.cache.get_source_digests([self.path])
+                self.cache.precompute_digests(
+                    [self.file_object], self.tool_name
+                )
+                self.cache.get_source_digests([self.path])
+                self.assertTrue(
+                    self.cache.is_file_changed(
+                        self.file_object, self.tool_name
+                    )
+                )
+                self.cache.add_file(self.file_object, self.tool_name)
+        finally:
+            hashing.file_digests = file_digests
+            FileCache.get_digest = digest
+        self.assertEqual(hashed, [self.path, self.path])
+
+    def test_algorithm_change(self):
+        """Digests from different algorithms never compare equal."""
+        self.cache.add_file(self.file_object, self.tool_name)
+        self.cache.save_cache()
+        cache = FileCache(
+            os.path.join(self.root, '.chiptools'), algorithm='md5'
+        )
+        self.assertTrue(
+            cache.is_file_changed(
+                self.file_object, self.tool_name, verify=True
+            )
+        )
+
+    def test_persistence(self):
+        self.cache.add_file(self.file_object, self.tool_name)
+        self.cache.add_library('work', self.tool_name)
+        self.cache.save_cache()
+        cache = FileCache(os.path.join(self.root, '.chiptools'))
+        self.assertFalse(
+            cache.is_file_changed(self.file_object, self.tool_name)
+        )
+        self.assertTrue(cache.library_in_cache('work', self.tool_name))
+
+    def test_incremental_updates(self):
+        """Updates are persisted without an explicit save."""
+        self.cache.add_file(self.file_object, self.tool_name)
+        cache = FileCache(os.path.join(self.root, '.chiptools'))
+        self.assertFalse(
+            cache.is_file_changed(self.file_object, self.tool_name)
+        )
+        self.assertEqual(cache.get_tool_names(), [self.tool_name])
+
+    def test_shared_cache(self):
+        """Updates made through another FileCache instance are merged and
+        become visible after a refresh."""
+        other = FileCache(os.path.join(self.root, '.chiptools'))
+        self.addCleanup(other._close)
+        self.cache.add_library('work', self.tool_name)
+        other.add_file(self.file_object, self.tool_name)
+        self.cache.refresh_file(self.file_object, self.tool_name)
+        self.assertFalse(
+            self.cache.is_file_changed(self.file_object, self.tool_name)
+        )
+        other.refresh()
+        self.assertTrue(other.library_in_cache('work', self.tool_name))
+
+    def test_corrupted_cache(self):
+        """An unreadable cache file is replaced with an empty cache."""
+        self.cache.delete()
+        with open(self.cache.cache_path, 'wb') as f:
+            pickle.dump({self.tool_name: {}}, f)
+        cache = FileCache(os.path.join(self.root, '.chiptools'))
+        self.assertEqual(cache.get_tool_names(), [])
+        cache.add_file(self.file_object, self.tool_name)
+        self.assertFalse(
+            cache.is_file_changed(self.file_object, self.tool_name)
+        )
+
+    def test_initialise(self):
+        self.cache.add_file(self.file_object, self.tool_name)
+        self.cache.add_library('work', self.tool_name)
+        self.cache.initialise_cache()
+        self.assertEqual(self.cache.get_tool_names(), [])
+        self.assertTrue(
+            self.cache.is_file_changed(self.file_object, self.tool_name)
+        )
+
+    def test_remove_file(self):
+        self.cache.add_file(self.file_object, self.tool_name)
+        self.cache.remove_file(self.file_object, self.tool_name)
+        self.assertTrue(
+            self.cache.is_file_changed(self.file_object, self.tool_name)
+        )
+
+    def test_stale_file(self):
+        self.cache.add_file(self.file_object, self.tool_name)
+        self.cache.set_manifest(self.tool_name, '', 'root')
+        self.cache.mark_file_stale(self.file_object, self.tool_name)
+        self.assertIsNone(self.cache.get_manifest(self.tool_name, ''))
+        self.assertEqual(
+            self.cache.get_stale_paths(self.tool_name), set([self.path])
+        )
+        self.assertEqual(self.cache.get_stale_paths('other'), set())
+        self.cache.add_file(self.file_object, self.tool_name)
+        self.assertEqual(self.cache.get_stale_paths(self.tool_name), set())
+        self.cache.mark_file_stale(self.file_object, self.tool_name)
+        self.cache.remove_file(self.file_object, self.tool_name)
+        self.assertEqual(self.cache.get_stale_paths(self.tool_name), set())
+
+    def test_delete(self):
+        """The cache and its lock file are only deleted while the lock is
+        held."""
+        path = self.cache.cache_path
+        thread = threading.Thread(target=self.cache.delete)
+        with FileLock(path + '.lock'):
+            thread.start()
+            time.sleep(2 * FileLock.poll_interval)
+            self.assertTrue(thread.is_alive())
+            self.assertTrue(os.path.exists(path))
+            self.assertTrue(os.path.exists(path + '.lock'))
+        thread.join()
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(os.path.exists(path + '.lock'))
+
+
+class TestFileLock(unittest.TestCase):
+
+    def test_exclusive(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        path = os.path.join(root, 'test.lock')
+        with FileLock(path) as lock:
+            self.assertTrue(lock.locked)
+            with self.assertRaises(TimeoutError):
+                FileLock(path, timeout=0.1).acquire()
+        with FileLock(path, timeout=0.1) as lock:
+            self.assertTrue(lock.locked)
+        self.assertFalse(lock.locked)
+
+    def test_unlink(self):
+        """A process waiting for a lock whose file is deleted locks a new
+        file at the same path."""
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        path = os.path.join(root, 'test.lock')
+        waiter = FileLock(path)
+        acquired = threading.Event()
+
+        def wait():
+            with waiter:
+                acquired.set()
+                with self.assertRaises(TimeoutError):
+                    FileLock(path, timeout=0.1).acquire()
+
+        with FileLock(path) as lock:
+            thread = threading.Thread(target=wait)
+            thread.start()
+            time.sleep(2 * FileLock.poll_interval)
+            lock.unlink()
+            self.assertFalse(os.path.exists(path))
+        thread.join()
+        self.assertTrue(acquired.is_set())
+        self.assertTrue(os.path.exists(path))
+
+
+class TestArtifactCache(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.cache = ArtifactCache(os.path.join(self.root, 'artifacts'))
+        self.builds = []
+
+    def build(self, path):
+        self.builds.append(path)
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, 'image'), 'w') as f:
+            f.write('image')
+
+    def test_reuse(self):
+        """Artifacts are only built once for each key."""
+        key = ArtifactCache.get_key('lib', 'top')
+        self.assertIsNone(self.cache.lookup(key))
+        path = self.cache.get(key, self.build)
+        self.assertTrue(os.path.isfile(os.path.join(path, 'image')))
+        self.assertEqual(self.cache.get(key, self.build), path)
+        self.assertEqual(self.cache.lookup(key), path)
+        self.assertEqual(len(self.builds), 1)
+        # Artifacts that fail validation are built again
+        self.assertEqual(
+            self.cache.get(key, self.build, validate=lambda path: False), path
+        )
+        self.assertEqual(len(self.builds), 2)
+        self.assertEqual(
+            self.cache.get(key, self.build, validate=lambda path: True), path
+        )
+        self.assertEqual(len(self.builds), 2)
+
+    def test_failed_build(self):
+        """Nothing is stored if the build fails."""
+        key = ArtifactCache.get_key('lib', 'top')
+
+        def build(path):
+            self.build(path)
+            raise RuntimeError('Build failed')
+
+        with self.assertRaises(RuntimeError):
+            self.cache.get(key, build)
+        self.assertIsNone(self.cache.lookup(key))
+        self.assertFalse(os.path.exists(self.builds[0]))
+
+    def test_eviction(self):
+        """The least recently used artifacts are evicted."""
+        self.cache.max_entries = 2
+        paths = [self.cache.get(key, self.build) for key in 'abc']
+        self.assertEqual(
+            [key for last_used, key in self.cache.get_entries()], ['b', 'c']
+        )
+        self.assertFalse(os.path.exists(paths[0]))
+        # Reusing an artifact makes it the most recently used
+        os.utime(paths[2], (0, 0))
+        self.cache.lookup('c')
+        self.cache.get('d', self.build)
+        self.assertEqual(
+            sorted(key for last_used, key in self.cache.get_entries()),
+            ['c', 'd'],
+        )
+
+    def test_age_and_size_limits(self):
+        """Artifacts unused for too long or exceeding the size limit are
+        evicted."""
+        for key in 'abc':
+            self.cache.get(key, self.build)
+        os.utime(self.cache.get_path('a'), (0, 0))
+        self.cache.max_age = 3600
+        self.cache.max_size = len('image') * 2
+        self.cache.get('d', self.build)
+        self.assertEqual(
+            [key for last_used, key in self.cache.get_entries()], ['c', 'd']
+        )
+        # Artifacts evicted for their age count towards the entry limit
+        self.cache.max_size = None
+        for key in 'efghijkl':
+            self.cache.get(key, self.build)
+        self.cache.max_entries = 8
+        for key in 'cd':
+            os.utime(self.cache.get_path(key), (0, 0))
+        self.cache.get('m', self.build)
+        self.assertEqual(
+            sorted(key for last_used, key in self.cache.get_entries()),
+            list('fghijklm'),
+        )
+        # Evicted artifacts do not leave their lock files behind
+        self.assertEqual(
+            sorted(
+                name
+                for name in os.listdir(self.cache.root)
+                if name.endswith('.lock')
+            ),
+            [key + '.lock' for key in 'fghijklm'],
+        )
+
+    def test_in_place(self):
+        """In place artifacts are built at their final path with a prefix,
+        interrupted builds are not used."""
+        cache = ArtifactCache(self.cache.root, prefix='snapshot_')
+        path = cache.get('a', self.build, in_place=True)
+        self.assertEqual(os.path.basename(path), 'snapshot_a')
+        self.assertEqual(self.builds, [path])
+        self.assertEqual(cache.get('a', self.build, in_place=True), path)
+        self.assertEqual(len(self.builds), 1)
+        os.remove(cache.get_marker('a'))
+        self.assertIsNone(cache.lookup('a'))
+        self.assertEqual(cache.get_entries(), [])
+        self.assertEqual(cache.get('a', self.build, in_place=True), path)
+        self.assertEqual(len(self.builds), 2)
+
+    def test_shared_directory(self):
+        """Directories that share the cache directory and prefix but were
+        not stored by the cache are never used or evicted."""
+        cache = ArtifactCache(self.cache.root, prefix='lib_', max_entries=1)
+        os.makedirs(cache.get_path('user'))
+        self.assertIsNone(cache.lookup('user'))
+        cache.get('a', self.build, in_place=True)
+        cache.get('b', self.build, in_place=True)
+        cache.remove('user')
+        self.assertEqual(
+            [key for last_used, key in cache.get_entries()], ['b']
+        )
+        self.assertTrue(os.path.isdir(cache.get_path('user')))
+        self.assertFalse(os.path.exists(cache.get_path('a')))
+
+
+class TestHashing(unittest.TestCase):
+
+    def test_chunked_digest(self):
+        """Files larger than a chunk must hash to the same digest as a
+        whole-file digest."""
+        data = os.urandom(hashing.CHUNK_SIZE * 2 + 123)
+        with tempfile.NamedTemporaryFile(delete=False) as f:
+            f.write(data)
+        self.addCleanup(os.remove, f.name)
+        self.assertEqual(
+            hashing.file_digest(f.name, 'blake2b'),
+            hashlib.blake2b(data).hexdigest(),
+        )
+        self.assertEqual(
+            hashing.file_digests([f.name, f.name + '.missing'], 'md5'),
+            {f.name: hashlib.md5(data).hexdigest()},
+        )
+
+
+class RecordingFileCache(FileCache):
+    """A FileCache that records the parse summaries stored in it."""
+
+    def __init__(self, *args, **kwargs):
+        self.stored = []
+        super(RecordingFileCache, self).__init__(*args, **kwargs)
+
+    def set_parse_summaries(self, summaries, version, paths=None):
+        summaries = list(summaries)
+        self.stored.append(sorted(digest for digest, _, _ in summaries))
+        super(RecordingFileCache, self).set_parse_summaries(
+            summaries, version, paths
+        )
+
+
+class TestParseCache(unittest.TestCase):
+
+    files = [
+        ('pkg.vhd', 'package pkg is end package;\n'),
+        (
+            'top.vhd',
+            'use work.pkg.all;\nentity top is end entity;\n'
+            + 'architecture rtl of top is begin\n'
+            + '    u0 : entity work.leaf port map (a => open);\n'
+            + 'end rtl;\n',
+        ),
+        ('leaf.vhd', 'entity leaf is port (a : in bit); end entity;\n'),
+    ]
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.file_objects = []
+        for name, data in self.files:
+            path = os.path.join(self.root, name)
+            with open(path, 'w') as f:
+                f.write(data)
+            self.file_objects.append(File(library='lib', path=path))
+        self.cache = self.get_cache()
+
+    def get_cache(self):
+        cache = RecordingFileCache(os.path.join(self.root, '.chiptools'))
+        self.addCleanup(cache.delete)
+        return cache
+
+    def get_units(self, parsed_files):
+        return [
+            (
+                parsed_file.interface_digest,
+                sorted(parsed_file.libraries),
+                sorted(repr(unit) for unit in parsed_file.definitions),
+                sorted(
+                    repr((unit, unit.library))
+                    for unit in parsed_file.references
+                ),
+            )
+            for parsed_file in parsed_files
+        ]
+
+    def test_reuse(self):
+        """Files are only parsed again when their contents change."""
+        expected = self.get_units(
+            CallGraph.get_parsed_files(self.file_objects)
+        )
+        parsed_files = CallGraph.get_parsed_files(
+            self.file_objects, self.cache
+        )
+        self.assertEqual(self.get_units(parsed_files), expected)
+        self.assertEqual(len(self.cache.stored), 1)
+        self.assertEqual(len(self.cache.stored[0]), len(self.files))
+        # Summaries are persisted across cache instances
+        cache = self.get_cache()
+        parsed_files = CallGraph.get_parsed_files(self.file_objects, cache)
+        self.assertEqual(self.get_units(parsed_files), expected)
+        self.assertEqual(cache.stored, [])
+        # Only the modified file is parsed
+        with open(self.file_objects[2].path, 'a') as f:
+            f.write('entity other is end entity;\n')
+        parsed_files = CallGraph.get_parsed_files(self.file_objects, cache)
+        self.assertEqual(len(cache.stored), 1)
+        self.assertEqual(len(cache.stored[0]), 1)
+        self.assertEqual(
+            self.get_units(parsed_files),
+            self.get_units(CallGraph.get_parsed_files(self.file_objects)),
+        )
+        # Stale summaries are discarded
+        self.assertEqual(
+            len(cache.get_parse_summaries(ParsedVhdlFile.summary_version)),
+            len(self.files),
+        )
+
+    def test_library(self):
+        """Summaries are recorded for each library a file is parsed in."""
+        CallGraph.get_parsed_files(self.file_objects, self.cache)
+        moved = [
+            File(library='other', path=file_object.path)
+            for file_object in self.file_objects
+        ]
+        parsed_files = CallGraph.get_parsed_files(moved, self.cache)
+        self.assertEqual(len(self.cache.stored), 2)
+        self.assertEqual(
+            self.get_units(parsed_files),
+            self.get_units(CallGraph.get_parsed_files(moved)),
+        )
+
+    def test_removed_files(self):
+        """The records of files removed from the project are discarded when
+        new summaries are saved."""
+        CallGraph.get_parsed_files(self.file_objects, self.cache)
+        with open(self.file_objects[0].path, 'a') as f:
+            f.write('-- Modified\n')
+        CallGraph.get_parsed_files(self.file_objects[:2], self.cache)
+        self.assertEqual(
+            sorted(
+                row[0]
+                for row in self.cache.connection.execute(
+                    'SELECT path FROM sources'
+                )
+            ),
+            sorted(f.path for f in self.file_objects[:2]),
+        )
+        self.assertEqual(
+            len(
+                self.cache.get_parse_summaries(
+                    ParsedVhdlFile.summary_version
+                )
+            ),
+            2,
+        )
+        # The removed file is parsed again if it is added back
+        CallGraph.get_parsed_files(self.file_objects, self.cache)
+        self.assertEqual(
+            self.cache.stored[-1],
+            [self.cache.get_digest(self.file_objects[2].path)],
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
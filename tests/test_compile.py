@@ -0,0 +1,836 @@
+"""
+The tests in this module check that the Simulator base class compiles the
+minimal set of project files in dependency order. A dummy simulator is used so
+these tests do not require any vendor tools.
+"""
+
+import unittest
+import os
+import logging
+import sys
+import shutil
+import tempfile
+
+testroot = os.path.dirname(__file__) or '.'
+sys.path.insert(0, os.path.abspath(os.path.join(testroot, os.path.pardir)))
+
+from chiptools.common import graph
+from chiptools.common.exceptions import ExecutionError
+from chiptools.core.cache import FileCache
+from chiptools.core.project import Project
+from chiptools.wrappers.simulator import Simulator
+from chiptools.wrappers.simulators.ghdl import Ghdl
+from chiptools.wrappers.simulators.isim import Isim
+from chiptools.wrappers.simulators.iverilog import Iverilog
+from chiptools.wrappers.simulators.modelsim import Modelsim
+from chiptools.wrappers.simulators.vivado import Vivado
+
+# Blackhole log messages from chiptools
+logging.config.dictConfig({'version': 1})
+
+
+class DummySimulator(Simulator):
+    """Simulator that records the files it is asked to compile."""
+
+    name = 'dummy'
+    executables = []
+    parallel_compile = True
+
+    def __init__(self, project):
+        super(DummySimulator, self).__init__(project, [], {})
+        self.path = 'dummy'
+        self.compiled = []
+        self.failures = []
+        # If True, compile errors name the path of the failing file
+        self.named_failures = True
+        self.batches = []
+        self.session = False
+        self.sessions = []
+
+    def compile(self, file_object, cwd=None):
+        name = os.path.basename(file_object.path)
+        if name in self.failures:
+            if self.named_failures:
+                raise ExecutionError(file_object.path + ':1:1: error')
+            raise ExecutionError('Failed to compile ' + name)
+        self.compiled.append(name)
+
+    def compile_batch(self, library, file_objects, cwd=None):
+        self.batches.append(len(file_objects))
+        super(DummySimulator, self).compile_batch(
+            library, file_objects, cwd=cwd
+        )
+
+    def use_compile_session(self):
+        return self.session
+
+    def compile_session(self, libraries, file_objects, cwd=None):
+        self.sessions.append(len(file_objects))
+        for library in libraries:
+            self.add_library(library)
+        compiled = []
+        for file_object in file_objects:
+            try:
+                self.compile(file_object, cwd=cwd)
+            except ExecutionError:
+                break
+            compiled.append(file_object)
+        return compiled
+
+    def add_library(self, library):
+        os.makedirs(
+            os.path.join(self.project.get_simulation_directory(), library),
+            exist_ok=True,
+        )
+
+    def set_working_library(self, library, cwd=None):
+        pass
+
+
+class ProjectTestCase(unittest.TestCase):
+    """Project of VHDL files compiled into the 'lib' library."""
+
+    files = [
+        (
+            'top.vhd',
+            'entity top is end entity;\n'
+            + 'architecture rtl of top is\n'
+            + '    component mid end component;\n'
+            + 'begin\n'
+            + '    u0 : mid port map ();\n'
+            + 'end rtl;\n',
+        ),
+        (
+            'mid.vhd',
+            'entity mid is end entity;\n'
+            + 'architecture rtl of mid is begin\n'
+            + '    u0 : entity work.leaf port map (a => open);\n'
+            + 'end rtl;\n',
+        ),
+        (
+            'leaf.vhd',
+            'library work;\nuse work.pkg.all;\n'
+            + 'entity leaf is port (a : in bit); end entity;\n'
+            + 'architecture rtl of leaf is begin end rtl;\n',
+        ),
+        ('pkg.vhd', 'package pkg is end package;\n'),
+        (
+            'other.vhd',
+            'entity other is end entity;\n'
+            + 'architecture rtl of other is begin end rtl;\n',
+        ),
+    ]
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        os.mkdir(os.path.join(self.root, 'sim'))
+        for name, data in self.files:
+            self.write(name, data)
+
+    def write(self, name, data):
+        with open(os.path.join(self.root, name), 'a') as f:
+            f.write(data)
+
+    def get_project(self):
+        project = Project(root=self.root)
+        project.set_cache_path(os.path.join(self.root, 'project'))
+        self.addCleanup(project.cache.delete)
+        project.add_config(
+            'simulation_directory', os.path.join(self.root, 'sim')
+        )
+        for name, data in self.files:
+            project.add_file(os.path.join(self.root, name), library='lib')
+        return project
+
+    def get_simulator(self, version='dummy'):
+        simulator = DummySimulator(self.get_project())
+        simulator.path = version
+        return simulator
+
+    def compile(
+        self,
+        jobs=1,
+        failures=[],
+        batch_size=1,
+        session=False,
+        tops=None,
+        named_failures=True,
+    ):
+        simulator = self.get_simulator()
+        simulator.failures = failures
+        simulator.named_failures = named_failures
+        simulator.compile_batch_size = batch_size
+        simulator.session = session
+        self.batches = simulator.batches
+        self.sessions = simulator.sessions
+        simulator.compile_project(jobs=jobs, tops=tops)
+        return simulator.compiled
+
+    def plan(self, version='dummy'):
+        simulator = self.get_simulator(version)
+        plan = simulator.plan_compile()
+        self.assertEqual(simulator.compiled, [])
+        return [(os.path.basename(f.path), reason) for f, reason in plan]
+
+
+class TestIncrementalCompile(ProjectTestCase):
+
+    def test_dependency_order(self):
+        """Files are compiled after the files they depend on."""
+        self.assertEqual(
+            self.compile(),
+            ['pkg.vhd', 'leaf.vhd', 'mid.vhd', 'top.vhd', 'other.vhd'],
+        )
+        self.assertEqual(self.compile(), [])
+
+    def test_dependents_recompiled(self):
+        """Files that depend on a modified interface are recompiled."""
+        self.compile()
+        self.write('leaf.vhd', 'entity leaf2 is end entity;\n')
+        self.assertEqual(self.compile(), ['leaf.vhd', 'mid.vhd', 'top.vhd'])
+        self.write('pkg.vhd', 'package pkg2 is end package;\n')
+        self.assertEqual(
+            self.compile(), ['pkg.vhd', 'leaf.vhd', 'mid.vhd', 'top.vhd']
+        )
+        self.write('other.vhd', 'entity other2 is end entity;\n')
+        self.assertEqual(self.compile(), ['other.vhd'])
+
+    def test_body_change(self):
+        """Dependents are not recompiled if only comments, whitespace or
+        architectures changed, unless the simulator invalidates every
+        dependent of a recompiled primary unit."""
+        self.compile()
+        self.write('leaf.vhd', '-- Modified\n')
+        self.assertEqual(self.compile(), ['leaf.vhd'])
+        self.write(
+            'leaf.vhd', 'architecture alt of leaf is begin end alt;\n'
+        )
+        self.assertEqual(self.compile(), ['leaf.vhd'])
+        self.write('pkg.vhd', '\n\n')
+        self.assertEqual(self.compile(), ['pkg.vhd'])
+        self.addCleanup(delattr, DummySimulator, 'interface_invalidation')
+        DummySimulator.interface_invalidation = False
+        self.write('pkg.vhd', '-- Modified\n')
+        self.assertEqual(
+            self.compile(), ['pkg.vhd', 'leaf.vhd', 'mid.vhd', 'top.vhd']
+        )
+        self.write('mid.vhd', 'architecture alt of mid is begin end alt;\n')
+        self.assertEqual(self.compile(), ['mid.vhd', 'top.vhd'])
+
+    def test_design_units(self):
+        """Package bodies and architectures depend on their declarations,
+        changes to them do not affect other design units."""
+        self.files = [
+            ('user.vhd', 'use work.types.all;\nentity user is end entity;\n'),
+            ('types_body.vhd', 'package body types is end package body;\n'),
+            ('rtl.vhd', 'architecture rtl of user is begin end rtl;\n'),
+            ('types.vhd', 'package types is end package;\n'),
+        ]
+        for name, data in self.files:
+            self.write(name, data)
+        self.assertEqual(
+            self.compile(),
+            ['types.vhd', 'user.vhd', 'types_body.vhd', 'rtl.vhd'],
+        )
+        self.write('types_body.vhd', 'package body types is end;\n')
+        self.assertEqual(self.compile(), ['types_body.vhd'])
+        self.write('rtl.vhd', 'architecture alt of user is begin end;\n')
+        self.assertEqual(self.compile(), ['rtl.vhd'])
+        self.write('types.vhd', 'package types2 is end package;\n')
+        self.assertEqual(
+            self.compile(),
+            ['types.vhd', 'user.vhd', 'types_body.vhd', 'rtl.vhd'],
+        )
+
+    def test_manifest(self):
+        """Files are not checked individually if the project is unchanged."""
+        self.compile()
+        is_file_changed = FileCache.is_file_changed
+        try:
+            FileCache.is_file_changed = lambda *args, **kwargs: self.fail(
+                'File was checked'
+            )
+            self.assertEqual(self.compile(), [])
+        finally:
+            FileCache.is_file_changed = is_file_changed
+        self.write('other.vhd', '-- Modified\n')
+        self.assertEqual(self.compile(), ['other.vhd'])
+        self.assertEqual(self.compile(), [])
+
+    def test_plan(self):
+        """The plan explains why each file would be compiled."""
+        self.assertEqual(
+            self.plan(),
+            [
+                ('pkg.vhd', 'library missing'),
+                ('leaf.vhd', 'library missing'),
+                ('mid.vhd', 'library missing'),
+                ('top.vhd', 'library missing'),
+                ('other.vhd', 'library missing'),
+            ],
+        )
+        self.compile()
+        self.assertEqual(self.plan(), [])
+        self.write('pkg.vhd', 'package pkg2 is end package;\n')
+        self.write('other.vhd', '-- Modified\n')
+        self.assertEqual(
+            self.plan(),
+            [
+                ('pkg.vhd', 'content changed'),
+                ('leaf.vhd', 'dependency changed'),
+                ('mid.vhd', 'dependency changed'),
+                ('top.vhd', 'dependency changed'),
+                ('other.vhd', 'content changed'),
+            ],
+        )
+        self.assertEqual(
+            [reason for name, reason in self.plan(version='other')],
+            ['args changed'] * len(self.files),
+        )
+        self.compile()
+        self.files = self.files + [('new.vhd', 'entity new is end;\n')]
+        self.write('new.vhd', 'entity new is end;\n')
+        self.assertEqual(self.plan(), [('new.vhd', 'new file')])
+
+    def test_parallel(self):
+        """Parallel compilation respects the dependency order."""
+        compiled = self.compile(jobs=4)
+        self.assertEqual(sorted(compiled), sorted(f for f, d in self.files))
+        for dependency, name in [
+            ('pkg.vhd', 'leaf.vhd'),
+            ('leaf.vhd', 'mid.vhd'),
+            ('mid.vhd', 'top.vhd'),
+        ]:
+            self.assertLess(compiled.index(dependency), compiled.index(name))
+        self.assertEqual(self.compile(jobs=4), [])
+
+    def test_failure(self):
+        """Files that fail to compile are recompiled next time."""
+        with self.assertRaises(ExecutionError):
+            self.compile(jobs=4, failures=['leaf.vhd'])
+        self.assertEqual(
+            self.plan(),
+            [
+                ('leaf.vhd', 'new file'),
+                ('mid.vhd', 'new file'),
+                ('top.vhd', 'new file'),
+            ],
+        )
+        self.assertEqual(self.compile(), ['leaf.vhd', 'mid.vhd', 'top.vhd'])
+
+    def test_failure_dependents(self):
+        """Files planned after a failure because a dependency changed are
+        recompiled next time."""
+        self.files = self.files + [
+            ('user.vhd', 'use work.pkg.all;\nentity user is end entity;\n')
+        ]
+        self.write('user.vhd', self.files[-1][1])
+        self.compile()
+        self.write('pkg.vhd', 'package pkg_b is end package;\n')
+        with self.assertRaises(ExecutionError):
+            self.compile(failures=['leaf.vhd'])
+        self.assertEqual(
+            self.plan(),
+            [
+                ('leaf.vhd', 'new file'),
+                ('mid.vhd', 'dependency changed'),
+                ('top.vhd', 'dependency changed'),
+                ('user.vhd', 'dependency changed'),
+            ],
+        )
+        self.assertEqual(
+            self.compile(), ['leaf.vhd', 'mid.vhd', 'top.vhd', 'user.vhd']
+        )
+        self.assertEqual(self.compile(), [])
+
+    def test_batch(self):
+        """Files in the same library are compiled in batches, only the files
+        that precede the failing file of a failed batch are compiled again.
+        Failing batches are compiled one file at a time if the failing file
+        is not named by the tool."""
+        self.assertEqual(
+            self.compile(batch_size=3),
+            ['pkg.vhd', 'leaf.vhd', 'mid.vhd', 'top.vhd', 'other.vhd'],
+        )
+        self.assertEqual(self.batches, [3, 2])
+        self.write('pkg.vhd', 'package pkg2 is end package;\n')
+        with self.assertRaises(ExecutionError):
+            self.compile(batch_size=64, failures=['mid.vhd'])
+        self.assertEqual(self.batches, [4, 2])
+        self.assertEqual(
+            [name for name, reason in self.plan()], ['mid.vhd', 'top.vhd']
+        )
+        self.write('pkg.vhd', 'package pkg3 is end package;\n')
+        self.addCleanup(delattr, DummySimulator, 'batch_keeps_progress')
+        DummySimulator.batch_keeps_progress = True
+        with self.assertRaises(ExecutionError):
+            self.compile(batch_size=64, failures=['mid.vhd'])
+        self.assertEqual(self.batches, [4])
+        self.assertEqual(
+            [name for name, reason in self.plan()], ['mid.vhd', 'top.vhd']
+        )
+        self.write('pkg.vhd', 'package pkg4 is end package;\n')
+        with self.assertRaises(ExecutionError):
+            self.compile(
+                batch_size=64, failures=['mid.vhd'], named_failures=False
+            )
+        self.assertEqual(self.batches, [4, 1, 1, 1])
+        self.assertEqual(
+            [name for name, reason in self.plan()], ['mid.vhd', 'top.vhd']
+        )
+
+    def test_session(self):
+        """The whole plan is compiled in a single session, files that
+        compiled before a failure are recorded."""
+        self.assertEqual(
+            self.compile(session=True),
+            ['pkg.vhd', 'leaf.vhd', 'mid.vhd', 'top.vhd', 'other.vhd'],
+        )
+        self.assertEqual(self.sessions, [5])
+        self.assertEqual(self.batches, [])
+        self.assertEqual(self.compile(session=True), [])
+        self.write('pkg.vhd', 'package pkg2 is end package;\n')
+        with self.assertRaises(ExecutionError):
+            self.compile(session=True, failures=['mid.vhd'])
+        self.assertEqual(
+            [name for name, reason in self.plan()], ['mid.vhd', 'top.vhd']
+        )
+        shutil.rmtree(os.path.join(self.root, 'sim', 'lib'))
+        self.assertEqual(len(self.compile(session=True)), len(self.files))
+
+    def test_design_digest(self):
+        """The design digest only changes when a unit in the hierarchy of
+        the top level is recompiled."""
+        self.files = self.files + [
+            ('mid_rtl.vhd', 'architecture alt of mid is begin end alt;\n')
+        ]
+        self.write('mid_rtl.vhd', self.files[-1][1])
+        self.compile()
+        simulator = self.get_simulator()
+        self.assertEqual(
+            [
+                os.path.basename(f.path)
+                for f in simulator.get_design_files('lib', 'MID')
+            ],
+            ['mid.vhd', 'leaf.vhd', 'pkg.vhd', 'mid_rtl.vhd'],
+        )
+        self.assertIsNone(simulator.get_design_files('lib', 'missing'))
+        digest = simulator.get_design_digest('lib', 'mid')
+        self.assertNotEqual(
+            digest, simulator.get_design_digest('lib', 'mid', ['-O2'])
+        )
+        self.write('other.vhd', '-- Modified\n')
+        self.compile()
+        self.assertEqual(
+            self.get_simulator().get_design_digest('lib', 'mid'), digest
+        )
+        self.write('mid_rtl.vhd', '-- Modified\n')
+        self.compile()
+        self.assertNotEqual(
+            self.get_simulator().get_design_digest('lib', 'mid'), digest
+        )
+
+    def test_hierarchy(self):
+        """Only the hierarchy of the top levels is compiled, unresolved
+        hierarchies compile every file."""
+        self.assertEqual(
+            self.compile(tops=[('lib', 'mid')]),
+            ['pkg.vhd', 'leaf.vhd', 'mid.vhd'],
+        )
+        self.assertEqual(self.compile(tops=[('lib', 'mid')]), [])
+        self.assertEqual(
+            self.compile(tops=[('lib', 'mid'), ('lib', 'other')]),
+            ['other.vhd'],
+        )
+        self.assertEqual(self.compile(), ['top.vhd'])
+        self.write('leaf.vhd', 'entity leaf2 is end entity;\n')
+        self.write('other.vhd', '-- Modified\n')
+        self.assertEqual(
+            self.compile(tops=[('lib', 'missing')]),
+            ['leaf.vhd', 'mid.vhd', 'top.vhd', 'other.vhd'],
+        )
+        self.write('mid.vhd', 'use work.missing.all;\n')
+        self.write('other.vhd', '-- Modified again\n')
+        self.assertEqual(
+            self.compile(tops=[('lib', 'mid')]), ['mid.vhd', 'other.vhd']
+        )
+
+    def test_hierarchy_dependents(self):
+        """Files outside the hierarchy that depend on a file whose interface
+        changed are compiled by the next compilation that includes them."""
+        self.compile()
+        with open(os.path.join(self.root, 'leaf.vhd'), 'w') as f:
+            f.write(
+                'entity leaf is port (a, b : in bit); end entity;\n'
+                + 'architecture rtl of leaf is begin end rtl;\n'
+            )
+        self.assertEqual(
+            self.compile(tops=[('lib', 'mid')]), ['leaf.vhd', 'mid.vhd']
+        )
+        self.assertEqual(self.compile(tops=[('lib', 'mid')]), [])
+        self.assertEqual(self.plan(), [('top.vhd', 'dependency changed')])
+        self.assertEqual(self.compile(), ['top.vhd'])
+        self.assertEqual(self.compile(), [])
+        # Dependents are not affected if the interface is unchanged
+        self.write('leaf.vhd', '-- Modified\n')
+        self.assertEqual(self.compile(tops=[('lib', 'mid')]), ['leaf.vhd'])
+        self.assertEqual(self.compile(), [])
+
+    def test_missing_library(self):
+        """All files are recompiled if the library was deleted."""
+        self.compile()
+        shutil.rmtree(os.path.join(self.root, 'sim', 'lib'))
+        self.assertEqual(len(self.compile()), len(self.files))
+
+    def test_cyclic_dependencies(self):
+        with self.assertRaises(ValueError):
+            graph.stable_sort({'a': {'b'}, 'b': {'a'}}, 'ab')
+
+
+class DummyModelsim(Modelsim):
+    """Modelsim wrapper that keeps a single optimised design."""
+
+    artifact_cache_size = 1
+
+
+class DummyIsim(Isim):
+    """ISim wrapper that keeps a single simulation executable."""
+
+    artifact_cache_size = 1
+
+
+class DummyVivado(Vivado):
+    """Vivado wrapper that keeps a single elaborated snapshot."""
+
+    artifact_cache_size = 1
+
+
+@unittest.skipIf(sys.platform == 'win32', 'Dummy tools are shell scripts')
+class TestToolArtifacts(ProjectTestCase):
+    """The vendor tools are replaced by scripts that log their arguments."""
+
+    def setUp(self):
+        super(TestToolArtifacts, self).setUp()
+        self.bin = os.path.join(self.root, 'bin')
+        os.mkdir(self.bin)
+
+    def add_tool(self, name, script=''):
+        path = os.path.join(self.bin, name)
+        with open(path, 'w') as f:
+            f.write('#!/bin/sh\n')
+            f.write('echo "$(basename "$0") $*" >> ')
+            f.write('"{0}"\n'.format(self.get_log()))
+            f.write(script + '\n')
+        os.chmod(path, 0o755)
+
+    def get_log(self):
+        return os.path.join(self.root, 'tools.log')
+
+    def get_calls(self, name):
+        if not os.path.exists(self.get_log()):
+            return []
+        with open(self.get_log(), 'r') as f:
+            lines = f.read().splitlines()
+        return [
+            line[len(name) + 1 :]
+            for line in lines
+            if line.startswith(name + ' ')
+        ]
+
+    def test_vopt(self):
+        """Optimised designs are reused until the options or the design
+        change, and evicted designs are deleted from the library."""
+        for name in ['vcom', 'vlog', 'vmap', 'vsim']:
+            self.add_tool(name)
+        self.add_tool('vlib', 'mkdir -p "$1"')
+        # Optimised designs are stored as files in the library directory
+        self.add_tool(
+            'vopt',
+            'while [ $# -gt 1 ]; do\n'
+            + '    if [ "$1" = "-work" ]; then lib="$2"; fi\n'
+            + '    if [ "$1" = "-o" ]; then touch "$lib/$2"; fi; shift\n'
+            + 'done',
+        )
+        self.add_tool('vdel', 'rm -f "$2/$3"')
+        self.add_tool('vdir', '[ -e "$2/$3" ]')
+        simulator = DummyModelsim(self.get_project(), {'modelsim': self.bin})
+        simulator.compile_project()
+        target = simulator.optimise('lib', 'mid', ['lib'], [], 'regression')
+        self.assertTrue(target.startswith('lib.chiptools_'))
+        self.assertEqual(
+            simulator.optimise('lib', 'mid', ['lib'], [], 'regression'),
+            target,
+        )
+        self.assertEqual(len(self.get_calls('vopt')), 1)
+        # A new profile produces a new design, which evicts the first one
+        debug = simulator.optimise('lib', 'mid', ['lib'], [], 'debug')
+        self.assertNotEqual(debug, target)
+        self.assertEqual(len(self.get_calls('vopt')), 2)
+        self.assertEqual(
+            self.get_calls('vdel'), ['-lib lib ' + target.split('.')[1]]
+        )
+        self.assertEqual(
+            simulator.optimise('lib', 'mid', ['lib'], ['-Gn=1'], 'debug'),
+            simulator.optimise('lib', 'mid', ['lib'], ['-Gn=1'], 'debug'),
+        )
+        self.assertEqual(len(self.get_calls('vopt')), 3)
+        # Recompiling a unit in the hierarchy produces a new design
+        self.write('leaf.vhd', '-- Modified\n')
+        simulator = DummyModelsim(self.get_project(), {'modelsim': self.bin})
+        simulator.compile_project()
+        self.assertNotEqual(
+            simulator.optimise('lib', 'mid', ['lib'], [], 'debug'), debug
+        )
+        self.assertEqual(len(self.get_calls('vopt')), 4)
+        self.assertEqual(len(self.get_calls('vdel')), 3)
+        # A design deleted outside the cache is optimised again
+        workdir = simulator.project.get_simulation_directory()
+        target = simulator.optimise('lib', 'mid', ['lib'], [], 'debug')
+        os.remove(os.path.join(workdir, *target.split('.')))
+        self.assertEqual(
+            simulator.optimise('lib', 'mid', ['lib'], [], 'debug'), target
+        )
+        self.assertEqual(len(self.get_calls('vopt')), 5)
+        self.assertTrue(
+            os.path.exists(os.path.join(workdir, *target.split('.')))
+        )
+        # Designs are lost when the library is created again, their records
+        # are removed without calling vdel
+        simulator.add_library('lib')
+        self.assertEqual(simulator.get_vopt_cache().get_entries(), [])
+        self.assertEqual(len(self.get_calls('vdel')), 3)
+
+    def test_fuse(self):
+        """Simulation executables are reused until the generics change,
+        evicted executables are removed and each run writes its own
+        waveform database."""
+        # The ISim wrapper sets the XILINX environment variable
+        xilinx = os.environ.get('XILINX')
+
+        def restore():
+            if xilinx is None:
+                os.environ.pop('XILINX', None)
+            else:
+                os.environ['XILINX'] = xilinx
+
+        self.addCleanup(restore)
+        self.add_tool('vhpcomp')
+        self.add_tool('vlogcomp')
+        # The simulation executables log their arguments like the tools and
+        # create the waveform database
+        self.add_tool(
+            'sim',
+            'while [ $# -gt 1 ]; do\n'
+            + '    if [ "$1" = "-wdb" ]; then touch "$2"; fi; shift\n'
+            + 'done',
+        )
+        self.add_tool(
+            'fuse',
+            'while [ $# -gt 1 ]; do\n'
+            + '    if [ "$1" = "-o" ]; then out="$2"; fi; shift\n'
+            + 'done\n'
+            + '[ -n "$out" ] || exit 0\n'
+            + 'mkdir -p "isim/$out.sim"\n'
+            + 'cp "$(dirname "$0")/sim" "$out"',
+        )
+
+        def get_builds():
+            # The version of the tool is probed by calling fuse without -o
+            return [
+                args for args in self.get_calls('fuse') if '-o' in args.split()
+            ]
+
+        simulator = DummyIsim(self.get_project(), {'isim': self.bin})
+        simulator.compile_project()
+        simulator.simulate('lib', 'mid')
+        simulator.simulate('lib', 'mid')
+        self.assertEqual(len(get_builds()), 1)
+        sim_exe_name = get_builds()[0].split()[-1]
+        self.assertTrue(sim_exe_name.startswith('fuse_sim_'))
+        runs = [args.split() for args in self.get_calls(sim_exe_name)]
+        self.assertEqual(len(runs), 2)
+        databases = [args[args.index('-wdb') + 1] for args in runs]
+        self.assertNotEqual(databases[0], databases[1])
+        # Only the database of the last run of each design is kept
+        self.assertEqual(
+            [
+                name
+                for name in os.listdir(os.path.join(self.root, 'sim'))
+                if name.endswith('.wdb')
+            ],
+            [Isim.get_sim_wdb_name('lib', 'mid')],
+        )
+        # New generics produce a new executable, which evicts the first one
+        simulator.simulate('lib', 'mid', generics={'n': 1})
+        self.assertEqual(len(get_builds()), 2)
+        sim = os.path.join(self.root, 'sim')
+        self.assertFalse(os.path.exists(os.path.join(sim, sim_exe_name)))
+        self.assertFalse(
+            os.path.exists(os.path.join(sim, 'isim', sim_exe_name + '.sim'))
+        )
+        sim_exe_name = get_builds()[1].split()[-1]
+        self.assertTrue(os.path.exists(os.path.join(sim, sim_exe_name)))
+        # Deleted executables are built again
+        os.remove(os.path.join(sim, sim_exe_name))
+        simulator.simulate('lib', 'mid', generics={'n': 1})
+        self.assertEqual(get_builds()[2], get_builds()[1])
+        self.assertTrue(os.path.exists(os.path.join(sim, sim_exe_name)))
+
+    def test_ghdl_elaborate(self):
+        """Elaborated executables are reused for runs with different
+        generics until a unit in the design is recompiled."""
+        # The elaborated executable logs its arguments like the tools
+        self.add_tool('run')
+        self.add_tool(
+            'ghdl',
+            'case "$1" in\n'
+            + '    -a) touch "${2#--work=}-obj93.cf" ;;\n'
+            + '    -e) cp "$(dirname "$0")/run" "$3" ;;\n'
+            + 'esac',
+        )
+
+        def get_elaborations():
+            return [
+                args for args in self.get_calls('ghdl') if args[:3] == '-e '
+            ]
+
+        simulator = Ghdl(self.get_project(), {'ghdl': self.bin})
+        simulator.compile_project()
+        simulator.simulate('lib', 'mid', generics={'n': 1})
+        simulator.simulate('lib', 'mid', generics={'n': 2})
+        self.assertEqual(get_elaborations(), ['-e --work=lib mid'])
+        # The executable is moved out of the simulation directory and run
+        # with the generics of each run
+        self.assertFalse(
+            os.path.exists(os.path.join(self.root, 'sim', 'mid'))
+        )
+        self.assertEqual(self.get_calls('mid'), ['-gn=1', '-gn=2'])
+        self.assertEqual(
+            [args for args in self.get_calls('ghdl') if args[:3] == '-r '],
+            [],
+        )
+        # Recompiling a unit outside the design does not
+        self.write('other.vhd', '-- Modified\n')
+        simulator = Ghdl(self.get_project(), {'ghdl': self.bin})
+        simulator.compile_project()
+        simulator.simulate('lib', 'mid')
+        self.assertEqual(len(get_elaborations()), 1)
+        # Recompiling a unit in the design elaborates it again
+        self.write('leaf.vhd', '-- Modified\n')
+        simulator = Ghdl(self.get_project(), {'ghdl': self.bin})
+        simulator.compile_project()
+        simulator.simulate('lib', 'mid', generics={'n': 1})
+        self.assertEqual(len(get_elaborations()), 2)
+        simulator.simulate('lib', 'mid')
+        self.assertEqual(len(get_elaborations()), 2)
+        self.assertEqual(len(self.get_calls('mid')), 5)
+
+    def test_iverilog_image(self):
+        """Compiled images are reused until a design file changes."""
+        self.add_tool('vvp')
+        self.add_tool(
+            'iverilog',
+            'while [ $# -gt 1 ]; do\n'
+            + '    if [ "$1" = "-o" ]; then touch "$2"; fi; shift\n'
+            + 'done',
+        )
+        self.write('top.v', 'module top; sub u0 (); endmodule\n')
+        self.write('sub.v', 'module sub; endmodule\n')
+
+        def get_simulator():
+            project = self.get_project()
+            for name in ['top.v', 'sub.v']:
+                project.add_file(os.path.join(self.root, name), library='lib')
+            simulator = Iverilog(project, {'iverilog': self.bin})
+            simulator.compile_project()
+            return simulator
+
+        def get_builds():
+            # The version of the tool is probed by calling iverilog without -o
+            return [
+                args
+                for args in self.get_calls('iverilog')
+                if '-o' in args.split()
+            ]
+
+        simulator = get_simulator()
+        simulator.simulate('lib', 'top')
+        simulator.simulate('lib', 'top')
+        self.assertEqual(len(get_builds()), 1)
+        image = self.get_calls('vvp')[0]
+        self.assertTrue(os.path.isfile(image))
+        self.assertEqual(self.get_calls('vvp'), [image, image])
+        # The image is reused by later invocations while the files are
+        # unchanged
+        get_simulator().simulate('lib', 'top')
+        self.assertEqual(len(get_builds()), 1)
+        self.assertEqual(len(self.get_calls('vvp')), 3)
+        # Changing a design file compiles a new image
+        self.write('sub.v', '// Modified\n')
+        get_simulator().simulate('lib', 'top')
+        self.assertEqual(len(get_builds()), 2)
+        self.assertNotEqual(self.get_calls('vvp')[-1], image)
+        self.assertTrue(os.path.isfile(self.get_calls('vvp')[-1]))
+
+    def test_xelab_snapshot(self):
+        """Elaborated snapshots are reused until a unit in the design is
+        recompiled, and evicted snapshots are removed from xsim.dir without
+        touching the compiled libraries."""
+        self.add_tool('xvlog')
+        self.add_tool('xsim')
+        # The compiled libraries and the snapshots share xsim.dir
+        self.add_tool('xvhdl', 'mkdir -p xsim.dir/lib')
+        self.add_tool(
+            'xelab',
+            'while [ $# -gt 1 ]; do\n'
+            + '    if [ "$1" = "-s" ]; then snapshot="$2"; fi; shift\n'
+            + 'done\n'
+            + '[ -n "$snapshot" ] || exit 0\n'
+            + 'mkdir -p "xsim.dir/$snapshot"\n'
+            + 'touch "xsim.dir/$snapshot/xsimk"',
+        )
+        xsim_dir = os.path.join(self.root, 'sim', 'xsim.dir')
+
+        def get_snapshots():
+            # The version of the tool is probed by calling xelab without -s
+            return [
+                args.split()[-1]
+                for args in self.get_calls('xelab')
+                if '-s' in args.split()
+            ]
+
+        simulator = DummyVivado(self.get_project(), {'vivado': self.bin})
+        simulator.compile_project()
+        simulator.simulate('lib', 'mid')
+        simulator.simulate('lib', 'mid')
+        self.assertEqual(len(get_snapshots()), 1)
+        snapshot = get_snapshots()[0]
+        self.assertTrue(snapshot.startswith(Vivado.snapshot_prefix))
+        self.assertTrue(
+            os.path.isfile(os.path.join(xsim_dir, snapshot, 'xsimk'))
+        )
+        self.assertEqual(
+            [args.split()[-1] for args in self.get_calls('xsim')],
+            [snapshot, snapshot],
+        )
+        # Recompiling a unit in the design elaborates a new snapshot, which
+        # evicts the first one
+        self.write('leaf.vhd', '-- Modified\n')
+        simulator = DummyVivado(self.get_project(), {'vivado': self.bin})
+        simulator.compile_project()
+        simulator.simulate('lib', 'mid')
+        self.assertEqual(len(get_snapshots()), 2)
+        self.assertNotEqual(get_snapshots()[1], snapshot)
+        self.assertEqual(
+            self.get_calls('xsim')[-1].split()[-1], get_snapshots()[1]
+        )
+        self.assertFalse(os.path.exists(os.path.join(xsim_dir, snapshot)))
+        self.assertTrue(
+            os.path.isdir(os.path.join(xsim_dir, get_snapshots()[1]))
+        )
+        self.assertTrue(os.path.isdir(os.path.join(xsim_dir, 'lib')))
+
+
+if __name__ == '__main__':
+    unittest.main()
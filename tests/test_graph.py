@@ -0,0 +1,123 @@
+"""
+The tests in this module check the dependency graph algorithms on graphs
+large and deep enough to expose quadratic or recursive implementations. They
+do not require any vendor tools.
+"""
+
+import unittest
+import os
+import logging
+import sys
+
+testroot = os.path.dirname(__file__) or '.'
+sys.path.insert(0, os.path.abspath(os.path.join(testroot, os.path.pardir)))
+
+from chiptools.common import graph
+from chiptools.common import utils
+from chiptools.parsers.callgraph import CallGraph
+
+# Blackhole log messages from chiptools
+logging.config.dictConfig({'version': 1})
+
+
+class TestGraph(unittest.TestCase):
+
+    count = 20000
+
+    def setUp(self):
+        # A chain of nodes that each also depend on the first node
+        self.chain = dict(
+            (node, set([node - 1, 0]) if node > 1 else set([0]))
+            for node in range(1, self.count)
+        )
+        self.chain[0] = set()
+
+    def test_sort(self):
+        order = utils.topological_sort(self.chain)
+        self.assertEqual(order, list(range(self.count)))
+        self.assertEqual(
+            graph.stable_sort(self.chain, reversed(range(self.count))),
+            order,
+        )
+
+    def test_queries(self):
+        self.assertEqual(
+            graph.get_reachable(self.chain, [10]), set(range(11))
+        )
+        self.assertEqual(
+            graph.get_dependents(self.chain, [self.count - 10]),
+            set(range(self.count - 10, self.count)),
+        )
+        levels = graph.get_levels(self.chain, range(self.count))
+        wavefronts = graph.get_wavefronts(levels)
+        self.assertEqual(len(wavefronts), self.count)
+        self.assertEqual(wavefronts[-1], [self.count - 1])
+        self.assertEqual(
+            CallGraph.get_callchain(self.chain, [self.count - 3]),
+            [self.count - 3, self.count - 2, self.count - 1],
+        )
+
+    def test_cycles(self):
+        self.assertEqual(graph.get_components(self.chain), [])
+        self.chain[0] = set([self.count - 1])
+        components = graph.get_components(self.chain)
+        self.assertEqual(len(components), 1)
+        self.assertEqual(len(components[0]), self.count)
+        self.chain[0] = set([2])
+        with self.assertRaisesRegex(ValueError, r'cycle: (\d+ -> )+\d+$'):
+            utils.topological_sort(self.chain)
+        self.assertIsNone(CallGraph.get_callchain(self.chain, [0]))
+
+    def test_subgraph(self):
+        """Deep hierarchies do not exceed the recursion limit and cyclic
+        graphs terminate."""
+        hierarchy = utils.subgraph(self.chain, self.count - 1)
+        self.assertEqual(len(hierarchy), self.count)
+        self.assertEqual(hierarchy[5], set([4, 0]))
+        self.chain[0] = set([self.count - 1])
+        self.assertEqual(len(utils.subgraph(self.chain, 10)), self.count)
+        cache = {}
+        hierarchy = utils.subgraph(self.chain, 10, cache)
+        self.assertEqual(len(hierarchy), self.count)
+        self.assertEqual(list(cache), [10])
+
+    def test_subgraph_diamonds(self):
+        """Shared sub-hierarchies are visited once, and the reachable sets
+        of the queried roots are reused from the cache by later queries."""
+        layers = 100
+        diamonds = {}
+        for layer in range(layers):
+            diamonds[(layer, 0)] = set([(layer, 1), (layer, 2)])
+            diamonds[(layer, 1)] = set([(layer + 1, 0)])
+            diamonds[(layer, 2)] = set([(layer + 1, 0)])
+        cache = {}
+        hierarchy = utils.subgraph(diamonds, (1, 0), cache)
+        self.assertEqual(len(hierarchy), 3 * layers - 2)
+        self.assertEqual(hierarchy[(layers, 0)], set())
+        # Only the queried roots are stored
+        self.assertEqual(list(cache), [(1, 0)])
+        diamonds['top'] = set([(0, 0)])
+        visited = []
+
+        class Graph(dict):
+            def get(self, node, default=None):
+                visited.append(node)
+                return dict.get(self, node, default)
+
+        # Only the nodes above the earlier root are traversed, the
+        # reachable set of the shared hierarchy is read from the cache.
+        reachable = graph.get_reachable(Graph(diamonds), ['top'], cache)
+        self.assertEqual(len(reachable), 3 * layers + 2)
+        self.assertEqual(
+            set(visited), set(['top', (0, 0), (0, 1), (0, 2)])
+        )
+        self.assertEqual(len(visited), 4)
+        self.assertEqual(cache['top'], frozenset(reachable))
+        self.assertEqual(len(cache), 2)
+        hierarchy = utils.subgraph(diamonds, 'top', cache)
+        self.assertEqual(hierarchy['top'], set([(0, 0)]))
+        self.assertEqual(set(hierarchy), reachable)
+
+
+if __name__ == '__main__':
+    unittest.main()
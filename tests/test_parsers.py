@@ -0,0 +1,283 @@
+"""
+The tests in this module check that the VHDL parser finds the design units
+declared and referenced by a file and computes stable file digests. They do
+not require any vendor tools.
+"""
+
+import unittest
+import os
+import logging
+import sys
+import shutil
+import tempfile
+import timeit
+
+testroot = os.path.dirname(__file__) or '.'
+sys.path.insert(0, os.path.abspath(os.path.join(testroot, os.path.pardir)))
+
+from chiptools.common.filetypes import File
+from chiptools.parsers.callgraph import CallGraph
+from chiptools.parsers import vhdl
+from chiptools.parsers.vhdl import ParsedVhdlFile
+
+# Blackhole log messages from chiptools
+logging.config.dictConfig({'version': 1})
+
+
+class TestParsedVhdlFile(unittest.TestCase):
+
+    unit = (
+        'library ieee, lib2;\n'
+        'use ieee.std_logic_1164.all;\n'
+        'use work.pkg_{0}.all, lib2.types.word;\n'
+        'entity ent_{0} is\n'
+        '    port (clk : in std_logic); -- Clock; entity fake is\n'
+        'end entity ent_{0};\n'
+        'architecture rtl of ent_{0} is\n'
+        '    component sub is port (a : in std_logic); end component;\n'
+        '    for all : sub use entity lib2.ent_{1}(rtl);\n'
+        '    constant MSG : string := "-- entity fake is";\n'
+        '    function f(a : bit; b : bit) return bit is\n'
+        '    begin return a; end function;\n'
+        'begin\n'
+        '    u_sub : sub port map (a => clk);\n'
+        '    u_ent : entity work.ent_{1}(rtl) /* entity fake is */\n'
+        '        port map (clk => clk);\n'
+        '    u_cmp : component other port map (a => clk);\n'
+        'end architecture rtl;\n'
+        'package pkg_{0} is\n'
+        '    type rec_t is record a : bit; end record;\n'
+        '    procedure p(a : in bit; b : out bit);\n'
+        'end package pkg_{0};\n'
+        'package body pkg_{0} is\n'
+        '    procedure p(a : in bit; b : out bit) is begin end;\n'
+        'end package body;\n'
+    )
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+
+    def parse(self, data):
+        path = os.path.join(self.root, 'test.vhd')
+        with open(path, 'w') as f:
+            f.write(data)
+        return ParsedVhdlFile(File(path=path, library='lib'))
+
+    def assertUnits(self, units, expected):
+        self.assertEqual(sorted(repr(unit) for unit in units), expected)
+
+    def test_units(self):
+        parsed = self.parse(self.unit.format(0, 1))
+        self.assertEqual(parsed.libraries, set(['work', 'ieee', 'lib2']))
+        self.assertUnits(parsed.entity_defs, ['<Entity ent_0>'])
+        self.assertUnits(
+            parsed.architecture_defs, ['<Architecture ent_0(rtl)>']
+        )
+        self.assertUnits(parsed.package_defs, ['<Package lib.pkg_0>'])
+        self.assertUnits(
+            parsed.package_body_defs, ['<PackageBody lib.pkg_0>']
+        )
+        self.assertUnits(parsed.component_defs, ['<Component sub>'])
+        self.assertUnits(parsed.function_defs, ['<Function f>'])
+        self.assertUnits(parsed.procedure_defs, ['<Procedure p>'])
+        self.assertUnits(
+            parsed.package_refs,
+            [
+                '<Package ieee.std_logic_1164>',
+                '<Package lib.pkg_0>',
+                '<Package lib2.types>',
+            ],
+        )
+        self.assertUnits(
+            parsed.entity_refs, ['<Entity ent_1>', '<Entity other>']
+        )
+        self.assertUnits(parsed.component_refs, ['<Component other (u_cmp)>'])
+
+    def test_case_insensitive(self):
+        parsed = self.parse(self.unit.format(0, 1).upper())
+        self.assertUnits(parsed.entity_defs, ['<Entity ent_0>'])
+        self.assertUnits(
+            parsed.entity_refs, ['<Entity ent_1>', '<Entity other>']
+        )
+
+    def test_digests(self):
+        """Comments, whitespace, case and changes to architectures and
+        bodies do not change the interface digest."""
+        data = self.unit.format(0, 1)
+        parsed = self.parse(data)
+        for equivalent in [
+            data.replace('-- Clock', '-- Input clock'),
+            data.replace('/* entity', '/* Unused entity'),
+            data.replace('    ', '\t'),
+            '-- Header\n' + data.replace('entity ent_0', 'ENTITY Ent_0'),
+        ]:
+            modified = self.parse(equivalent)
+            self.assertEqual(
+                modified.interface_digest, parsed.interface_digest
+            )
+        for body_change in [
+            data.replace('return a;', 'return b;'),
+            data.replace('begin end;', 'begin b := a; end;'),
+            data.replace('"-- entity', '"-- Entity'),
+        ]:
+            modified = self.parse(body_change)
+            self.assertEqual(
+                modified.interface_digest, parsed.interface_digest
+            )
+        for interface_change in [
+            data.replace('clk : in', 'clk : out'),
+            data.replace('a : bit; end record', 'a : bit_vector; end record'),
+        ]:
+            modified = self.parse(interface_change)
+            self.assertNotEqual(
+                modified.interface_digest, parsed.interface_digest
+            )
+
+    def test_large_file(self):
+        """Large files are parsed in a single pass."""
+        count = 500
+        parsed = self.parse(
+            ''.join(self.unit.format(i, i + 1) for i in range(count))
+        )
+        self.assertEqual(len(parsed.entity_defs), count)
+        self.assertEqual(len(parsed.architecture_defs), count)
+        self.assertEqual(len(parsed.package_body_defs), count)
+        self.assertEqual(len(parsed.entity_refs), count + 1)
+
+    def test_linear_time(self):
+        """Parse time grows linearly with the file size, the parser used to
+        be quadratic. See benchmark_parsers.py for the absolute times."""
+
+        def best_time(count):
+            data = ''.join(self.unit.format(i, i + 1) for i in range(count))
+            path = os.path.join(self.root, 'units_{0}.vhd'.format(count))
+            with open(path, 'w') as f:
+                f.write(data)
+            file_object = File(path=path, library='lib')
+            return min(
+                timeit.repeat(
+                    lambda: ParsedVhdlFile(file_object), number=1, repeat=3
+                )
+            )
+
+        # A quadratic parser takes 16 times longer for 4 times the units
+        self.assertLess(best_time(400), 8 * best_time(100))
+
+    def test_get_all(self):
+        """The get_all_definitions and get_all_references classmethods of
+        the design unit classes find the same units as the file parser."""
+        data = self.unit.format(0, 1)
+        parsed = self.parse(data)
+        for cls, attribute in [
+            (vhdl.Function, 'function_defs'),
+            (vhdl.Procedure, 'procedure_defs'),
+            (vhdl.Package, 'package_defs'),
+            (vhdl.PackageBody, 'package_body_defs'),
+            (vhdl.Entity, 'entity_defs'),
+            (vhdl.Architecture, 'architecture_defs'),
+            (vhdl.Configuration, 'configuration_defs'),
+            (vhdl.Component, 'component_defs'),
+        ]:
+            self.assertUnits(
+                cls.get_all_definitions(data, 'lib'),
+                sorted(map(repr, getattr(parsed, attribute))),
+            )
+        self.assertUnits(
+            vhdl.PackageBody.get_all_references(data, 'lib'),
+            ['<Package lib.pkg_0>'],
+        )
+        self.assertUnits(
+            vhdl.Architecture.get_all_references(data, 'lib'),
+            ['<Entity ent_0>'],
+        )
+        self.assertUnits(
+            vhdl.Package.get_all_references(data, ['ieee', 'lib2']),
+            ['<Package ieee.std_logic_1164>', '<Package lib2.types>'],
+        )
+        self.assertUnits(
+            vhdl.Entity.get_all_references(data, ['work', 'lib2']),
+            ['<Entity ent_1>', '<Entity other>'],
+        )
+        self.assertUnits(
+            vhdl.Component.get_all_references(data),
+            sorted(map(repr, parsed.component_refs + parsed.entity_refs)),
+        )
+        # Binding indications take precedence over the ones in the data
+        target = vhdl.Entity('other_ent', library='lib3')
+        references = vhdl.Component.get_all_references(
+            data, {'u_sub': {'sub': target}}
+        )
+        self.assertIn(target, references)
+        self.assertEqual(
+            [ref.library for ref in references if ref == target], ['lib3']
+        )
+
+    def test_parallel(self):
+        """Files parsed by a pool of processes find the same design units as
+        files parsed serially."""
+        self.addCleanup(
+            setattr,
+            CallGraph,
+            'parse_pool_threshold',
+            CallGraph.parse_pool_threshold,
+        )
+        CallGraph.parse_pool_threshold = 0
+        files = []
+        for i in range(8):
+            path = os.path.join(self.root, 'unit_{0}.vhd'.format(i))
+            with open(path, 'w') as f:
+                f.write(self.unit.format(i, i + 1) * (i + 1))
+            files.append(File(path=path, library='lib'))
+        serial = CallGraph.parse_files(files, max_workers=1)
+        parallel = CallGraph.parse_files(files, max_workers=2)
+        self.assertEqual(
+            [p.path for p in parallel], [f.path for f in files]
+        )
+        for expected, parsed in zip(serial, parallel):
+            self.assertEqual(parsed.get_summary(), expected.get_summary())
+            self.assertUnits(
+                parsed.entity_refs, sorted(map(repr, expected.entity_refs))
+            )
+
+    def test_design_files(self):
+        """The design files of a long chain of packages whose bodies use
+        the next package are found in a single traversal."""
+        count = 200
+        files = []
+        for i in range(count):
+            for name, data in [
+                ('pkg_{0}.vhd', 'package pkg_{0} is end package;\n'),
+                (
+                    'body_{0}.vhd',
+                    'use work.pkg_{1}.all;\n'
+                    + 'package body pkg_{0} is end package body;\n',
+                ),
+            ]:
+                path = os.path.join(self.root, name.format(i))
+                with open(path, 'w') as f:
+                    f.write(data.format(i, i + 1))
+                files.append(File(path=path, library='lib'))
+        path = os.path.join(self.root, 'top.vhd')
+        with open(path, 'w') as f:
+            f.write(
+                'use work.pkg_0.all;\nentity top is end entity;\n'
+                + 'architecture rtl of top is begin end rtl;\n'
+            )
+        files.append(File(path=path, library='lib'))
+        parsed_files = CallGraph.get_parsed_files(files)
+        design_files = CallGraph.get_design_files(parsed_files, 'lib', 'TOP')
+        self.assertEqual(
+            [p.path for p in design_files], [f.path for f in files]
+        )
+        self.assertEqual(
+            len(CallGraph.get_design_files(parsed_files, 'lib', 'top', [])),
+            len(files),
+        )
+        self.assertIsNone(
+            CallGraph.get_design_files(parsed_files, 'lib', 'top', ['lib'])
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -10,6 +10,8 @@ import os
 import logging
 import sys
 import re
+import shutil
+import tempfile
 
 testroot = os.path.dirname(__file__) or '.'
 sys.path.insert(0, os.path.abspath(os.path.join(testroot, os.path.pardir)))
@@ -416,6 +418,53 @@ class TestManualProjectInterface(TestProjectInterface):
                 msg='Constraints path was incorrectly processed.'
             )
 
+    def test_synthesis_pruning(self):
+        """Only the hierarchy of the top level is synthesised when the
+        prune_synthesis option is set."""
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        files = {
+            'top.vhd': (
+                'entity top is end entity;\n'
+                + 'architecture rtl of top is begin\n'
+                + '    u0 : entity work.leaf port map (a => open);\n'
+                + 'end rtl;\n'
+            ),
+            'leaf.vhd': 'entity leaf is port (a : in bit); end entity;\n',
+            'unused.vhd': 'entity unused is end entity;\n',
+            'core.v': 'module core; endmodule\n',
+        }
+        project = Project()
+        for name, data in sorted(files.items()):
+            path = os.path.join(root, name)
+            with open(path, 'w') as f:
+                f.write(data)
+            project.add_file(path, 'lib')
+
+        def get_names(fileset):
+            return sorted(
+                os.path.basename(f.path) for f in fileset['lib']
+            )
+
+        everything = sorted(files.keys())
+        self.assertEqual(
+            get_names(project.get_synthesis_fileset('lib', 'top')),
+            everything,
+        )
+        project.add_config('prune_synthesis', 'true')
+        self.assertEqual(
+            get_names(project.get_synthesis_fileset()), everything
+        )
+        self.assertEqual(
+            get_names(project.get_synthesis_fileset('lib', 'top')),
+            ['core.v', 'leaf.vhd', 'top.vhd'],
+        )
+        # Unresolved hierarchies are not pruned
+        self.assertEqual(
+            get_names(project.get_synthesis_fileset('lib', 'missing')),
+            everything,
+        )
+
 
 class TestUninitialisedProjectCLI(TestProjectInterface):
     """